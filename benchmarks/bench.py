@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""ApkProcessor 分阶段基准测试
+
+在仓库根目录运行：
+    python benchmarks/bench.py run --output bench.json                      # 桩工具链，全部形状
+    python benchmarks/bench.py run --toolchain real --shapes tiny,native-nsc --repeat 5 --output real.json
+    python benchmarks/bench.py compare baseline.json bench.json --threshold 0.15
+
+run 生成合成APK（见 synthetic_apk.SHAPES，变体名加 -nsc 表示带网络安全配置），
+对每个变体分别走二进制修改流程（binary）与 apktool 流程（apktool），按 ctx.trace 的阶段记录汇总各阶段耗时的中位数。
+compare 对比两份结果，某阶段变慢超过阈值（且绝对差值超过 --min-seconds）时列为回归并返回非零退出码。
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'src'))
+
+import stub_tools  # noqa: E402
+import synthetic_apk  # noqa: E402
+
+PATHS = ('binary', 'apktool')
+KEYSTORE_PASSWORD = 'benchmark'
+KEY_ALIAS = 'bench'
+
+
+def _default_variants() -> List[str]:
+	return [synthetic_apk.variant_name(shape, nsc) for shape in synthetic_apk.SHAPES for nsc in (False, True)]
+
+
+def _ensure_keystore(directory: str) -> str:
+	"""生成（或复用）基准测试用的 PKCS#12 密钥库"""
+	path = os.path.join(directory, 'bench.p12')
+	if os.path.exists(path):
+		return path
+	from cryptography import x509
+	from cryptography.hazmat.primitives import hashes, serialization
+	from cryptography.hazmat.primitives.asymmetric import rsa
+	from cryptography.hazmat.primitives.serialization import pkcs12
+	from cryptography.x509.oid import NameOID
+
+	key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+	name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'AppTweakDroid Benchmark')])
+	not_before = datetime.datetime(2024, 1, 1)
+	certificate = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+	               .serial_number(1).not_valid_before(not_before)
+	               .not_valid_after(not_before + datetime.timedelta(days=3650)).sign(key, hashes.SHA256()))
+	data = pkcs12.serialize_key_and_certificates(
+		KEY_ALIAS.encode(), key, certificate, None, serialization.BestAvailableEncryption(KEYSTORE_PASSWORD.encode()))
+	with open(path, 'wb') as f:
+		f.write(data)
+	return path
+
+
+def _create_engine(toolchain: str, work_dir: str):
+	"""在 work_dir 中创建引擎：使用默认配置，输出写入 work_dir/output，工作目录与缓存写入 work_dir/temp"""
+	if toolchain == 'stub':
+		stub = stub_tools.prepare_stub_toolchain(os.path.join(work_dir, 'toolchain'))
+		os.environ['PATH'] = stub['bin'] + os.pathsep + os.environ.get('PATH', '')
+		os.environ['ANDROID_HOME'] = stub['android_home']
+	os.chdir(work_dir)
+
+	from core.apk_processor import ApkProcessor
+	from core.config_manager import ConfigManager
+
+	engine = ApkProcessor(ConfigManager(), logger=lambda message: None, temp_root=os.path.join(work_dir, 'temp'))
+	if toolchain == 'stub':
+		engine.tools_dir = stub['tools']
+	return engine
+
+
+def _run_case(engine, apk_path: str, keystore: str, path: str) -> Tuple[bool, str, List[Dict[str, Any]]]:
+	# 关闭全部缓存：预热之后的每次运行都必须完整走一遍流程，而不是命中结果缓存或检查点
+	ctx = engine.create_job(apk_path, keystore, KEYSTORE_PASSWORD, KEY_ALIAS, KEYSTORE_PASSWORD,
+	                        use_decode_cache=False, logger=lambda message: None,
+	                        binary_patch=(path == 'binary'), result_cache=False, checkpoints=False)
+	success, message = engine.run_job(ctx)
+	if success and path == 'binary' and any(span['stage'] == 'decode' for span in ctx.trace.records):
+		# 二进制修改回退到了 apktool，这一组数据不代表二进制流程
+		return False, "二进制修改回退到了apktool", ctx.trace.records
+	return success, message, ctx.trace.records
+
+
+def _summarize(runs: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+	"""把多次运行的阶段记录汇总为各阶段的中位数/最小值/最大值"""
+	per_stage: Dict[str, Dict[str, List[float]]] = {}
+	totals: List[float] = []
+	peak_rss = 0
+	for records in runs:
+		totals.append(sum(span['wall_s'] for span in records))
+		seen: Dict[str, Dict[str, float]] = {}
+		for span in records:
+			stage = seen.setdefault(span['stage'], {'wall_s': 0.0, 'cpu_s': 0.0, 'tool_wall_s': 0.0})
+			stage['wall_s'] += span['wall_s']
+			stage['cpu_s'] += span.get('cpu_s', 0.0)
+			stage['tool_wall_s'] += span.get('tool_wall_s', 0.0)
+			peak_rss = max(peak_rss, span.get('tool_max_rss_bytes', 0))
+		for name, values in seen.items():
+			samples = per_stage.setdefault(name, {'wall_s': [], 'cpu_s': [], 'tool_wall_s': []})
+			for key, value in values.items():
+				samples[key].append(value)
+	stages = {}
+	for name, samples in per_stage.items():
+		walls = samples['wall_s']
+		stages[name] = {
+			'median_s': round(statistics.median(walls), 6),
+			'min_s': round(min(walls), 6),
+			'max_s': round(max(walls), 6),
+			'cpu_s': round(statistics.median(samples['cpu_s']), 6),
+			'tool_wall_s': round(statistics.median(samples['tool_wall_s']), 6),
+		}
+	return {
+		'total_s': round(statistics.median(totals), 6) if totals else 0.0,
+		'stages': stages,
+		'tool_max_rss_mb': peak_rss // synthetic_apk.MB,
+	}
+
+
+def run(args: argparse.Namespace) -> int:
+	variants = [v.strip() for v in args.shapes.split(',') if v.strip()] if args.shapes else _default_variants()
+	paths = PATHS if args.path == 'both' else (args.path,)
+	work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix='apktweak-bench-'))
+	corpus_dir = os.path.abspath(args.corpus or os.path.join(work_dir, 'corpus'))
+	output = os.path.abspath(args.output) if args.output else None
+	os.makedirs(work_dir, exist_ok=True)
+
+	print(f"生成合成APK：{', '.join(variants)}", flush=True)
+	corpus = synthetic_apk.build_corpus(corpus_dir, variants, seed=args.seed)
+	keystore = _ensure_keystore(corpus_dir)
+	engine = _create_engine(args.toolchain, work_dir)
+
+	from core.decode_cache import apktool_version
+
+	results: Dict[str, Any] = {
+		'meta': {
+			'created': datetime.datetime.now().isoformat(timespec='seconds'),
+			'toolchain': args.toolchain,
+			'apktool_version': apktool_version(engine._apktool_path()),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'cpu_count': os.cpu_count(),
+			'repeat': args.repeat,
+			'seed': args.seed,
+		},
+		'cases': {},
+	}
+	failed = 0
+	try:
+		for variant in variants:
+			apk_path = corpus[variant]
+			for path in paths:
+				case = f"{variant}/{path}"
+				runs: List[List[Dict[str, Any]]] = []
+				error: Optional[str] = None
+				for attempt in range(args.warmup + args.repeat):
+					success, message, records = _run_case(engine, apk_path, keystore, path)
+					if not success:
+						error = message
+						break
+					if attempt >= args.warmup:
+						runs.append(records)
+				entry = _summarize(runs)
+				entry['apk_bytes'] = os.path.getsize(apk_path)
+				entry['runs'] = len(runs)
+				if error:
+					entry['error'] = error
+					failed += 1
+				results['cases'][case] = entry
+				stages = '  '.join(f"{name} {s['median_s']:.3f}s" for name, s in entry['stages'].items())
+				status = f"失败：{error}" if error else f"{entry['total_s']:.3f}s  {stages}"
+				print(f"{case:<28} {status}", flush=True)
+	finally:
+		engine.close()
+
+	if output:
+		with open(output, 'w', encoding='utf-8') as f:
+			json.dump(results, f, ensure_ascii=False, indent=4)
+		print(f"结果已写入 {output}")
+	return 1 if failed else 0
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+                    min_seconds: float) -> List[Dict[str, Any]]:
+	"""逐个用例、逐个阶段对比中位数，返回所有对比行（regression 为真的行是回归）"""
+	rows = []
+	for case, entry in current.get('cases', {}).items():
+		base_entry = baseline.get('cases', {}).get(case)
+		if base_entry is None or entry.get('error') or base_entry.get('error'):
+			continue
+		stages = dict(entry['stages'], total={'median_s': entry['total_s']})
+		base_stages = dict(base_entry['stages'], total={'median_s': base_entry['total_s']})
+		for stage, values in stages.items():
+			if stage not in base_stages:
+				continue
+			before, after = base_stages[stage]['median_s'], values['median_s']
+			ratio = after / before if before > 0 else float('inf') if after > 0 else 1.0
+			rows.append({
+				'case': case,
+				'stage': stage,
+				'baseline_s': before,
+				'current_s': after,
+				'ratio': round(ratio, 3),
+				'regression': after - before > min_seconds and ratio > 1 + threshold,
+			})
+	return rows
+
+
+def compare(args: argparse.Namespace) -> int:
+	with open(args.baseline, 'r', encoding='utf-8') as f:
+		baseline = json.load(f)
+	with open(args.current, 'r', encoding='utf-8') as f:
+		current = json.load(f)
+	for key in ('toolchain', 'apktool_version'):
+		before, after = baseline.get('meta', {}).get(key), current.get('meta', {}).get(key)
+		if before != after:
+			print(f"注意：{key} 不同（{before} → {after}）")
+
+	rows = compare_results(baseline, current, args.threshold, args.min_seconds)
+	regressions = [row for row in rows if row['regression']]
+	for row in rows:
+		if args.all or row['regression']:
+			mark = '回归' if row['regression'] else '    '
+			print(f"{mark} {row['case']:<28} {row['stage']:<8} {row['baseline_s']:.3f}s → {row['current_s']:.3f}s "
+			      f"({row['ratio']:.2f}x)")
+	missing = sorted(set(baseline.get('cases', {})) - set(current.get('cases', {})))
+	if missing:
+		print(f"当前结果缺少用例：{', '.join(missing)}")
+	print(f"共对比 {len(rows)} 项，回归 {len(regressions)} 项（阈值 +{args.threshold:.0%}，最小差值 {args.min_seconds}s）")
+	return 1 if regressions else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(prog='python benchmarks/bench.py', description='ApkProcessor 分阶段基准测试')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	run_parser = commands.add_parser('run', help='生成合成APK并测量各阶段耗时')
+	run_parser.add_argument('--toolchain', choices=('stub', 'real'), default='stub',
+	                        help='stub 使用本地桩工具（离线、快速）；real 使用 ANDROID_HOME 与 tools/apktool.jar')
+	run_parser.add_argument('--shapes', help=f"逗号分隔的变体，默认全部：{','.join(_default_variants())}")
+	run_parser.add_argument('--path', choices=('binary', 'apktool', 'both'), default='both', help='测量的处理流程')
+	run_parser.add_argument('--repeat', type=int, default=3, help='每个用例的计时次数，取中位数')
+	run_parser.add_argument('--warmup', type=int, default=1, help='每个用例计时前的预热次数')
+	run_parser.add_argument('--seed', type=int, default=0, help='合成APK内容的随机种子')
+	run_parser.add_argument('--corpus', help='合成APK的存放目录，已存在的APK直接复用')
+	run_parser.add_argument('--work-dir', help='工作目录（输出APK、桩工具链），默认新建临时目录')
+	run_parser.add_argument('--output', help='把结果写入JSON文件')
+	run_parser.set_defaults(handler=run)
+
+	compare_parser = commands.add_parser('compare', help='与保存的基线对比，标出变慢的阶段')
+	compare_parser.add_argument('baseline', help='基线结果JSON')
+	compare_parser.add_argument('current', help='当前结果JSON')
+	compare_parser.add_argument('--threshold', type=float, default=0.15, help='变慢超过该比例视为回归，默认 0.15')
+	compare_parser.add_argument('--min-seconds', type=float, default=0.05,
+	                            help='绝对差值小于该秒数时不视为回归，避免短阶段的抖动，默认 0.05')
+	compare_parser.add_argument('--all', action='store_true', help='输出全部对比项，而不只是回归项')
+	compare_parser.set_defaults(handler=compare)
+	return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	args = build_parser().parse_args(argv)
+	started = time.time()
+	try:
+		return args.handler(args)
+	finally:
+		if args.command == 'run':
+			print(f"总耗时 {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,190 @@
+"""离线基准测试用的桩工具链
+
+作为 `java` 运行时模拟 `java [-X...] -jar apktool.jar d|b ...`：反编译时把二进制XML转换为文本XML并解包其余条目，
+回编译时重新打包目录，不启动 JVM。每次调用先等待 BENCH_STUB_STARTUP 秒（默认 0.3）模拟 JVM 启动。
+prepare_stub_toolchain() 生成 PATH 中的 java 包装脚本、伪 Android SDK 目录与 apktool.jar。
+"""
+
+import os
+import shutil
+import stat
+import sys
+import time
+import zipfile
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import quoteattr
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+STUB_VERSION = 'stub-1'
+
+
+def prepare_stub_toolchain(root: str) -> Dict[str, str]:
+	"""在 root 下生成桩工具链，返回 {'bin': PATH 目录, 'android_home': SDK 目录, 'tools': apktool.jar 所在目录}"""
+	if os.name == 'nt':
+		raise OSError("桩工具链依赖 POSIX 可执行脚本，Windows 上请使用 --toolchain real")
+	bin_dir = os.path.join(root, 'bin')
+	tools_dir = os.path.join(root, 'tools')
+	android_home = os.path.join(root, 'sdk')
+	os.makedirs(bin_dir, exist_ok=True)
+	os.makedirs(tools_dir, exist_ok=True)
+	os.makedirs(os.path.join(android_home, 'build-tools', '35.0.0', 'lib'), exist_ok=True)
+
+	java = os.path.join(bin_dir, 'java')
+	with open(java, 'w', encoding='utf-8') as f:
+		f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+	os.chmod(java, os.stat(java).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+	# 与真实 apktool.jar 一样在 apktool.properties 中声明版本，反编译缓存按此区分
+	with zipfile.ZipFile(os.path.join(tools_dir, 'apktool.jar'), 'w') as zf:
+		zf.writestr('apktool.properties', f'application.version={STUB_VERSION}\n')
+	return {'bin': bin_dir, 'android_home': android_home, 'tools': tools_dir}
+
+
+# ---- 二进制XML → 文本XML ----
+
+def _resource_reference(table, resource_id: int) -> str:
+	if table is not None:
+		for path in table.resolve_strings(resource_id):
+			parts = path.split('/')
+			if len(parts) == 3 and parts[0] == 'res':
+				return f"@{parts[1]}/{os.path.splitext(parts[2])[0]}"
+	return f"@0x{resource_id:08x}"
+
+
+def axml_to_text(data: bytes, table=None) -> str:
+	"""把二进制XML转换为 apktool 风格的文本XML（只处理本工具会读写的结构）"""
+	from core.axml import (ANDROID_NS, NO_INDEX, RES_XML_END_ELEMENT_TYPE, RES_XML_START_ELEMENT_TYPE,
+	                       TYPE_INT_BOOLEAN, TYPE_REFERENCE, AxmlDocument)
+
+	document = AxmlDocument.parse(data)
+	strings = document.strings
+	lines: List[str] = ['<?xml version="1.0" encoding="utf-8" standalone="no"?>']
+	depth = 0
+	root = True
+	for node in document.nodes:
+		if node.type == RES_XML_START_ELEMENT_TYPE:
+			parts = [strings.get(node.name)]
+			if root:
+				parts.append(f'xmlns:android="{ANDROID_NS}"')
+				root = False
+			for attr in node.attributes:
+				name = strings.get(attr.name)
+				if attr.ns != NO_INDEX and strings.get(attr.ns) == ANDROID_NS:
+					name = f'android:{name}'
+				if attr.raw_value != NO_INDEX:
+					value = strings.get(attr.raw_value)
+				elif attr.data_type == TYPE_REFERENCE:
+					value = _resource_reference(table, attr.data)
+				elif attr.data_type == TYPE_INT_BOOLEAN:
+					value = 'true' if attr.data else 'false'
+				else:
+					value = str(attr.data)
+				parts.append(f'{name}={quoteattr(value)}')
+			lines.append('    ' * depth + '<' + ' '.join(parts) + '>')
+			depth += 1
+		elif node.type == RES_XML_END_ELEMENT_TYPE:
+			depth -= 1
+			lines.append('    ' * depth + f'</{strings.get(node.name)}>')
+	return '\n'.join(lines) + '\n'
+
+
+# ---- apktool d / b ----
+
+def _step(message: str) -> None:
+	"""与 apktool 相同格式的步骤输出，供引擎解析进度"""
+	print(f"I: {message}", flush=True)
+
+
+def _option(args: List[str], name: str) -> str:
+	return args[args.index(name) + 1]
+
+
+def decode(apk_path: str, output_dir: str, decode_sources: bool) -> None:
+	from core.axml import AxmlError, ResourceTable
+
+	if os.path.exists(output_dir):
+		shutil.rmtree(output_dir)
+	os.makedirs(output_dir)
+	with zipfile.ZipFile(apk_path) as zf:
+		names = zf.namelist()
+		table = None
+		_step("Loading resource table...")
+		if 'resources.arsc' in names:
+			try:
+				table = ResourceTable(zf.read('resources.arsc'))
+			except AxmlError:
+				table = None
+		for name in names:
+			if name.startswith('META-INF/') or name == 'resources.arsc' or name.endswith('/'):
+				continue
+			target = os.path.join(output_dir, *name.split('/'))
+			data = zf.read(name)
+			if name == 'AndroidManifest.xml' or (name.startswith('res/xml/') and name.endswith('.xml')):
+				_step(f"Decoding {name}...")
+				try:
+					data = axml_to_text(data, table).encode('utf-8')
+				except AxmlError:
+					pass
+			elif decode_sources and name.endswith('.dex'):
+				# 以一个文件代表 smali 目录，保持与 dex 同量级的写入量
+				stem = os.path.splitext(name)[0]
+				_step(f"Baksmaling {name}...")
+				folder = 'smali' if stem == 'classes' else f'smali_{stem}'
+				target = os.path.join(output_dir, folder, 'classes.smali')
+			os.makedirs(os.path.dirname(target), exist_ok=True)
+			with open(target, 'wb') as f:
+				f.write(data)
+	with open(os.path.join(output_dir, 'apktool.yml'), 'w', encoding='utf-8') as f:
+		f.write(f"version: {STUB_VERSION}\napkFileName: {os.path.basename(apk_path)}\n")
+
+
+def build(source_dir: str, output_path: str) -> None:
+	os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+	with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+		for folder, _, files in os.walk(source_dir):
+			for file_name in sorted(files):
+				path = os.path.join(folder, file_name)
+				name = os.path.relpath(path, source_dir).replace(os.sep, '/')
+				if name == 'apktool.yml':
+					continue
+				if name.startswith('smali'):
+					stem = name.split('/', 1)[0]
+					name = 'classes.dex' if stem == 'smali' else f"{stem[len('smali_'):]}.dex"
+					_step(f"Smaling {stem} folder into {name}...")
+				compress = zipfile.ZIP_STORED if name.endswith('.so') else zipfile.ZIP_DEFLATED
+				zf.write(path, name, compress_type=compress)
+
+
+def _parse_java_command(argv: List[str]) -> Tuple[str, List[str]]:
+	index = 0
+	while index < len(argv) and argv[index] != '-jar' and argv[index].startswith('-'):
+		index += 1
+	if index + 1 >= len(argv) or argv[index] != '-jar':
+		raise SystemExit("stub java: 只支持 -jar 调用")
+	return argv[index + 1], argv[index + 2:]
+
+
+def main(argv: List[str]) -> int:
+	sys.path.insert(0, SRC_DIR)
+	jar, args = _parse_java_command(argv)
+	if os.path.basename(jar) != 'apktool.jar' or not args:
+		print(f"stub java: 不支持的工具 {jar}", file=sys.stderr)
+		return 2
+	time.sleep(float(os.environ.get('BENCH_STUB_STARTUP', '0.3')))
+	command = args[0]
+	if command == 'd':
+		apk_path = [arg for arg in args[1:] if not arg.startswith('-') and arg != _option(args, '-o')][0]
+		_step(f"Using Apktool {STUB_VERSION} on {os.path.basename(apk_path)}")
+		decode(apk_path, _option(args, '-o'), '--no-src' not in args)
+	elif command == 'b':
+		_step(f"Using Apktool {STUB_VERSION}")
+		build(args[1], _option(args, '-o'))
+		_step(f"Built apk into: {_option(args, '-o')}")
+	else:
+		print(f"stub java: 不支持的 apktool 命令 {command}", file=sys.stderr)
+		return 2
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,214 @@
+"""生成形状可控的合成APK，供基准测试使用
+
+AndroidManifest.xml、网络安全配置与 resources.arsc 是真实的二进制格式，可以走二进制修改流程；
+dex 与 .so 只是指定大小的填充数据，真实 apktool 只能以仅资源模式（--no-src）处理它们。
+"""
+
+import os
+import random
+import struct
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+ANDROID_NS = 'http://schemas.android.com/apk/res/android'
+NO_INDEX = 0xFFFFFFFF
+
+ATTR_LABEL = 0x01010001
+ATTR_NETWORK_SECURITY_CONFIG = 0x01010527
+
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+
+PACKAGE_ID = 0x7f
+XML_TYPE_ID = 0x01
+NETWORK_SECURITY_CONFIG_ID = (PACKAGE_ID << 24) | (XML_TYPE_ID << 16)
+NETWORK_SECURITY_CONFIG_PATH = 'res/xml/network_security_config.xml'
+
+KB = 1024
+MB = 1024 * 1024
+
+# 形状：资源文件数与单个大小、dex 个数与单个大小、各 ABI 的 .so 大小
+SHAPES: Dict[str, Dict[str, object]] = {
+	'tiny': {'resources': 8, 'resource_bytes': 1 * KB, 'dex': 1, 'dex_bytes': 64 * KB, 'native': {}},
+	'resources': {'resources': 4000, 'resource_bytes': 2 * KB, 'dex': 1, 'dex_bytes': 512 * KB, 'native': {}},
+	'multidex': {'resources': 200, 'resource_bytes': 2 * KB, 'dex': 6, 'dex_bytes': 6 * MB, 'native': {}},
+	'native': {'resources': 200, 'resource_bytes': 2 * KB, 'dex': 1, 'dex_bytes': 1 * MB,
+	           'native': {'arm64-v8a': 48 * MB, 'armeabi-v7a': 32 * MB}},
+}
+
+
+def variant_name(shape: str, nsc: bool) -> str:
+	return f"{shape}-nsc" if nsc else shape
+
+
+def parse_variant(name: str) -> Tuple[str, bool]:
+	"""variant_name 的逆操作"""
+	if name.endswith('-nsc'):
+		return name[:-4], True
+	return name, False
+
+
+# ---- 二进制XML ----
+
+def _length8(value: int) -> bytes:
+	return bytes([value]) if value < 0x80 else bytes([(value >> 8) | 0x80, value & 0xFF])
+
+
+def _string_pool(strings: List[str]) -> bytes:
+	"""UTF-8 字符串池块"""
+	offsets = []
+	data = bytearray()
+	for value in strings:
+		offsets.append(len(data))
+		encoded = value.encode('utf-8')
+		data += _length8(len(value)) + _length8(len(encoded)) + encoded + b'\0'
+	while len(data) % 4:
+		data += b'\0'
+	header_size = 28
+	strings_start = header_size + 4 * len(strings)
+	header = struct.pack('<HHIIIIII', 0x0001, header_size, strings_start + len(data), len(strings), 0,
+	                     1 << 8, strings_start, 0)
+	return header + struct.pack(f'<{len(strings)}I', *offsets) + bytes(data)
+
+
+def _node(chunk_type: int, body: bytes) -> bytes:
+	return struct.pack('<HHIII', chunk_type, 16, 16 + len(body), 1, NO_INDEX) + body
+
+
+def _start_element(name: int, attributes: List[Tuple[int, int, int, int, int]], ns: int = NO_INDEX) -> bytes:
+	"""attributes 为 (命名空间, 名称, 原始字符串, 数据类型, 数据)"""
+	body = struct.pack('<IIHHHHHH', ns, name, 20, 20, len(attributes), 0, 0, 0)
+	for attr_ns, attr_name, raw, data_type, data in attributes:
+		body += struct.pack('<IIIHBBI', attr_ns, attr_name, raw, 8, 0, data_type, data)
+	return _node(0x0102, body)
+
+
+def _end_element(name: int, ns: int = NO_INDEX) -> bytes:
+	return _node(0x0103, struct.pack('<II', ns, name))
+
+
+def _xml_document(strings: List[str], resource_ids: List[int], nodes: List[bytes]) -> bytes:
+	body = _string_pool(strings)
+	if resource_ids:
+		body += struct.pack('<HHI', 0x0180, 8, 8 + 4 * len(resource_ids))
+		body += struct.pack(f'<{len(resource_ids)}I', *resource_ids)
+	body += b''.join(nodes)
+	return struct.pack('<HHI', 0x0003, 8, 8 + len(body)) + body
+
+
+def manifest_xml(package: str, nsc: bool) -> bytes:
+	# 带资源ID的属性名必须排在字符串池最前面，与资源映射一一对应
+	strings = ['label', 'networkSecurityConfig', 'android', ANDROID_NS, 'manifest', 'application', 'package',
+	           package, 'Benchmark']
+	resource_ids = [ATTR_LABEL, ATTR_NETWORK_SECURITY_CONFIG]
+	attributes = [(3, 0, 8, TYPE_STRING, 8)]
+	if nsc:
+		attributes.append((3, 1, NO_INDEX, TYPE_REFERENCE, NETWORK_SECURITY_CONFIG_ID))
+	namespace = struct.pack('<II', 2, 3)
+	nodes = [
+		_node(0x0100, namespace),
+		_start_element(4, [(NO_INDEX, 6, 7, TYPE_STRING, 7)]),
+		_start_element(5, attributes),
+		_end_element(5),
+		_end_element(4),
+		_node(0x0101, namespace),
+	]
+	return _xml_document(strings, resource_ids, nodes)
+
+
+def network_security_config_xml() -> bytes:
+	"""只信任系统证书的网络安全配置"""
+	strings = ['network-security-config', 'base-config', 'trust-anchors', 'certificates', 'src', 'system']
+	nodes = [
+		_start_element(0, []),
+		_start_element(1, []),
+		_start_element(2, []),
+		_start_element(3, [(NO_INDEX, 4, 5, TYPE_STRING, 5)]),
+		_end_element(3),
+		_end_element(2),
+		_end_element(1),
+		_end_element(0),
+	]
+	return _xml_document(strings, [], nodes)
+
+
+def resource_table(package: str, paths: List[str]) -> bytes:
+	"""只含一个 xml 类型资源（网络安全配置）的资源表；paths 进入全局字符串池以模拟资源表大小"""
+	global_strings = [NETWORK_SECURITY_CONFIG_PATH] + paths
+	type_strings = _string_pool(['xml'])
+	key_strings = _string_pool(['network_security_config'])
+
+	spec_body = struct.pack('<I', 0)
+	type_spec = struct.pack('<HHIBBHI', 0x0202, 16, 16 + len(spec_body), XML_TYPE_ID, 0, 0, 1) + spec_body
+
+	config = struct.pack('<I', 64) + b'\0' * 60
+	header_size = 20 + len(config)
+	offsets = struct.pack('<I', 0)
+	entry = struct.pack('<HHI', 8, 0, 0) + struct.pack('<HBBI', 8, 0, TYPE_STRING, 0)
+	type_size = header_size + len(offsets) + len(entry)
+	type_chunk = (struct.pack('<HHIBBHII', 0x0201, header_size, type_size, XML_TYPE_ID, 0, 0, 1,
+	                          header_size + len(offsets)) + config + offsets + entry)
+
+	package_header_size = 288
+	name = package.encode('utf-16-le')[:254].ljust(256, b'\0')
+	type_strings_offset = package_header_size
+	key_strings_offset = type_strings_offset + len(type_strings)
+	body = type_strings + key_strings + type_spec + type_chunk
+	package_chunk = (struct.pack('<HHII', 0x0200, package_header_size, package_header_size + len(body), PACKAGE_ID)
+	                 + name + struct.pack('<IIIII', type_strings_offset, 1, key_strings_offset, 1, 0) + body)
+
+	table_body = _string_pool(global_strings) + package_chunk
+	return struct.pack('<HHII', 0x0002, 12, 12 + len(table_body), 1) + table_body
+
+
+# ---- APK ----
+
+def _payload(rng: random.Random, size: int, compressible: bool) -> bytes:
+	"""compressible 为真时生成约一半可压缩的数据，接近资源文件；否则为随机数据（dex、.so）"""
+	if not compressible:
+		return rng.randbytes(size)
+	half = rng.randbytes(size // 2)
+	return (half + bytes(size - len(half)))[:size]
+
+
+def build_apk(path: str, shape: str, nsc: bool, seed: int = 0) -> str:
+	"""生成一个合成APK，内容由 shape、nsc 与 seed 唯一决定"""
+	spec = SHAPES[shape]
+	rng = random.Random(f'{shape}:{nsc}:{seed}')
+	package = f"bench.{shape.replace('-', '_')}"
+	resource_paths = [f"res/drawable/r{i:05d}.png" for i in range(int(spec['resources']))]
+
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	staging = f"{path}.tmp"
+	with zipfile.ZipFile(staging, 'w', zipfile.ZIP_DEFLATED) as zf:
+		zf.writestr('AndroidManifest.xml', manifest_xml(package, nsc))
+		# resources.arsc 与 .so 按新版 AGP 的方式不压缩存放
+		zf.writestr(zipfile.ZipInfo('resources.arsc'), resource_table(package, resource_paths),
+		            compress_type=zipfile.ZIP_STORED)
+		if nsc:
+			zf.writestr(NETWORK_SECURITY_CONFIG_PATH, network_security_config_xml())
+		for resource in resource_paths:
+			zf.writestr(resource, _payload(rng, int(spec['resource_bytes']), True))
+		for index in range(int(spec['dex'])):
+			name = 'classes.dex' if index == 0 else f'classes{index + 1}.dex'
+			zf.writestr(name, b'dex\n035\0' + _payload(rng, int(spec['dex_bytes']) - 8, False))
+		for abi, size in dict(spec['native']).items():
+			zf.writestr(zipfile.ZipInfo(f'lib/{abi}/libbench.so'), _payload(rng, size, False),
+			            compress_type=zipfile.ZIP_STORED)
+	os.replace(staging, path)
+	return path
+
+
+def build_corpus(directory: str, variants: List[str], seed: int = 0,
+                 existing: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+	"""生成（或复用已存在的）一组合成APK，返回 {变体名: 路径}"""
+	corpus = dict(existing or {})
+	for variant in variants:
+		shape, nsc = parse_variant(variant)
+		if shape not in SHAPES:
+			raise ValueError(f"未知的APK形状：{shape}（可选 {', '.join(SHAPES)}）")
+		path = os.path.join(directory, f"{variant}-{seed}.apk")
+		if not os.path.exists(path):
+			build_apk(path, shape, nsc, seed)
+		corpus[variant] = path
+	return corpus
@@ -1,13 +1,46 @@
 from androguard.core.bytecodes.apk import APK
 from lxml import etree
+from core.apk_signer import ApkSigner, SigningError
+from core.axml import AxmlError
+from core.binary_patcher import BinaryPatcher
+from core.bundle import BundleRunner, is_bundle
+from core.checkpoint_store import CHECKPOINT_STAGES, CheckpointStore
+from core.decode_cache import DecodeCache, apktool_version, file_sha256
+from core.job_context import JobCancelledError, JobContext, JobOptions, SigningConfig
+from core.jvm_worker import JvmWorkerPool
+from core.memory_budget import MB, MemoryBudget, default_budget_bytes, estimate_heap_mb, projected_rss_bytes
+from core.preflight import PLAN_FULL, PLAN_SHORTCUT, PLAN_SKIP, probe_apk
+from core.tool_process import ToolProcess, ToolTimeoutError, decode_output
+from core.tool_progress import ApktoolProgress
+from core.tracing import traced_stage
+from core.keystore_loader import KeystoreError, UnsupportedKeystoreError, load_signing_key
+from core.result_cache import ResultCache
+from core.workdir_store import WorkDirStore
+from core.zip_writer import ZipRewriteError, rewrite_zip
+import hashlib
 import os
-import subprocess
-import tempfile
 import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import wait
 
 class ApkProcessor:
-    def __init__(self, config_manager, logger=None):
-        self.temp_dir = None
+    # 各项修改是否需要反编译 smali；全部不需要时自动使用仅资源解码模式
+    PATCH_NEEDS_SMALI = {
+        'network_security_config': False,
+        'debuggable': False,
+    }
+
+    # 反编译模式：full 反编译全部 dex；resources 仅解码资源，dex 原样保留并在回编译时原样拷贝
+    DECODE_MODES = ('auto', 'full', 'resources')
+
+    # 内存中保留的预检结果数，预先处理（prewarm）后开始的任务直接使用
+    PROBE_CACHE_SIZE = 32
+
+    def __init__(self, config_manager, logger=None, temp_root=None):
+        """temp_root 为工作目录与各缓存的根目录，默认使用仓库下的 temp"""
         self.config_manager = config_manager
         self.logger = logger or print  # Use provided logger or fallback to print
         self.tools_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tools'))
@@ -28,10 +61,47 @@ class ApkProcessor:
         if not os.path.exists(self.build_tools_dir):
             raise FileNotFoundError(f"未找到 build-tools 35.0.0 版本：{self.build_tools_dir}")
         
+        # apktool 按APK大小设置 -Xmx，并按预计内存占用准入（预算 0 表示按物理内存的 70%）
+        self.jvm_max_heap_mb = int(self.config_manager.get_value('jvm_max_heap_mb', 4096) or 4096)
+        budget_mb = int(self.config_manager.get_value('jvm_memory_budget_mb', 0) or 0)
+        self.memory_budget = MemoryBudget(budget_mb * MB if budget_mb > 0 else default_budget_bytes())
+
+        # 常驻 JVM 工具进程（可选）：apktool/apksigner 优先交给预热过的 JVM 执行，不可用时单独启动；
+        # 每个常驻进程按 -Xmx 上限占用内存预算，交给它执行的工具不再另外预约
+        self.jvm_pool = None
+        if self.config_manager.get_value('jvm_worker_enabled', False):
+            apksigner_jar = os.path.join(self.build_tools_dir, 'lib', 'apksigner.jar')
+            self.jvm_pool = JvmWorkerPool(
+                os.path.join(self.tools_dir, 'ToolWorker.java'),
+                size=int(self.config_manager.get_value('jvm_worker_count', 2) or 2),
+                jvm_options=[f'-Xmx{self.jvm_max_heap_mb}m'],
+                jar_aliases={os.path.join(self.build_tools_dir, name): apksigner_jar
+                             for name in ('apksigner', 'apksigner.bat')},
+                logger=self.logger, memory_budget=self.memory_budget,
+                worker_memory=projected_rss_bytes(self.jvm_max_heap_mb))
+        
         # 确保输出目录存在
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
+        # 临时目录统一由 WorkDirStore 管理（字节预算 + LRU 淘汰 + 崩溃回收）
+        self.temp_root = os.path.abspath(temp_root or os.path.join(os.path.dirname(__file__), '..', '..', 'temp'))
+        budget_mb = self.config_manager.get_value('temp_budget_mb', 10240) or 10240
+        self.workdir_store = WorkDirStore(self.temp_root, int(budget_mb) * 1024 * 1024, logger=self.logger)
+        self.decode_cache = DecodeCache(os.path.join(self.temp_root, 'decode_cache'), logger=self.logger,
+                                        store=self.workdir_store)
+        self.result_cache = ResultCache(os.path.join(self.temp_root, 'result_cache'), logger=self.logger,
+                                        store=self.workdir_store)
+        self.checkpoints = CheckpointStore(os.path.join(self.temp_root, 'checkpoints'), logger=self.logger,
+                                           store=self.workdir_store)
+
+        # 阶段耗时记录（core.tracing.TraceRecorder），为 None 时只保留在各任务的 ctx.trace 中
+        self.trace_recorder = None
+
+        # 按文件路径、大小、修改时间与影响预检的选项缓存的预检结果
+        self._probe_cache = OrderedDict()
+        self._probe_lock = threading.Lock()
+
     def _validate_apk_file(self, apk_path):
         """验证APK文件格式"""
         try:
@@ -41,107 +111,653 @@ class ApkProcessor:
         except Exception as e:
             raise Exception(f"APK文件格式无效，请确保文件未损坏：{str(e)}")
 
-    def process_apk(self, apk_path, cert_path, cert_password, key_alias, key_password, skip_decompile=False):
-        """处理APK文件的主要方法"""
+    def create_job(self, apk_path, cert_path, cert_password, key_alias, key_password,
+                   use_decode_cache=None, logger=None, cancel_token=None, variant=None, progress=None,
+                   output_tag=None, **overrides):
+        """按当前配置创建任务上下文；overrides 可覆盖 JobOptions 中的单项选项
+
+        variant 为输出变体名，会加在输出文件名后（见 core.variants.VariantRunner）；
+        output_tag 用于区分同一批中的同名输入（见 core.job_context.output_tags），会加在文件名后；
+        progress(百分比, 说明) 在整体进度增加时调用，可用于显示确定的进度条
+        """
+        options = JobOptions.from_config(self.config_manager, decode_cache=use_decode_cache, **overrides)
+        signing = SigningConfig(cert_path, cert_password, key_alias, key_password)
+        ctx = JobContext(apk_path, signing, options, logger=logger or self.logger, cancel_token=cancel_token,
+                         progress=progress)
+        ctx.variant = variant
+        ctx.output_tag = output_tag
+        ctx.trace.recorder = self.trace_recorder
+        return ctx
+
+    def process_apk(self, apk_path, cert_path, cert_password, key_alias, key_password, use_decode_cache=None,
+                    logger=None, cancel_token=None, progress=None):
+        """处理APK文件的主要方法
+
+        use_decode_cache 为 None 时按配置 decode_cache_enabled 决定是否复用反编译缓存
+        """
+        ctx = self.create_job(apk_path, cert_path, cert_password, key_alias, key_password,
+                              use_decode_cache=use_decode_cache, logger=logger, cancel_token=cancel_token,
+                              progress=progress)
+        return self.run_job(ctx)
+
+    def prewarm(self, apk_path, use_decode_cache=None, logger=None, cancel_token=None):
+        """预先完成与签名无关的耗时工作，返回预检结果（ProbeResult）
+
+        预检结果保存在内存中；需要 apktool 时反编译到反编译缓存。之后处理同一APK的任务直接使用这些结果，
+        反编译仍在进行时等待其完成。取消时结束正在运行的 apktool，缓存中不留下半成品。
+        拆分APK安装包与未启用反编译缓存时只做预检或什么都不做。
+        """
+        ctx = self.create_job(apk_path, '', '', '', '', use_decode_cache=use_decode_cache,
+                              logger=logger or (lambda message: None), cancel_token=cancel_token)
+        if is_bundle(ctx.apk_path):
+            return None
+        self._validate_apk_file(ctx.apk_path)
+        if self._preflight(ctx) != PLAN_FULL or not ctx.options.decode_cache:
+            return ctx.probe
+        # 已有回编译检查点时任务不会再反编译
+        if ctx.options.checkpoints and self.checkpoints.latest(self._checkpoint_key(ctx), CHECKPOINT_STAGES):
+            return ctx.probe
+        with ctx.trace.stage('decode'):
+            key = self._ensure_decoded(ctx, self._apktool_path())
+        self.decode_cache.unpin(key)
+        return ctx.probe
+
+    def run_job(self, ctx):
+        """执行一个任务；可在多个线程中对同一个引擎并发调用"""
+        if is_bundle(ctx.apk_path):
+            # 拆分APK安装包：只修改 base，拆分包并行重新签名
+            return BundleRunner(self).run(ctx)
         try:
-            self.logger(f"开始处理APK文件: {apk_path}")
-            # 验证文件是否存在
-            if not os.path.exists(apk_path):
-                raise FileNotFoundError(f"找不到APK文件：{apk_path}")
-            if not os.path.exists(cert_path):
-                raise FileNotFoundError(f"找不到证书文件：{cert_path}")
-
-            self.logger("正在验证APK文件格式...")
-            # 验证APK文件格式
-            self._validate_apk_file(apk_path)
-            self.logger("APK文件格式验证通过")
-
-            # 验证工具是否存在
-            apktool_path = os.path.join(self.tools_dir, 'apktool.jar')
-            if not os.path.exists(apktool_path):
-                raise FileNotFoundError(f"找不到apktool工具：{apktool_path}")
-
-
-            apk_base = os.path.splitext(os.path.basename(apk_path))[0]
-            temp_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'temp'))
-            if not os.path.exists(temp_root):
-                os.makedirs(temp_root)
-            temp_dir_path = os.path.join(temp_root, apk_base + '_work')
-            self.temp_dir = temp_dir_path
-            if skip_decompile and os.path.exists(temp_dir_path):
-                self.logger(f"跳过反编译，使用已存在的临时目录: {temp_dir_path}")
-            else:
-                # 清理并新建临时目录
-                if os.path.exists(temp_dir_path):
-                    self.logger(f"清理同名临时目录: {temp_dir_path}")
-                    shutil.rmtree(temp_dir_path)
-                os.makedirs(temp_dir_path)
-                self.logger(f"创建临时工作目录: {self.temp_dir}")
-                # 反编译APK
-                self.logger("开始反编译APK文件...")
-                self._decompile_apk(apk_path)
-                self.logger("APK反编译完成")
-            
-            # 修改网络安全配置
-            self.logger("开始修改网络安全配置...")
-            self._modify_network_security_config()
-            self.logger("网络安全配置修改完成")
-            
-            # 根据配置决定是否添加可调试属性
-            if self.config_manager.get_value('debuggable_enabled', False):
-                self.logger("开始检查和修改 debuggable 属性...")
-                self._modify_manifest()
-                self.logger("debuggable 属性检查修改完成")
-            
-            # 重新打包APK
-            self.logger("开始重新打包APK...")
-            new_apk_path = self._repackage_apk(apk_path)
-            self.logger(f"APK重打包完成: {new_apk_path}")
-            
-            # 如果启用了zipalign，在签名前进行优化
-            if self.config_manager.get_value('zipalign_enabled', False):
-                self.logger("正在进行zipalign优化...")
-                self._zipalign_apk(new_apk_path)
-                self.logger("zipalign优化完成")
-            
-            # 签名APK
-            self.logger("开始对APK进行签名...")
-            self._sign_apk(new_apk_path, cert_path, cert_password, key_alias, key_password)
-            self.logger("APK签名完成")
-            
+            self._prepare_job(ctx)
+
+            # 相同输入、选项与证书已处理过时直接复用上次的输出
+            new_apk_path = self._reuse_result(ctx)
+            if new_apk_path is None:
+                new_apk_path = self._build_unsigned(ctx)
+
+                # 签名APK
+                self._sign_apk(ctx, new_apk_path)
+
             # 移动最终的APK到输出目录
-            final_apk_name = os.path.basename(new_apk_path)
-            output_path = os.path.join(self.output_dir, final_apk_name)
-            shutil.move(new_apk_path, output_path)
-            self.logger(f"已将处理完成的APK移动到输出目录: {output_path}")
-            
+            self._finish_job(ctx, new_apk_path)
             return True, "处理完成"
+        except JobCancelledError:
+            return self._job_cancelled(ctx)
         except Exception as e:
-            error_msg = f"处理失败: {str(e)}"
-            self.logger(error_msg)
-            return False, error_msg
+            return self._job_failed(ctx, e)
         finally:
-            # 清理临时文件
-            self.cleanup()
+            self._end_job(ctx)
+
+    def _build_unsigned(self, ctx):
+        """生成待签名的APK，返回其在工作目录中的路径"""
+        # 先预检实际需要的修改：无需修改时只重新签名
+        plan = self._preflight(ctx)
+        new_apk_path = None
+        if plan == PLAN_SKIP:
+            new_apk_path = self._copy_unmodified(ctx)
+        elif plan == PLAN_SHORTCUT:
+            # 直接修改二进制XML，无需 apktool 反编译/回编译
+            new_apk_path = self._binary_patch_apk(ctx)
+        if new_apk_path is not None:
+            return new_apk_path
+
+        # 上次已回编译（或已对齐）时从检查点继续，例如签名失败后重试
+        new_apk_path, stage = self._resume_checkpoint(ctx)
+        if new_apk_path is None:
+            new_apk_path, stage = self._process_with_apktool(ctx), 'built'
+
+        # 如果启用了zipalign，在签名前进行优化（二进制修改时已在写入过程中完成对齐）
+        if ctx.options.zipalign and stage != 'aligned':
+            self._align_apk(ctx, new_apk_path)
+        return new_apk_path
+
+    def _end_job(self, ctx):
+        """输出各阶段耗时、结束结果缓存的处理权并清理临时文件"""
+        if ctx.result_claimed:
+            ctx.result_claimed = False
+            self.result_cache.release(ctx.result_key)
+        if ctx.trace.records:
+            ctx.log(f"阶段耗时：{ctx.trace.summary()}")
+        peak_rss = ctx.trace.tool_max_rss_bytes()
+        if peak_rss:
+            ctx.log(f"外部工具峰值内存：{peak_rss // MB} MB")
+        self.cleanup(ctx)
+
+    @traced_stage('prepare')
+    def _prepare_job(self, ctx):
+        """检查输入并分配工作目录"""
+        ctx.check_cancelled()
+        ctx.log(f"开始处理APK文件: {ctx.apk_path}")
+        # 验证文件是否存在
+        if not os.path.exists(ctx.apk_path):
+            raise FileNotFoundError(f"找不到APK文件：{ctx.apk_path}")
+        if not os.path.exists(ctx.signing.cert_path):
+            raise FileNotFoundError(f"找不到证书文件：{ctx.signing.cert_path}")
 
-    def _decompile_apk(self, apk_path):
-        """使用apktool反编译APK"""
+        ctx.log("正在验证APK文件格式...")
+        # 验证APK文件格式
+        self._validate_apk_file(ctx.apk_path)
+        ctx.log("APK文件格式验证通过")
+        ctx.trace.annotate(input_bytes=os.path.getsize(ctx.apk_path))
+
+        # 每个任务使用唯一的工作目录，中间文件都放在其中
+        ctx.work_dir = self.workdir_store.allocate(ctx.base_name)
+        ctx.log(f"创建临时工作目录: {ctx.work_dir}")
+
+    @traced_stage('finish')
+    def _finish_job(self, ctx, new_apk_path):
+        """把签名后的APK移动到输出目录"""
+        ctx.check_cancelled()
+        ctx.trace.annotate(output_bytes=os.path.getsize(new_apk_path))
+        if ctx.result_claimed:
+            self._store_result(ctx, new_apk_path)
+        output_path = self.output_path_for(ctx.apk_path, ctx.variant, ctx.output_tag)
+        self._publish_output(ctx, new_apk_path, output_path)
+        ctx.output_path = output_path
+        ctx.log(f"已将处理完成的APK移动到输出目录: {output_path}")
+        ctx.progress.update(1.0, "处理完成")
+
+    def _apk_sha256(self, ctx):
+        if ctx.apk_sha256 is None:
+            ctx.log("正在计算APK哈希...")
+            ctx.apk_sha256 = file_sha256(ctx.apk_path)
+        return ctx.apk_sha256
+
+    def _certificate_fingerprint(self, ctx):
+        """签名证书的 SHA-256；密钥库无法读取时返回 None"""
+        signing = ctx.signing
+        try:
+            key = load_signing_key(signing.cert_path, signing.cert_password, signing.key_alias,
+                                   signing.key_password)
+            return 'sha256:' + key.certificate_sha256()
+        except UnsupportedKeystoreError:
+            # 由 apksigner 签名的格式：以密钥库内容与凭据代替证书指纹，凭据错误时不会命中
+            credentials = '\0'.join([file_sha256(signing.cert_path), signing.cert_password, signing.key_alias,
+                                     signing.key_password])
+            return 'keystore:' + hashlib.sha256(credentials.encode('utf-8')).hexdigest()
+        except (KeystoreError, OSError) as e:
+            ctx.log(f"无法读取签名证书，不使用结果缓存: {str(e)}")
+            return None
+
+    def _result_cache_key(self, ctx):
+        """结果缓存的键与登记信息；无法确定签名证书时返回 (None, None)"""
+        certificate = self._certificate_fingerprint(ctx)
+        if certificate is None:
+            return None, None
+        options = ctx.options
+        patch_options = {
+            'binary_patch': options.binary_patch,
+            'debuggable': options.debuggable,
+            'zipalign': options.zipalign,
+            'native_signer': options.native_signer,
+            'decode_mode': self._decode_mode(ctx),
+            'preflight': options.preflight,
+        }
         apktool_path = os.path.join(self.tools_dir, 'apktool.jar')
-        self.logger(f"使用apktool工具: {apktool_path}")
-        result = subprocess.run(['java', '-jar', apktool_path, 'd', '-f', apk_path, '-o', self.temp_dir], 
-                             capture_output=True, text=True)
-        self.logger("apktool输出:")
-        if result.stdout:
-            self.logger(result.stdout)
-        if result.stderr:
-            self.logger("apktool错误输出:")
-            self.logger(result.stderr)
-        if result.returncode != 0:
-            raise Exception(f"APK反编译失败: {result.stderr}")
-
-    def _modify_network_security_config(self):
+        toolchain = {
+            'apktool': apktool_version(apktool_path) if os.path.exists(apktool_path) else '',
+            'build_tools': os.path.basename(self.build_tools_dir),
+        }
+        apk_sha256 = self._apk_sha256(ctx)
+        info = {
+            'apk_name': os.path.basename(ctx.apk_path),
+            'apk_sha256': apk_sha256,
+            'options': patch_options,
+            'toolchain': toolchain,
+        }
+        if certificate.startswith('sha256:'):
+            info['certificate'] = certificate
+        return ResultCache.make_key(apk_sha256, patch_options, certificate, toolchain), info
+
+    @traced_stage('cache')
+    def _claim_result(self, ctx):
+        """查询结果缓存，返回 (APK路径, 等待对象)
+
+        命中时返回复制到工作目录的APK；相同输入的任务正在处理时返回其 Future；
+        两者都为 None 表示由本任务处理，结束时由 _end_job 释放。
+        """
+        if not ctx.options.result_cache:
+            return None, None
+        ctx.check_cancelled()
+        if ctx.result_key is None:
+            ctx.result_key, ctx.result_info = self._result_cache_key(ctx)
+            if ctx.result_key is None:
+                return None, None
+        while True:
+            cached, pending = self.result_cache.claim(ctx.result_key)
+            if cached is None:
+                ctx.result_claimed = pending is None
+                ctx.trace.annotate(cache_hit=False)
+                return None, pending
+            new_apk_path = self._intermediate_apk_path(ctx)
+            if self.result_cache.checkout(ctx.result_key, new_apk_path):
+                ctx.result_cached = True
+                ctx.trace.annotate(cache_hit=True)
+                ctx.log(f"命中结果缓存，直接复用上次输出: {ctx.result_key[:12]}")
+                return new_apk_path, None
+
+    def _reuse_result(self, ctx):
+        """结果缓存命中时返回工作目录中的APK，否则返回 None；相同输入的任务正在处理时先等待其结束"""
+        while True:
+            new_apk_path, pending = self._claim_result(ctx)
+            if pending is None:
+                return new_apk_path
+            ctx.log("相同输入的任务正在处理，等待其结果...")
+            while not pending.done():
+                ctx.check_cancelled()
+                wait([pending], timeout=0.5)
+
+    def _store_result(self, ctx, new_apk_path):
+        """把签名后的APK写入结果缓存；失败不影响任务"""
+        try:
+            self.result_cache.store(ctx.result_key, new_apk_path, ctx.result_info)
+            ctx.log(f"已写入结果缓存: {ctx.result_key[:12]}")
+        except OSError as e:
+            ctx.log(f"写入结果缓存失败: {str(e)}")
+
+    def _checkpoint_key(self, ctx):
+        """未签名APK检查点的键：只取决于输入、影响回编译结果的选项与 apktool 版本"""
+        if ctx.checkpoint_key is None:
+            apktool_path = self._apktool_path()
+            options = {'debuggable': ctx.options.debuggable, 'decode_mode': self._decode_mode(ctx)}
+            ctx.checkpoint_key = CheckpointStore.make_key(self._apk_sha256(ctx), options,
+                                                          apktool_version(apktool_path))
+        return ctx.checkpoint_key
+
+    @traced_stage('resume')
+    def _resume_checkpoint(self, ctx):
+        """从检查点取出未签名的APK，返回 (APK路径, 阶段)；没有可用的检查点时返回 (None, None)"""
+        if not ctx.options.checkpoints:
+            return None, None
+        ctx.check_cancelled()
+        key = self._checkpoint_key(ctx)
+        # 未启用 zipalign 时只使用回编译的原始输出，与不经检查点时的结果一致
+        stage = self.checkpoints.latest(key, CHECKPOINT_STAGES if ctx.options.zipalign else ('built',))
+        if stage == 'built' and ctx.options.zipalign:
+            ctx.log("找到回编译检查点，跳过反编译与回编译")
+        elif stage is not None:
+            ctx.log("找到未签名APK的检查点，直接签名")
+        else:
+            return None, None
+        new_apk_path = self._intermediate_apk_path(ctx)
+        if not self.checkpoints.checkout(key, stage, new_apk_path):
+            return None, None
+        ctx.trace.annotate(checkpoint=stage)
+        return new_apk_path, stage
+
+    def _save_checkpoint(self, ctx, stage, apk_path):
+        """保存未签名APK的检查点；失败不影响任务"""
+        if not ctx.options.checkpoints:
+            return
+        info = {
+            'apk_name': os.path.basename(ctx.apk_path),
+            'apk_sha256': self._apk_sha256(ctx),
+            'debuggable': ctx.options.debuggable,
+            'decode_mode': self._decode_mode(ctx),
+        }
+        try:
+            self.checkpoints.save(self._checkpoint_key(ctx), stage, apk_path, info)
+        except OSError as e:
+            ctx.log(f"保存检查点失败: {str(e)}")
+
+    def _job_cancelled(self, ctx):
+        ctx.log("处理已取消")
+        return False, "处理已取消"
+
+    def _job_failed(self, ctx, error):
+        error_msg = f"处理失败: {str(error)}"
+        ctx.log(error_msg)
+        return False, error_msg
+
+    def output_path_for(self, apk_path, variant=None, tag=None):
+        """最终APK的路径：输出目录下添加_Trust后缀，输出变体再加上变体名；安装包保留原扩展名
+
+        tag 不为空时加在原文件名后，区分来自不同目录的同名输入。
+        """
+        base_name, extension = os.path.splitext(os.path.basename(apk_path))
+        if tag:
+            base_name = f"{base_name}_{tag}"
+        suffix = f"_Trust_{variant}" if variant else "_Trust"
+        return os.path.join(self.output_dir, f"{base_name}{suffix}{extension if is_bundle(apk_path) else '.apk'}")
+
+    def _intermediate_apk_path(self, ctx):
+        """任务工作目录中修改后APK的路径"""
+        return ctx.work_path(os.path.basename(self.output_path_for(ctx.apk_path, ctx.variant, ctx.output_tag)))
+
+    def _publish_output(self, ctx, apk_path, output_path):
+        """先复制到输出目录下的临时文件再原子替换，并发任务不会看到写了一半的APK"""
+        staging = f"{output_path}.{ctx.job_id}.tmp"
+        try:
+            shutil.move(apk_path, staging)
+            os.replace(staging, output_path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+
+    def _preflight(self, ctx):
+        """返回处理路径（PLAN_SKIP、PLAN_SHORTCUT 或 PLAN_FULL）；未启用预检时按 binary_patch 选项决定，与之前的流程一致"""
+        if not ctx.options.preflight:
+            return PLAN_SHORTCUT if ctx.options.binary_patch else PLAN_FULL
+        return self._probe_apk(ctx)
+
+    @traced_stage('probe')
+    def _probe_apk(self, ctx):
+        """预检APK：只读取中央目录与需要修改的条目，结论保存在 ctx.probe 中"""
+        ctx.check_cancelled()
+        key = self._probe_key(ctx)
+        with self._probe_lock:
+            probe = self._probe_cache.get(key)
+            if probe is not None:
+                self._probe_cache.move_to_end(key)
+        if probe is not None:
+            ctx.log("使用预先完成的预检结果")
+        else:
+            probe = probe_apk(ctx.apk_path, debuggable=ctx.options.debuggable, zipalign=ctx.options.zipalign,
+                              decode_sources=self._decode_mode(ctx) == 'full', logger=ctx.logger)
+            if probe.plan == PLAN_SHORTCUT and not ctx.options.binary_patch:
+                probe.plan = PLAN_FULL
+                probe.reasons.append("未启用二进制修改")
+            with self._probe_lock:
+                self._probe_cache[key] = probe
+                while len(self._probe_cache) > self.PROBE_CACHE_SIZE:
+                    self._probe_cache.popitem(last=False)
+        ctx.probe = probe
+        ctx.log(f"预检结果：{probe.describe()}")
+        ctx.trace.annotate(plan=probe.plan, estimated_s=probe.estimate_seconds(), **probe.stats.as_dict())
+        return probe.plan
+
+    def _probe_key(self, ctx):
+        """预检结果的缓存键：文件被修改或替换后不再命中"""
+        stat = os.stat(ctx.apk_path)
+        options = ctx.options
+        return (ctx.apk_path, stat.st_size, stat.st_mtime_ns, options.debuggable, options.zipalign,
+                options.binary_patch, self._decode_mode(ctx))
+
+    @traced_stage('patch')
+    def _copy_unmodified(self, ctx):
+        """无需修改时只重写一遍APK（移除旧签名，按需对齐），返回待签名的APK路径；无法重写时返回None"""
+        ctx.check_cancelled()
+        output_path = self._intermediate_apk_path(ctx)
+        try:
+            BinaryPatcher(logger=ctx.logger).write_apk(ctx.apk_path, output_path, {}, align=ctx.options.zipalign)
+        except ZipRewriteError as e:
+            ctx.log(f"APK无法直接重写，回退到apktool流程: {str(e)}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        ctx.trace.annotate(input_bytes=os.path.getsize(ctx.apk_path), output_bytes=os.path.getsize(output_path),
+                           replaced_entries=0)
+        ctx.log(f"APK无需修改，直接重新签名: {output_path}")
+        return output_path
+
+    @traced_stage('patch')
+    def _binary_patch_apk(self, ctx):
+        """直接修改APK中的二进制XML，返回新APK路径；遇到不支持的结构时返回None以回退到apktool"""
+        ctx.log("尝试直接修改二进制XML（无需apktool）...")
+        patcher = BinaryPatcher(logger=ctx.logger)
+        if ctx.probe is not None and ctx.probe.replacements is not None:
+            # 预检时已经生成了修改后的条目
+            replacements = ctx.probe.replacements
+        else:
+            try:
+                replacements = patcher.build_patches(ctx.apk_path, debuggable=ctx.options.debuggable)
+            except AxmlError as e:
+                ctx.log(f"二进制XML无法直接修改，回退到apktool流程: {str(e)}")
+                return None
+        ctx.check_cancelled()
+        output_path = self._intermediate_apk_path(ctx)
+        try:
+            patcher.write_apk(ctx.apk_path, output_path, replacements, align=ctx.options.zipalign)
+        except ZipRewriteError as e:
+            ctx.log(f"APK无法直接重写，回退到apktool流程: {str(e)}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        ctx.trace.annotate(input_bytes=os.path.getsize(ctx.apk_path), output_bytes=os.path.getsize(output_path),
+                           replaced_entries=len(replacements))
+        ctx.log(f"二进制修改完成，共替换 {len(replacements)} 个条目: {output_path}")
+        return output_path
+
+    def _process_with_apktool(self, ctx):
+        """反编译 → 修改 → 重新打包，返回新APK路径"""
+        self._decode_sources(ctx)
+        return self._build_apk(ctx)
+
+    @traced_stage('decode')
+    def _decode_sources(self, ctx):
+        """反编译（或从缓存取出）到工作目录并完成修改"""
+        apktool_path = self._apktool_path()
+        if ctx.options.decode_cache:
+            self._checkout_decoded_tree(ctx, apktool_path)
+        else:
+            # 反编译APK
+            ctx.log("开始反编译APK文件...")
+            self._decompile_apk(ctx, ctx.decoded_dir)
+            ctx.log("APK反编译完成")
+
+        self._apply_source_patches(ctx)
+
+    @traced_stage('build')
+    def _build_apk(self, ctx):
+        """重新打包APK，返回新APK路径"""
+        ctx.check_cancelled()
+        ctx.log("开始重新打包APK...")
+        new_apk_path = self._repackage_apk(ctx)
+        ctx.trace.annotate(output_bytes=os.path.getsize(new_apk_path))
+        ctx.log(f"APK重打包完成: {new_apk_path}")
+        self._save_checkpoint(ctx, 'built', new_apk_path)
+        return new_apk_path
+
+    def _apply_source_patches(self, ctx):
+        """在反编译目录中修改网络安全配置与 debuggable 属性"""
+        # 修改网络安全配置
+        ctx.check_cancelled()
+        ctx.log("开始修改网络安全配置...")
+        self._modify_network_security_config(ctx)
+        ctx.log("网络安全配置修改完成")
+        
+        # 根据配置决定是否添加可调试属性
+        if ctx.options.debuggable:
+            ctx.log("开始检查和修改 debuggable 属性...")
+            self._modify_manifest(ctx)
+            ctx.log("debuggable 属性检查修改完成")
+
+    def _apktool_path(self):
+        # 验证工具是否存在
+        apktool_path = os.path.join(self.tools_dir, 'apktool.jar')
+        if not os.path.exists(apktool_path):
+            raise FileNotFoundError(f"找不到apktool工具：{apktool_path}")
+        return apktool_path
+
+    def _decode_cache_entry(self, ctx, apktool_path):
+        """返回反编译缓存的键与登记信息"""
+        apk_sha256 = self._apk_sha256(ctx)
+        tool_version = apktool_version(apktool_path)
+        options = {'mode': self._decode_mode(ctx)}
+        info = {
+            'apk_name': os.path.basename(ctx.apk_path),
+            'apk_sha256': apk_sha256,
+            'apktool_version': tool_version,
+            'options': options,
+        }
+        return DecodeCache.make_key(apk_sha256, tool_version, options), info
+
+    def _checkout_decoded_tree(self, ctx, apktool_path):
+        """从反编译缓存取出结果到工作目录，未命中时先反编译并写入缓存"""
+        while True:
+            key = self._ensure_decoded(ctx, apktool_path)
+            try:
+                restored = self.decode_cache.checkout(key, ctx.decoded_dir)
+            finally:
+                self.decode_cache.unpin(key)
+            if restored:
+                break
+            ctx.log("反编译缓存已被淘汰，重新反编译...")
+        ctx.log(f"已复制反编译结果到工作目录: {ctx.decoded_dir}")
+
+    def _ensure_decoded(self, ctx, apktool_path):
+        """确保反编译缓存中有本任务的结果，返回缓存键；缓存树保持占用，用完后调用 decode_cache.unpin()
+
+        相同APK正在反编译时（另一个任务，或选择文件后开始的预先反编译）等待其完成，不重复反编译。
+        """
+        key, info = self._decode_cache_entry(ctx, apktool_path)
+        while True:
+            hit, pending = self.decode_cache.claim(key)
+            if pending is None:
+                break
+            ctx.log("相同APK正在反编译，等待其完成...")
+            while not pending.done():
+                ctx.check_cancelled()
+                wait([pending], timeout=0.5)
+        ctx.trace.annotate(cache_hit=bool(hit))
+        if hit:
+            ctx.log(f"命中反编译缓存（apktool {info['apktool_version']}）: {key[:12]}")
+            return key
+        try:
+            ctx.log("未命中反编译缓存，开始反编译APK文件...")
+            self.decode_cache.store(key, lambda output_dir: self._decompile_apk(ctx, output_dir), info)
+            ctx.log("APK反编译完成，已写入缓存")
+        finally:
+            self.decode_cache.release(key)
+        return key
+
+    def _enabled_patches(self, ctx):
+        """返回任务启用的修改项"""
+        patches = ['network_security_config']
+        if ctx.options.debuggable:
+            patches.append('debuggable')
+        return patches
+
+    def _decode_mode(self, ctx):
+        """根据任务选项与启用的修改项确定反编译模式"""
+        mode = ctx.options.decode_mode
+        if mode not in self.DECODE_MODES:
+            ctx.log(f"未知的反编译模式 {mode}，使用 auto")
+            mode = 'auto'
+        if mode == 'auto':
+            needs_smali = any(self.PATCH_NEEDS_SMALI.get(p, True) for p in self._enabled_patches(ctx))
+            mode = 'full' if needs_smali else 'resources'
+        return mode
+
+    def _decompile_command(self, ctx, output_dir):
+        apktool_path = os.path.join(self.tools_dir, 'apktool.jar')
+        ctx.log(f"使用apktool工具: {apktool_path}")
+        command = ['java', f'-Xmx{self._jvm_heap_mb(ctx)}m', '-jar', apktool_path, 'd', '-f', ctx.apk_path,
+                   '-o', output_dir]
+        if self._decode_mode(ctx) == 'resources':
+            # 不反编译 dex，回编译时 apktool 会原样拷贝 classes*.dex
+            ctx.log("使用仅资源解码模式，dex 文件原样保留")
+            command.append('--no-src')
+        return command
+
+    def _decompile_apk(self, ctx, output_dir):
+        """使用apktool反编译APK到指定目录"""
+        returncode, stdout, stderr = self._run_tool(ctx, self._decompile_command(ctx, output_dir),
+                                                    reserve_memory=True)
+        self._check_tool_result("APK反编译失败", returncode, stdout, stderr)
+
+    def _jvm_heap_mb(self, ctx):
+        """apktool 的堆大小（MB），每个任务估算一次"""
+        if ctx.jvm_heap_mb is None:
+            decode_sources = self._decode_mode(ctx) == 'full'
+            ctx.jvm_heap_mb = estimate_heap_mb(ctx.apk_path, decode_sources, self.jvm_max_heap_mb)
+        return ctx.jvm_heap_mb
+
+    def _jvm_memory_request(self, ctx):
+        """单独启动的 apktool 进程的预计内存占用（字节）与等待准入时的回调"""
+        heap_mb = self._jvm_heap_mb(ctx)
+
+        def on_wait(in_use, budget):
+            ctx.log(f"内存预算不足，等待其他任务释放（需要约 {projected_rss_bytes(heap_mb) // MB} MB，"
+                    f"已占用 {in_use // MB}/{budget // MB} MB）")
+            if self.jvm_pool is not None:
+                # 空闲的常驻进程一直占用预算，先结束它们
+                self.jvm_pool.trim_idle()
+        return projected_rss_bytes(heap_mb), on_wait
+
+    def _reserve_jvm_memory(self, ctx):
+        amount, on_wait = self._jvm_memory_request(ctx)
+        return self.memory_budget.reserve(amount, ctx.cancel_token, on_wait)
+
+    def _run_tool(self, ctx, command, reserve_memory=False):
+        """运行外部工具，返回 (退出码, 标准输出, 错误输出)；jar 工具优先交给常驻JVM
+
+        reserve_memory 为真（apktool）时，单独启动的进程按预计内存占用准入；常驻JVM已占用预算。
+
+        输出在运行时逐行写入日志并解析为进度，返回的输出只保留最后若干行（用于错误信息）。
+        任务取消或超过所在阶段的时限时立即结束工具的整个进程树。
+        """
+        tool = self._tool_name(command)
+        on_line = self._tool_output_handler(ctx, command)
+        timeout = ctx.tool_timeout()
+        if self.jvm_pool is not None:
+            start, started = time.time(), time.perf_counter()
+            try:
+                result = self.jvm_pool.run(command, ctx.cancel_token, timeout)
+            except ToolTimeoutError:
+                ctx.trace.add_tool_run(tool, start, time.perf_counter() - started, via='jvm_worker', timed_out=True)
+                raise ctx.stage_timeout_error(tool)
+            if result is not None:
+                ctx.trace.add_tool_run(tool, start, time.perf_counter() - started, returncode=result[0],
+                                       via='jvm_worker')
+            ctx.check_cancelled()
+            if result is not None:
+                self._replay_tool_output(on_line, result)
+                return result
+        ctx.check_cancelled()
+        with self._reserve_jvm_memory(ctx) if reserve_memory else nullcontext():
+            process = ToolProcess(command)
+            callback = ctx.cancel_token.add_callback(process.kill)
+            try:
+                returncode, stdout, stderr, usage = process.communicate(on_line, timeout)
+            except ToolTimeoutError as e:
+                ctx.trace.add_tool_run(tool, process.start, e.usage.wall_s, via='process', timed_out=True,
+                                       **e.usage.as_dict())
+                raise ctx.stage_timeout_error(tool)
+            finally:
+                ctx.cancel_token.remove_callback(callback)
+        ctx.trace.add_tool_run(tool, process.start, usage.wall_s, returncode=returncode, via='process',
+                               **usage.as_dict())
+        ctx.check_cancelled()
+        return returncode, decode_output(stdout), decode_output(stderr)
+
+    def _tool_output_handler(self, ctx, command):
+        """外部工具输出的逐行回调：写入日志，apktool 的步骤换算为任务进度"""
+        dex_count = ctx.probe.stats.dex_count if ctx.probe is not None else 1
+        progress = ApktoolProgress.for_command(command, dex_count=dex_count)
+
+        def on_line(stream, line):
+            ctx.log(line)
+            step = progress.feed(line) if progress is not None else None
+            if step is not None:
+                ctx.progress.update(step[1], step[0])
+        return on_line
+
+    @staticmethod
+    def _replay_tool_output(on_line, result):
+        """常驻JVM在命令结束后才返回输出，按行回放"""
+        _, stdout, stderr = result
+        for line in stdout.splitlines():
+            on_line('stdout', line)
+        for line in stderr.splitlines():
+            on_line('stderr', line)
+
+    @staticmethod
+    def _tool_name(command):
+        """用于耗时记录的工具名：java -jar 调用取 jar 名，否则取可执行文件名"""
+        if '-jar' in command[:-1]:
+            return os.path.basename(command[command.index('-jar') + 1])
+        return os.path.basename(command[0]) if command else ''
+
+    @staticmethod
+    def _check_tool_result(failure, returncode, stdout, stderr):
+        """退出码非零时抛出异常（输出已在运行时写入日志）"""
+        if returncode != 0:
+            raise Exception(f"{failure}: {stderr or stdout}")
+
+    def _modify_network_security_config(self, ctx):
         """修改网络安全配置"""
-        manifest_path = os.path.join(self.temp_dir, 'AndroidManifest.xml')
+        manifest_path = os.path.join(ctx.decoded_dir, 'AndroidManifest.xml')
         if not os.path.exists(manifest_path):
             raise FileNotFoundError(f"找不到AndroidManifest.xml文件：{manifest_path}")
 
@@ -149,11 +765,14 @@ class ApkProcessor:
         tree = etree.parse(manifest_path)
         root = tree.getroot()
         
-        # 获取网络安全配置文件路径
-        network_config = root.get('{http://schemas.android.com/apk/res/android}networkSecurityConfig')
+        # 获取网络安全配置文件路径（属性位于 application 节点上）
+        application = root.find('application')
+        network_config = None
+        if application is not None:
+            network_config = application.get('{http://schemas.android.com/apk/res/android}networkSecurityConfig')
         
         if network_config:
-            config_path = os.path.join(self.temp_dir, 'res', 'xml', 
+            config_path = os.path.join(ctx.decoded_dir, 'res', 'xml', 
                                      network_config.replace('@xml/', '') + '.xml')
             self._update_security_config(config_path)
 
@@ -175,65 +794,88 @@ class ApkProcessor:
         
         # 添加用户证书配置
         certificates = trust_anchors.findall('certificates')
-        user_cert_exists = any(cert.get('source') == 'user' for cert in certificates)
+        user_cert_exists = any((cert.get('src') or cert.get('source')) == 'user' for cert in certificates)
         
         if not user_cert_exists:
             cert_elem = etree.SubElement(trust_anchors, 'certificates')
-            cert_elem.set('source', 'user')
+            cert_elem.set('src', 'user')
         
         # 保存修改后的配置
         tree.write(config_path, encoding='utf-8', xml_declaration=True)
 
-    def _repackage_apk(self, apk_path):
-        """重新打包APK"""
-        # 获取原始APK文件名并添加_Trust后缀
-        original_name = os.path.basename(apk_path)
-        base_name = os.path.splitext(original_name)[0]
-        output_name = f"{base_name}_Trust.apk"
-        output_dir = os.path.dirname(apk_path)
-        output_path = os.path.join(output_dir, output_name)
-
+    def _repackage_command(self, ctx, output_path):
         apktool_path = os.path.join(self.tools_dir, 'apktool.jar')
-        self.logger(f"使用apktool重新打包: {apktool_path}")
-        result = subprocess.run(['java', '-jar', apktool_path, 'b', self.temp_dir, '-o', output_path], 
-                             capture_output=True, text=True)
-        self.logger("apktool打包输出:")
-        if result.stdout:
-            self.logger(result.stdout)
-        if result.stderr:
-            self.logger("apktool打包错误输出:")
-            self.logger(result.stderr)
-        if result.returncode != 0:
-            raise Exception(f"APK重打包失败: {result.stderr}")
+        ctx.log(f"使用apktool重新打包: {apktool_path}")
+        return ['java', f'-Xmx{self._jvm_heap_mb(ctx)}m', '-jar', apktool_path, 'b', ctx.decoded_dir,
+                '-o', output_path]
+
+    def _repackage_apk(self, ctx):
+        """重新打包APK"""
+        output_path = self._intermediate_apk_path(ctx)
+        returncode, stdout, stderr = self._run_tool(ctx, self._repackage_command(ctx, output_path),
+                                                    reserve_memory=True)
+        self._check_tool_result("APK重打包失败", returncode, stdout, stderr)
         return output_path
 
+    @traced_stage('align')
+    def _align_apk(self, ctx, apk_path):
+        ctx.check_cancelled()
+        ctx.log("正在进行zipalign优化...")
+        self._zipalign_apk(apk_path)
+        ctx.log("zipalign优化完成")
+        self._save_checkpoint(ctx, 'aligned', apk_path)
+
     def _zipalign_apk(self, apk_path):
-        """对APK进行zipalign优化"""
-        # 使用 Android SDK 中的 zipalign
-        zipalign_name = 'zipalign.exe' if os.name == 'nt' else 'zipalign'
-        zipalign_path = os.path.join(self.build_tools_dir, zipalign_name)
-        
-        if not os.path.exists(zipalign_path):
-            raise FileNotFoundError(f"找不到zipalign工具：{zipalign_path}")
-        
+        """对APK进行zipalign优化（进程内完成，压缩数据原样拷贝）"""
         aligned_apk = os.path.join(os.path.dirname(apk_path), 'aligned_' + os.path.basename(apk_path))
         
-        result = subprocess.run([
-            zipalign_path,
-            '-v', '4',
-            apk_path,
-            aligned_apk
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Zipalign失败: {result.stderr}")
+        try:
+            rewrite_zip(apk_path, aligned_apk)
+        except ZipRewriteError as e:
+            if os.path.exists(aligned_apk):
+                os.remove(aligned_apk)
+            raise Exception(f"Zipalign失败: {str(e)}")
         
         # 替换原文件
         os.replace(aligned_apk, apk_path)
 
-    def _sign_apk(self, apk_path, cert_path, cert_password, key_alias, key_password):
-        """使用 apksigner 签名 APK"""
-        self.logger(f"使用证书 {cert_path} 进行签名")
+    @traced_stage('sign')
+    def _sign_apk(self, ctx, apk_path):
+        """签名 APK：优先进程内签名，密钥库格式不支持时回退到 apksigner"""
+        ctx.check_cancelled()
+        ctx.log("开始对APK进行签名...")
+        if not self._sign_apk_native(ctx, apk_path):
+            self._sign_apk_with_apksigner(ctx, apk_path)
+        ctx.log("APK签名完成")
+
+    def _sign_apk_native(self, ctx, apk_path):
+        """进程内签名并校验；未启用或密钥库格式不支持时返回 False"""
+        signing = ctx.signing
+        ctx.log(f"使用证书 {signing.cert_path} 进行签名")
+        if not ctx.options.native_signer:
+            return False
+        try:
+            key = load_signing_key(signing.cert_path, signing.cert_password, signing.key_alias,
+                                   signing.key_password)
+            signer = ApkSigner(key)
+        except UnsupportedKeystoreError as e:
+            ctx.log(f"进程内签名不可用，回退到apksigner: {str(e)}")
+            return False
+        except KeystoreError as e:
+            raise Exception(f"APK签名失败: {str(e)}")
+        try:
+            # 未启用 zipalign 时保持条目原有偏移，与 apksigner 的输出一致
+            signer.sign(apk_path, apk_path, align=ctx.options.zipalign)
+            ctx.log("进程内签名完成（v1/v2/v3）")
+            signer.verify(apk_path)
+        except SigningError as e:
+            raise Exception(f"APK签名失败: {str(e)}")
+        ctx.log("签名验证通过")
+        return True
+
+    def _apksigner_commands(self, ctx, apk_path):
+        """返回 apksigner 的签名与校验命令"""
+        signing = ctx.signing
         
         # 使用 Android SDK 中的 apksigner
         apksigner_name = 'apksigner.bat' if os.name == 'nt' else 'apksigner'
@@ -242,40 +884,38 @@ class ApkProcessor:
         if not os.path.exists(apksigner_path):
             raise FileNotFoundError(f"找不到apksigner工具：{apksigner_path}")
         
-        result = subprocess.run([
+        sign_command = [
             apksigner_path, 'sign',
             '--v1-signing-enabled', 'true',
             '--v2-signing-enabled', 'true',
-            '--ks', cert_path,
-            '--ks-pass', f'pass:{cert_password}',
-            '--ks-key-alias', key_alias,
-            '--key-pass', f'pass:{key_password}',
+            '--ks', signing.cert_path,
+            '--ks-pass', f'pass:{signing.cert_password}',
+            '--ks-key-alias', signing.key_alias,
+            '--key-pass', f'pass:{signing.key_password}',
             apk_path
-        ], capture_output=True, text=True)
-        
-        self.logger("apksigner输出:")
-        if result.stdout:
-            self.logger(result.stdout)
-        if result.stderr:
-            self.logger("apksigner错误输出:")
-            self.logger(result.stderr)
-        if result.returncode != 0:
-            raise Exception(f"APK签名失败: {result.stderr}")
-        
-        # 验证签名
-        verify_result = subprocess.run([
+        ]
+        verify_command = [
             apksigner_path, 'verify',
             '--verbose',
             apk_path
-        ], capture_output=True, text=True)
+        ]
+        return sign_command, verify_command
+
+    def _sign_apk_with_apksigner(self, ctx, apk_path):
+        """使用 apksigner 签名 APK"""
+        sign_command, verify_command = self._apksigner_commands(ctx, apk_path)
+        returncode, stdout, stderr = self._run_tool(ctx, sign_command)
+        self._check_tool_result("APK签名失败", returncode, stdout, stderr)
         
-        if verify_result.returncode != 0:
-            raise Exception(f"签名验证失败: {verify_result.stderr}")
-        self.logger("签名验证通过")
+        # 验证签名
+        returncode, _, stderr = self._run_tool(ctx, verify_command)
+        if returncode != 0:
+            raise Exception(f"签名验证失败: {stderr}")
+        ctx.log("签名验证通过")
 
-    def _modify_manifest(self):
+    def _modify_manifest(self, ctx):
         """修改 AndroidManifest.xml，添加 debuggable 属性"""
-        manifest_path = os.path.join(self.temp_dir, 'AndroidManifest.xml')
+        manifest_path = os.path.join(ctx.decoded_dir, 'AndroidManifest.xml')
         if not os.path.exists(manifest_path):
             raise FileNotFoundError(f"找不到AndroidManifest.xml文件：{manifest_path}")
 
@@ -293,19 +933,27 @@ class ApkProcessor:
         debuggable_attr = f'{android_ns}debuggable'
         
         if debuggable_attr not in application.attrib or application.attrib[debuggable_attr] != 'true':
-            self.logger("添加 debuggable 属性")
+            ctx.log("添加 debuggable 属性")
             application.set(debuggable_attr, 'true')
             # 保存修改后的文件
             tree.write(manifest_path, encoding='utf-8', xml_declaration=True)
-            self.logger("AndroidManifest.xml 修改完成")
+            ctx.log("AndroidManifest.xml 修改完成")
         else:
-            self.logger("已存在 debuggable=true 配置")
-
-    def cleanup(self):
-        """清理临时文件"""
-        # if self.temp_dir and os.path.exists(self.temp_dir):
-        #     try:
-        #         shutil.rmtree(self.temp_dir)
-        #         self.logger("临时文件清理完成")
-        #     except Exception as e:
-        #         self.logger(f"清理临时文件失败: {str(e)}")
+            ctx.log("已存在 debuggable=true 配置")
+
+    def cleanup(self, ctx=None):
+        """释放任务的工作目录，并按预算淘汰缓存"""
+        if ctx is not None and ctx.work_dir:
+            try:
+                self.workdir_store.release(ctx.work_dir)
+                ctx.log("临时文件清理完成")
+            except Exception as e:
+                ctx.log(f"清理临时文件失败: {str(e)}")
+            finally:
+                ctx.work_dir = None
+        self.workdir_store.enforce_budget()
+
+    def close(self):
+        """关闭常驻JVM进程"""
+        if self.jvm_pool is not None:
+            self.jvm_pool.close()
@@ -0,0 +1,355 @@
+import base64
+import hashlib
+import mmap
+import os
+import re
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.serialization import pkcs7
+
+from core.keystore_loader import SigningKey, UnsupportedKeystoreError
+from core.zip_writer import (DEFAULT_ALIGNMENT, END_OF_CENTRAL_DIR_SIGNATURE, END_OF_CENTRAL_DIR_SIZE,
+                             ZipRewriteError, rewrite_zip)
+
+
+# APK Signature Scheme v2/v3 常量
+APK_SIG_BLOCK_MAGIC = b'APK Sig Block 42'
+APK_SIGNATURE_SCHEME_V2_BLOCK_ID = 0x7109871A
+APK_SIGNATURE_SCHEME_V3_BLOCK_ID = 0xF05368C0
+STRIPPING_PROTECTION_ATTR_ID = 0xBEEFF00D
+SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256 = 0x0103
+SIGNATURE_ECDSA_WITH_SHA256 = 0x0201
+V3_MIN_SDK_VERSION = 28
+V3_MAX_SDK_VERSION = 0x7FFFFFFF
+CHUNK_SIZE = 1024 * 1024
+
+V1_SIGNATURE_PATTERN = re.compile(r'^META-INF/([^/]+\.(SF|RSA|DSA|EC)|MANIFEST\.MF)$', re.IGNORECASE)
+CREATED_BY = '1.0 (Android)'
+
+
+class SigningError(Exception):
+	"""签名或签名校验失败"""
+
+
+def _lp(data: bytes) -> bytes:
+	"""带 uint32 长度前缀的数据"""
+	return struct.pack('<I', len(data)) + data
+
+
+def _lp_sequence(items: List[bytes]) -> bytes:
+	return _lp(b''.join(_lp(item) for item in items))
+
+
+def _read_lp(data: bytes, pos: int) -> Tuple[bytes, int]:
+	length = struct.unpack_from('<I', data, pos)[0]
+	pos += 4
+	if pos + length > len(data):
+		raise SigningError("签名块长度字段越界")
+	return data[pos:pos + length], pos + length
+
+
+def _read_lp_sequence(data: bytes) -> List[bytes]:
+	items = []
+	pos = 0
+	while pos < len(data):
+		item, pos = _read_lp(data, pos)
+		items.append(item)
+	return items
+
+
+def _manifest_line(key: str, value: str) -> bytes:
+	"""JAR清单行，超过72字节时按规范折行"""
+	line = f'{key}: {value}'.encode('utf-8')
+	out = bytearray(line[:70])
+	line = line[70:]
+	while line:
+		out += b'\r\n ' + line[:69]
+		line = line[69:]
+	return bytes(out) + b'\r\n'
+
+
+class ApkSigner:
+	"""进程内 APK 签名（v1 JAR签名 + APK Signature Scheme v2/v3）
+
+	v2/v3 的 1MB 分块摘要在线程池中并行计算，hashlib 与 zlib 处理大块数据时会释放 GIL。
+	"""
+
+	def __init__(self, key: SigningKey, v1_enabled: bool = True, v2_enabled: bool = True,
+	             v3_enabled: bool = True, max_workers: Optional[int] = None) -> None:
+		self.key = key
+		self.v1_enabled = v1_enabled
+		self.v2_enabled = v2_enabled
+		self.v3_enabled = v3_enabled
+		self.max_workers = max_workers or os.cpu_count() or 1
+		private_key = key.private_key
+		if isinstance(private_key, rsa.RSAPrivateKey):
+			self.algorithm_id = SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256
+			self.v1_extension = 'RSA'
+		elif isinstance(private_key, ec.EllipticCurvePrivateKey):
+			self.algorithm_id = SIGNATURE_ECDSA_WITH_SHA256
+			self.v1_extension = 'EC'
+		else:
+			raise UnsupportedKeystoreError(f"进程内签名不支持该密钥类型：{type(private_key).__name__}")
+
+	# ---- 对外接口 ----
+
+	def sign(self, apk_path: str, output_path: str, align: bool = True) -> None:
+		"""签名 apk_path 并写入 output_path（两者可以相同）"""
+		temp_path = output_path + '.signing'
+		try:
+			additions = self._v1_signature_files(apk_path) if self.v1_enabled else {}
+			rewrite_zip(apk_path, temp_path, alignment=DEFAULT_ALIGNMENT if align else 0,
+			            drop=lambda name: bool(V1_SIGNATURE_PATTERN.match(name)), additions=additions)
+			if self.v2_enabled or self.v3_enabled:
+				self._insert_signing_block(temp_path)
+			os.replace(temp_path, output_path)
+		except ZipRewriteError as e:
+			raise SigningError(f"APK结构无法签名：{str(e)}")
+		finally:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+
+	def verify(self, apk_path: str) -> None:
+		"""校验 v2/v3 签名块（摘要、签名、证书），失败时抛出 SigningError"""
+		with open(apk_path, 'rb') as f:
+			cd_offset, cd, eocd = self._read_zip_tail(f)
+			block_offset, pairs = self._read_signing_block(f, cd_offset)
+		expected_ids = []
+		if self.v2_enabled:
+			expected_ids.append(APK_SIGNATURE_SCHEME_V2_BLOCK_ID)
+		if self.v3_enabled:
+			expected_ids.append(APK_SIGNATURE_SCHEME_V3_BLOCK_ID)
+		if not expected_ids:
+			return
+
+		eocd = eocd[:16] + struct.pack('<I', block_offset) + eocd[20:]
+		digest = self._content_digest(apk_path, block_offset, cd, eocd)
+		for block_id in expected_ids:
+			if block_id not in pairs:
+				raise SigningError(f"缺少签名块：0x{block_id:08x}")
+			self._verify_scheme_block(pairs[block_id], digest, block_id == APK_SIGNATURE_SCHEME_V3_BLOCK_ID)
+
+		if self.v1_enabled:
+			with zipfile.ZipFile(apk_path) as zf:
+				names = set(zf.namelist())
+			if 'META-INF/MANIFEST.MF' not in names:
+				raise SigningError("缺少v1签名清单 META-INF/MANIFEST.MF")
+
+	# ---- v1 ----
+
+	def _v1_basename(self) -> str:
+		name = re.sub(r'[^A-Za-z0-9_-]', '_', self.key.alias.upper())[:8]
+		return name or 'CERT'
+
+	def _v1_signature_files(self, apk_path: str) -> Dict[str, bytes]:
+		with zipfile.ZipFile(apk_path) as zf:
+			infos = [info for info in zf.infolist()
+			         if not info.is_dir() and not V1_SIGNATURE_PATTERN.match(info.filename)]
+
+			def entry_digest(info: zipfile.ZipInfo) -> Tuple[str, str]:
+				digest = hashlib.sha256()
+				with zf.open(info) as entry:
+					for block in iter(lambda: entry.read(CHUNK_SIZE), b''):
+						digest.update(block)
+				return info.filename, base64.b64encode(digest.digest()).decode('ascii')
+
+			with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+				digests = sorted(pool.map(entry_digest, infos))
+
+		manifest = bytearray(_manifest_line('Manifest-Version', '1.0') + _manifest_line('Created-By', CREATED_BY)
+		                     + b'\r\n')
+		sections = []
+		for name, digest in digests:
+			section = _manifest_line('Name', name) + _manifest_line('SHA-256-Digest', digest) + b'\r\n'
+			manifest += section
+			sections.append((name, section))
+
+		schemes = [str(v) for v, enabled in ((2, self.v2_enabled), (3, self.v3_enabled)) if enabled]
+		signature_file = bytearray(_manifest_line('Signature-Version', '1.0')
+		                           + _manifest_line('Created-By', CREATED_BY)
+		                           + _manifest_line('SHA-256-Digest-Manifest',
+		                                            base64.b64encode(hashlib.sha256(manifest).digest()).decode()))
+		if schemes:
+			signature_file += _manifest_line('X-Android-APK-Signed', ', '.join(schemes))
+		signature_file += b'\r\n'
+		for name, section in sections:
+			signature_file += _manifest_line('Name', name)
+			signature_file += _manifest_line('SHA-256-Digest', base64.b64encode(hashlib.sha256(section).digest()).decode())
+			signature_file += b'\r\n'
+
+		builder = pkcs7.PKCS7SignatureBuilder().set_data(bytes(signature_file)).add_signer(
+			self.key.certificate, self.key.private_key, hashes.SHA256())
+		for certificate in self.key.certificates[1:]:
+			builder = builder.add_certificate(certificate)
+		signature_block = builder.sign(serialization.Encoding.DER, [
+			pkcs7.PKCS7Options.DetachedSignature, pkcs7.PKCS7Options.NoAttributes, pkcs7.PKCS7Options.Binary])
+
+		basename = self._v1_basename()
+		return {
+			'META-INF/MANIFEST.MF': bytes(manifest),
+			f'META-INF/{basename}.SF': bytes(signature_file),
+			f'META-INF/{basename}.{self.v1_extension}': signature_block,
+		}
+
+	# ---- v2 / v3 ----
+
+	@staticmethod
+	def _read_zip_tail(f) -> Tuple[int, bytes, bytes]:
+		f.seek(0, os.SEEK_END)
+		file_size = f.tell()
+		tail_size = min(file_size, END_OF_CENTRAL_DIR_SIZE + 0xFFFF)
+		f.seek(file_size - tail_size)
+		tail = f.read(tail_size)
+		pos = tail.rfind(struct.pack('<I', END_OF_CENTRAL_DIR_SIGNATURE))
+		if pos < 0:
+			raise SigningError("找不到ZIP中央目录结尾记录")
+		eocd = tail[pos:]
+		cd_size, cd_offset = struct.unpack_from('<II', eocd, 12)
+		f.seek(cd_offset)
+		return cd_offset, f.read(cd_size), eocd
+
+	@staticmethod
+	def _read_signing_block(f, cd_offset: int) -> Tuple[int, Dict[int, bytes]]:
+		if cd_offset < 32:
+			raise SigningError("APK中没有签名块")
+		f.seek(cd_offset - 24)
+		footer = f.read(24)
+		if footer[8:] != APK_SIG_BLOCK_MAGIC:
+			raise SigningError("APK中没有签名块")
+		block_size = struct.unpack_from('<Q', footer, 0)[0]
+		block_offset = cd_offset - block_size - 8
+		f.seek(block_offset + 8)
+		data = f.read(block_size - 24)
+		pairs = {}
+		pos = 0
+		while pos + 12 <= len(data):
+			length = struct.unpack_from('<Q', data, pos)[0]
+			pair_id = struct.unpack_from('<I', data, pos + 8)[0]
+			pairs[pair_id] = data[pos + 12:pos + 8 + length]
+			pos += 8 + length
+		return block_offset, pairs
+
+	def _content_digest(self, apk_path: str, entries_size: int, cd: bytes, eocd: bytes) -> bytes:
+		"""按 1MB 分块并行计算内容摘要（条目区、中央目录、EOCD 三段）"""
+		def chunk_digest(chunk) -> bytes:
+			digest = hashlib.sha256(b'\xa5' + struct.pack('<I', len(chunk)))
+			digest.update(chunk)
+			return digest.digest()
+
+		with open(apk_path, 'rb') as f:
+			mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if entries_size else None
+			try:
+				view = memoryview(mapped) if mapped is not None else memoryview(b'')
+				chunks = [view[i:min(i + CHUNK_SIZE, entries_size)] for i in range(0, entries_size, CHUNK_SIZE)]
+				for section in (cd, eocd):
+					chunks.extend(section[i:i + CHUNK_SIZE] for i in range(0, len(section), CHUNK_SIZE))
+				with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+					digests = list(pool.map(chunk_digest, chunks))
+				for chunk in chunks:
+					if isinstance(chunk, memoryview):
+						chunk.release()
+				view.release()
+			finally:
+				if mapped is not None:
+					mapped.close()
+		top = hashlib.sha256(b'\x5a' + struct.pack('<I', len(digests)))
+		for digest in digests:
+			top.update(digest)
+		return top.digest()
+
+	def _sign_data(self, data: bytes) -> bytes:
+		if self.algorithm_id == SIGNATURE_ECDSA_WITH_SHA256:
+			return self.key.private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+		return self.key.private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+	def _scheme_block(self, digest: bytes, v3: bool) -> bytes:
+		digests = _lp_sequence([struct.pack('<I', self.algorithm_id) + _lp(digest)])
+		certificates = _lp_sequence([c.public_bytes(serialization.Encoding.DER) for c in self.key.certificates])
+		public_key = self.key.certificate.public_key().public_bytes(
+			serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+		if v3:
+			sdk_range = struct.pack('<II', V3_MIN_SDK_VERSION, V3_MAX_SDK_VERSION)
+			signed_data = digests + certificates + sdk_range + _lp_sequence([])
+		else:
+			attributes = []
+			if self.v3_enabled:
+				# 防止 v3 签名被剥离后降级到 v2 校验
+				attributes.append(struct.pack('<II', STRIPPING_PROTECTION_ATTR_ID, 3))
+			sdk_range = b''
+			signed_data = digests + certificates + _lp_sequence(attributes)
+		signatures = _lp_sequence([struct.pack('<I', self.algorithm_id) + _lp(self._sign_data(signed_data))])
+		signer = _lp(signed_data) + sdk_range + signatures + _lp(public_key)
+		return _lp_sequence([signer])
+
+	def _insert_signing_block(self, apk_path: str) -> None:
+		with open(apk_path, 'rb') as f:
+			cd_offset, cd, eocd = self._read_zip_tail(f)
+		digest = self._content_digest(apk_path, cd_offset, cd, eocd)
+
+		pairs = bytearray()
+		for block_id, enabled, v3 in ((APK_SIGNATURE_SCHEME_V2_BLOCK_ID, self.v2_enabled, False),
+		                              (APK_SIGNATURE_SCHEME_V3_BLOCK_ID, self.v3_enabled, True)):
+			if enabled:
+				value = self._scheme_block(digest, v3)
+				pairs += struct.pack('<QI', len(value) + 4, block_id) + value
+		block_size = len(pairs) + 24
+		block = struct.pack('<Q', block_size) + pairs + struct.pack('<Q', block_size) + APK_SIG_BLOCK_MAGIC
+
+		eocd = eocd[:16] + struct.pack('<I', cd_offset + len(block)) + eocd[20:]
+		with open(apk_path, 'r+b') as f:
+			f.seek(cd_offset)
+			f.write(block)
+			f.write(cd)
+			f.write(eocd)
+			f.truncate()
+
+	def _verify_scheme_block(self, value: bytes, digest: bytes, v3: bool) -> None:
+		signers = _read_lp_sequence(_read_lp(value, 0)[0])
+		if not signers:
+			raise SigningError("签名块中没有签名者")
+		for signer in signers:
+			signed_data, pos = _read_lp(signer, 0)
+			if v3:
+				pos += 8
+			signatures, pos = _read_lp(signer, pos)
+			public_key_der, _ = _read_lp(signer, pos)
+			public_key = serialization.load_der_public_key(public_key_der)
+
+			verified = False
+			for signature in _read_lp_sequence(signatures):
+				algorithm_id = struct.unpack_from('<I', signature, 0)[0]
+				signature_bytes, _ = _read_lp(signature, 4)
+				try:
+					if algorithm_id == SIGNATURE_ECDSA_WITH_SHA256:
+						public_key.verify(signature_bytes, signed_data, ec.ECDSA(hashes.SHA256()))
+					elif algorithm_id == SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256:
+						public_key.verify(signature_bytes, signed_data, padding.PKCS1v15(), hashes.SHA256())
+					else:
+						continue
+				except InvalidSignature:
+					raise SigningError("签名数据校验失败")
+				verified = True
+			if not verified:
+				raise SigningError("签名块中没有可校验的签名算法")
+
+			digests_data, pos = _read_lp(signed_data, 0)
+			certificates_data, _ = _read_lp(signed_data, pos)
+			for item in _read_lp_sequence(digests_data):
+				if struct.unpack_from('<I', item, 0)[0] in (SIGNATURE_RSA_PKCS1_V1_5_WITH_SHA256,
+				                                           SIGNATURE_ECDSA_WITH_SHA256):
+					if _read_lp(item, 4)[0] != digest:
+						raise SigningError("APK内容摘要与签名不一致")
+			certificates = _read_lp_sequence(certificates_data)
+			if not certificates:
+				raise SigningError("签名块中没有证书")
+			leaf_key = x509.load_der_x509_certificate(certificates[0]).public_key().public_bytes(
+				serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+			if leaf_key != public_key_der:
+				raise SigningError("签名证书与公钥不匹配")
@@ -0,0 +1,303 @@
+"""ApkProcessor 的 asyncio 接口
+
+    engine = ApkProcessor(ConfigManager())
+    runner = AsyncApkProcessor(engine, stage_limits={'decode': 2, 'build': 2})
+    success, message = await runner.process_apk(apk_path, ks_path, ks_pass, alias, key_pass)
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from core.bundle import is_bundle
+from core.job_context import JobCancelledError, JobContext
+from core.preflight import PLAN_SHORTCUT, PLAN_SKIP
+from core.stages import merge_stage_limits
+from core.tool_process import ToolProcess, ToolTimeoutError, decode_output, pidfd_supported
+
+
+class AsyncApkProcessor:
+	"""在单个事件循环中并发执行多个任务
+
+	复用 ApkProcessor 引擎的命令构造与纯 Python 步骤：外部工具进程的输出由事件循环读取，退出由 pidfd 通知，
+	运行中的工具不占用线程；二进制修改、对齐与进程内签名放到默认线程池执行。每个阶段各有一个信号量限制并发数。
+	一个实例只应在一个事件循环中使用。
+
+	没有 pidfd 的系统（macOS、Windows、Linux 5.3 之前）上，asyncio 自己回收子进程会丢失 rusage，
+	因此改为在专用线程池中等待工具（每个运行中的工具占用该池一个线程和一个读取 stderr 的线程）。
+	专用池的大小等于会启动工具的阶段（decode、build、sign）的并发上限之和，工具再多也不会占满默认线程池。
+	"""
+
+	# 会启动外部工具的阶段
+	TOOL_STAGES = ('decode', 'build', 'sign')
+
+	def __init__(self, engine, stage_limits: Optional[Dict[str, int]] = None) -> None:
+		self.engine = engine
+		self.stage_limits = merge_stage_limits(stage_limits)
+		self._semaphores: Dict[str, asyncio.Semaphore] = {}
+		self._tool_pool: Optional[ThreadPoolExecutor] = None
+
+	def create_job(self, *args, **kwargs) -> JobContext:
+		return self.engine.create_job(*args, **kwargs)
+
+	async def process_apk(self, apk_path, cert_path, cert_password, key_alias, key_password, use_decode_cache=None,
+	                      logger=None, cancel_token=None) -> Tuple[bool, str]:
+		ctx = self.create_job(apk_path, cert_path, cert_password, key_alias, key_password,
+		                      use_decode_cache=use_decode_cache, logger=logger, cancel_token=cancel_token)
+		return await self.run_job(ctx)
+
+	async def run_jobs(self, contexts: Iterable[JobContext]) -> List[Tuple[bool, str]]:
+		"""并发执行多个任务，结果顺序与输入一致"""
+		return list(await asyncio.gather(*(self.run_job(ctx) for ctx in contexts)))
+
+	async def run_job(self, ctx: JobContext) -> Tuple[bool, str]:
+		engine = self.engine
+		if is_bundle(ctx.apk_path):
+			# 拆分APK安装包由引擎在线程池中并行处理各个APK
+			try:
+				return await asyncio.to_thread(engine.run_job, ctx)
+			except asyncio.CancelledError:
+				ctx.cancel_token.cancel()
+				raise
+		try:
+			await asyncio.to_thread(engine._prepare_job, ctx)
+
+			new_apk_path = await self.reuse_result(ctx)
+			if new_apk_path is None:
+				# 先预检实际需要的修改：无需修改时只重新签名，否则优先直接修改二进制XML
+				plan = await asyncio.to_thread(engine._preflight, ctx)
+				if plan in (PLAN_SKIP, PLAN_SHORTCUT):
+					patch = engine._copy_unmodified if plan == PLAN_SKIP else engine._binary_patch_apk
+					async with self.stage('patch'):
+						new_apk_path = await asyncio.to_thread(patch, ctx)
+
+				if new_apk_path is None:
+					new_apk_path, checkpoint = await asyncio.to_thread(engine._resume_checkpoint, ctx)
+					if new_apk_path is None:
+						new_apk_path, checkpoint = await self.process_with_apktool(ctx), 'built'
+					if ctx.options.zipalign and checkpoint != 'aligned':
+						await self.align(ctx, new_apk_path)
+
+				await self.sign(ctx, new_apk_path)
+			await asyncio.to_thread(engine._finish_job, ctx, new_apk_path)
+			return True, "处理完成"
+		except JobCancelledError:
+			return engine._job_cancelled(ctx)
+		except asyncio.CancelledError:
+			# 外部取消了协程：通知仍在线程池中运行的步骤尽快停止
+			ctx.cancel_token.cancel()
+			raise
+		except Exception as e:
+			return engine._job_failed(ctx, e)
+		finally:
+			await asyncio.shield(asyncio.to_thread(engine._end_job, ctx))
+
+	@asynccontextmanager
+	async def stage(self, name: str) -> AsyncIterator[None]:
+		"""占用阶段的一个并发名额"""
+		semaphore = self._semaphores.get(name)
+		if semaphore is None:
+			semaphore = self._semaphores[name] = asyncio.Semaphore(self.stage_limits[name])
+		async with semaphore:
+			yield
+
+	@asynccontextmanager
+	async def jvm_memory(self, ctx: JobContext) -> AsyncIterator[None]:
+		"""按预计内存占用准入单独启动的 apktool 进程（与同一引擎上的同步任务共用预算）"""
+		budget = self.engine.memory_budget
+		amount, on_wait = await asyncio.to_thread(self.engine._jvm_memory_request, ctx)
+		reserved = await asyncio.to_thread(budget.acquire, amount, ctx.cancel_token, on_wait)
+		try:
+			yield
+		finally:
+			budget.release(reserved)
+
+	# ---- 各阶段 ----
+
+	async def reuse_result(self, ctx: JobContext) -> Optional[str]:
+		"""结果缓存命中时返回工作目录中的APK；相同输入的任务正在处理时先等待其结束"""
+		while True:
+			new_apk_path, pending = await asyncio.to_thread(self.engine._claim_result, ctx)
+			if pending is None:
+				return new_apk_path
+			ctx.log("相同输入的任务正在处理，等待其结果...")
+			# shield：本协程被取消时不能取消其他任务持有的 Future
+			waiter = asyncio.shield(asyncio.wrap_future(pending))
+			while not pending.done():
+				ctx.check_cancelled()
+				await asyncio.wait({waiter}, timeout=0.5)
+
+	async def process_with_apktool(self, ctx: JobContext) -> str:
+		"""反编译 → 修改 → 重新打包，返回新APK路径"""
+		engine = self.engine
+		# 事件循环线程的 CPU 时间不属于单个任务，异步阶段只记录墙钟时间与工具调用
+		with ctx.trace.stage('decode', measure_cpu=False):
+			apktool_path = engine._apktool_path()
+			if ctx.options.decode_cache:
+				await self.checkout_decoded_tree(ctx, apktool_path)
+			else:
+				ctx.log("开始反编译APK文件...")
+				await self.decompile(ctx, ctx.decoded_dir)
+				ctx.log("APK反编译完成")
+
+			async with self.stage('patch'):
+				await asyncio.to_thread(engine._apply_source_patches, ctx)
+
+		with ctx.trace.stage('build', measure_cpu=False):
+			ctx.check_cancelled()
+			ctx.log("开始重新打包APK...")
+			output_path = engine._intermediate_apk_path(ctx)
+			async with self.stage('build'):
+				returncode, stdout, stderr = await self.run_tool(ctx, engine._repackage_command(ctx, output_path),
+				                                                 reserve_memory=True)
+			engine._check_tool_result("APK重打包失败", returncode, stdout, stderr)
+			ctx.trace.annotate(output_bytes=os.path.getsize(output_path))
+			ctx.log(f"APK重打包完成: {output_path}")
+			await asyncio.to_thread(engine._save_checkpoint, ctx, 'built', output_path)
+		return output_path
+
+	async def checkout_decoded_tree(self, ctx: JobContext, apktool_path: str) -> None:
+		"""从反编译缓存取出结果到工作目录，未命中时先反编译并写入缓存"""
+		engine = self.engine
+		cache = engine.decode_cache
+		key, info = await asyncio.to_thread(engine._decode_cache_entry, ctx, apktool_path)
+		while True:
+			hit, pending = await asyncio.to_thread(cache.claim, key)
+			if pending is not None:
+				ctx.log("相同APK正在反编译，等待其完成...")
+				waiter = asyncio.shield(asyncio.wrap_future(pending))
+				while not pending.done():
+					ctx.check_cancelled()
+					await asyncio.wait({waiter}, timeout=0.5)
+				continue
+			# 命中或写入缓存后缓存树一直被占用，复制完成前不会被预算淘汰
+			pinned = bool(hit)
+			try:
+				ctx.trace.annotate(cache_hit=bool(hit))
+				if hit:
+					ctx.log(f"命中反编译缓存（apktool {info['apktool_version']}）: {key[:12]}")
+				else:
+					ctx.log("未命中反编译缓存，开始反编译APK文件...")
+					staging = cache.staging_path(key)
+					try:
+						await self.decompile(ctx, staging)
+						await asyncio.to_thread(cache.commit, key, staging, info)
+						pinned = True
+					finally:
+						cache.release(key)
+						if os.path.exists(staging):
+							shutil.rmtree(staging, ignore_errors=True)
+					ctx.log("APK反编译完成，已写入缓存")
+				restored = await asyncio.to_thread(cache.checkout, key, ctx.decoded_dir)
+			finally:
+				if pinned:
+					cache.unpin(key)
+			if restored:
+				break
+			ctx.log("反编译缓存已被淘汰，重新反编译...")
+		ctx.log(f"已复制反编译结果到工作目录: {ctx.decoded_dir}")
+
+	async def decompile(self, ctx: JobContext, output_dir: str) -> None:
+		ctx.check_cancelled()
+		async with self.stage('decode'):
+			returncode, stdout, stderr = await self.run_tool(ctx, self.engine._decompile_command(ctx, output_dir),
+			                                                 reserve_memory=True)
+		self.engine._check_tool_result("APK反编译失败", returncode, stdout, stderr)
+
+	async def align(self, ctx: JobContext, apk_path: str) -> None:
+		ctx.check_cancelled()
+		async with self.stage('align'):
+			await asyncio.to_thread(self.engine._align_apk, ctx, apk_path)
+
+	async def sign(self, ctx: JobContext, apk_path: str) -> None:
+		"""优先进程内签名，密钥库格式不支持时回退到 apksigner 子进程"""
+		engine = self.engine
+		with ctx.trace.stage('sign', measure_cpu=False):
+			ctx.check_cancelled()
+			ctx.log("开始对APK进行签名...")
+			async with self.stage('sign'):
+				if not await asyncio.to_thread(engine._sign_apk_native, ctx, apk_path):
+					sign_command, verify_command = engine._apksigner_commands(ctx, apk_path)
+					returncode, stdout, stderr = await self.run_tool(ctx, sign_command)
+					engine._check_tool_result("APK签名失败", returncode, stdout, stderr)
+					returncode, _, stderr = await self.run_tool(ctx, verify_command)
+					if returncode != 0:
+						raise Exception(f"签名验证失败: {stderr}")
+					ctx.log("签名验证通过")
+			ctx.log("APK签名完成")
+
+	# ---- 子进程 ----
+
+	async def run_tool(self, ctx: JobContext, command: List[str],
+	                   reserve_memory: bool = False) -> Tuple[int, str, str]:
+		"""运行外部工具并返回 (退出码, 标准输出, 错误输出)；任务或协程被取消时终止子进程
+
+		reserve_memory 为真（apktool）时，单独启动的进程按预计内存占用准入；常驻JVM已占用预算。
+		"""
+		ctx.check_cancelled()
+		tool = self.engine._tool_name(command)
+		on_line = self.engine._tool_output_handler(ctx, command)
+		timeout = ctx.tool_timeout()
+		if self.engine.jvm_pool is not None:
+			start, started = time.time(), time.perf_counter()
+			try:
+				result = await asyncio.to_thread(self.engine.jvm_pool.run, command, ctx.cancel_token, timeout)
+			except ToolTimeoutError:
+				ctx.trace.add_tool_run(tool, start, time.perf_counter() - started, via='jvm_worker', timed_out=True)
+				raise ctx.stage_timeout_error(tool)
+			if result is not None:
+				ctx.trace.add_tool_run(tool, start, time.perf_counter() - started, returncode=result[0],
+				                       via='jvm_worker')
+			ctx.check_cancelled()
+			if result is not None:
+				self.engine._replay_tool_output(on_line, result)
+				return result
+		if reserve_memory:
+			async with self.jvm_memory(ctx):
+				return await self._run_process(ctx, command, tool, on_line, timeout)
+		return await self._run_process(ctx, command, tool, on_line, timeout)
+
+	async def _run_process(self, ctx: JobContext, command: List[str], tool: str, on_line,
+	                       timeout: Optional[float]) -> Tuple[int, str, str]:
+		process = ToolProcess(command)
+		callback = ctx.cancel_token.add_callback(process.kill)
+		try:
+			returncode, stdout, stderr, usage = await self._communicate(process, on_line, timeout)
+		except ToolTimeoutError as e:
+			ctx.trace.add_tool_run(tool, process.start, e.usage.wall_s, via='process', timed_out=True,
+			                       **e.usage.as_dict())
+			raise ctx.stage_timeout_error(tool)
+		finally:
+			ctx.cancel_token.remove_callback(callback)
+		ctx.trace.add_tool_run(tool, process.start, usage.wall_s, returncode=returncode, via='process',
+		                       **usage.as_dict())
+		ctx.check_cancelled()
+		return returncode, decode_output(stdout), decode_output(stderr)
+
+	async def _communicate(self, process: ToolProcess, on_line, timeout: Optional[float]):
+		"""等待工具退出，返回 (退出码, 标准输出, 错误输出, 资源占用)；协程被取消时结束进程树并回收"""
+		if pidfd_supported():
+			return await process.communicate_async(on_line, timeout)
+		if self._tool_pool is None:
+			size = sum(self.stage_limits[name] for name in self.TOOL_STAGES)
+			self._tool_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='tool-wait')
+		waiter = asyncio.get_running_loop().run_in_executor(self._tool_pool, process.communicate, on_line, timeout)
+		try:
+			return await asyncio.shield(waiter)
+		except asyncio.CancelledError:
+			process.kill()
+			try:
+				await waiter
+			except ToolTimeoutError:
+				pass
+			raise
+
+	def close(self) -> None:
+		"""关闭等待工具用的专用线程池（只在没有 pidfd 的系统上创建）"""
+		if self._tool_pool is not None:
+			self._tool_pool.shutdown(wait=False)
+			self._tool_pool = None
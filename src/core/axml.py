@@ -0,0 +1,546 @@
+import struct
+from typing import Dict, List, Optional, Tuple
+
+
+# 资源块类型（参见 AOSP ResourceTypes.h）
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_XML_TYPE = 0x0003
+RES_XML_START_NAMESPACE_TYPE = 0x0100
+RES_XML_END_NAMESPACE_TYPE = 0x0101
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_CDATA_TYPE = 0x0104
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+
+# Res_value 数据类型
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_INT_BOOLEAN = 0x12
+
+NO_INDEX = 0xFFFFFFFF
+
+SORTED_FLAG = 1 << 0
+UTF8_FLAG = 1 << 8
+
+ANDROID_NS = 'http://schemas.android.com/apk/res/android'
+
+
+class AxmlError(Exception):
+	"""二进制XML或资源表结构无法识别/不支持时抛出"""
+
+
+def _decode_length8(data: bytes, pos: int) -> Tuple[int, int]:
+	value = data[pos]
+	if value & 0x80:
+		return ((value & 0x7F) << 8) | data[pos + 1], pos + 2
+	return value, pos + 1
+
+
+def _decode_length16(data: bytes, pos: int) -> Tuple[int, int]:
+	value = struct.unpack_from('<H', data, pos)[0]
+	if value & 0x8000:
+		low = struct.unpack_from('<H', data, pos + 2)[0]
+		return ((value & 0x7FFF) << 16) | low, pos + 4
+	return value, pos + 2
+
+
+def _encode_length8(value: int) -> bytes:
+	if value > 0x7FFF:
+		raise AxmlError(f"字符串过长，无法以UTF-8编码写回：{value}")
+	if value > 0x7F:
+		return bytes([0x80 | (value >> 8), value & 0xFF])
+	return bytes([value])
+
+
+def _encode_length16(value: int) -> bytes:
+	if value > 0x7FFF:
+		return struct.pack('<HH', 0x8000 | (value >> 16), value & 0xFFFF)
+	return struct.pack('<H', value)
+
+
+class StringPool:
+	"""ResStringPool 的读写实现
+
+	读取时按需解码，未修改的字符串写回时保持原始字节不变。
+	"""
+
+	def __init__(self, data: bytes, offset: int = 0) -> None:
+		chunk_type, header_size, size = struct.unpack_from('<HHI', data, offset)
+		if chunk_type != RES_STRING_POOL_TYPE:
+			raise AxmlError(f"字符串池类型错误：0x{chunk_type:04x}")
+		count, style_count, flags, strings_start, styles_start = struct.unpack_from('<IIIII', data, offset + 8)
+		self.utf8 = bool(flags & UTF8_FLAG)
+		self.size = size
+		self._data = data
+		self._strings_base = offset + strings_start
+		self._offsets = struct.unpack_from(f'<{count}I', data, offset + header_size)
+		self._entries: Optional[List[bytes]] = None
+
+		self.styles: List[List[Tuple[int, int, int]]] = []
+		style_offsets = struct.unpack_from(f'<{style_count}I', data, offset + header_size + 4 * count)
+		for style_offset in style_offsets:
+			pos = offset + styles_start + style_offset
+			spans = []
+			while True:
+				name = struct.unpack_from('<I', data, pos)[0]
+				if name == NO_INDEX:
+					break
+				first, last = struct.unpack_from('<II', data, pos + 4)
+				spans.append((name, first, last))
+				pos += 12
+			self.styles.append(spans)
+
+	def __len__(self) -> int:
+		if self._entries is not None:
+			return len(self._entries)
+		return len(self._offsets)
+
+	def _raw_entry(self, pos: int) -> bytes:
+		data = self._data
+		if self.utf8:
+			_, p = _decode_length8(data, pos)
+			length, p = _decode_length8(data, p)
+			return data[pos:p + length + 1]
+		length, p = _decode_length16(data, pos)
+		return data[pos:p + length * 2 + 2]
+
+	def _decode_entry(self, entry: bytes) -> str:
+		if self.utf8:
+			_, p = _decode_length8(entry, 0)
+			length, p = _decode_length8(entry, p)
+			return entry[p:p + length].decode('utf-8', errors='replace')
+		length, p = _decode_length16(entry, 0)
+		return entry[p:p + length * 2].decode('utf-16-le', errors='replace')
+
+	def _encode_entry(self, value: str) -> bytes:
+		units = len(value.encode('utf-16-le', errors='surrogatepass')) // 2
+		if self.utf8:
+			encoded = value.encode('utf-8', errors='surrogatepass')
+			return _encode_length8(units) + _encode_length8(len(encoded)) + encoded + b'\x00'
+		return _encode_length16(units) + value.encode('utf-16-le', errors='surrogatepass') + b'\x00\x00'
+
+	def get(self, index: int) -> str:
+		if index == NO_INDEX or index >= len(self):
+			return ''
+		if self._entries is not None:
+			return self._decode_entry(self._entries[index])
+		return self._decode_entry(self._raw_entry(self._strings_base + self._offsets[index]))
+
+	def find(self, value: str, start: int = 0) -> int:
+		for index in range(start, len(self)):
+			if self.get(index) == value:
+				return index
+		return -1
+
+	def _materialize(self) -> List[bytes]:
+		if self._entries is None:
+			self._entries = [self._raw_entry(self._strings_base + off) for off in self._offsets]
+		return self._entries
+
+	def insert(self, index: int, value: str) -> None:
+		"""在指定位置插入字符串；调用方负责修正所有引用"""
+		self._materialize().insert(index, self._encode_entry(value))
+		if index < len(self.styles):
+			self.styles.insert(index, [])
+		self.styles = [[(name + 1 if name >= index else name, first, last) for name, first, last in spans]
+		               for spans in self.styles]
+
+	def append(self, value: str) -> int:
+		entries = self._materialize()
+		entries.append(self._encode_entry(value))
+		return len(entries) - 1
+
+	def serialize(self) -> bytes:
+		entries = self._materialize()
+		offsets = []
+		strings_data = bytearray()
+		for entry in entries:
+			offsets.append(len(strings_data))
+			strings_data += entry
+		while len(strings_data) % 4:
+			strings_data += b'\x00'
+
+		styles_data = bytearray()
+		style_offsets = []
+		if self.styles:
+			for spans in self.styles:
+				style_offsets.append(len(styles_data))
+				for name, first, last in spans:
+					styles_data += struct.pack('<III', name, first, last)
+				styles_data += struct.pack('<I', NO_INDEX)
+			styles_data += struct.pack('<II', NO_INDEX, NO_INDEX)
+
+		header_size = 28
+		strings_start = header_size + 4 * len(offsets) + 4 * len(style_offsets)
+		styles_start = strings_start + len(strings_data) if style_offsets else 0
+		size = strings_start + len(strings_data) + len(styles_data)
+		flags = UTF8_FLAG if self.utf8 else 0
+		out = bytearray(struct.pack('<HHIIIIII', RES_STRING_POOL_TYPE, header_size, size,
+		                            len(offsets), len(style_offsets), flags, strings_start, styles_start))
+		out += struct.pack(f'<{len(offsets)}I', *offsets)
+		out += struct.pack(f'<{len(style_offsets)}I', *style_offsets)
+		out += strings_data
+		out += styles_data
+		return bytes(out)
+
+
+class XmlAttribute:
+	def __init__(self, ns: int, name: int, raw_value: int, data_type: int, data: int) -> None:
+		self.ns = ns
+		self.name = name
+		self.raw_value = raw_value
+		self.data_type = data_type
+		self.data = data
+
+
+class XmlNode:
+	"""二进制XML中的一个节点块（命名空间、元素起止、CDATA）"""
+
+	def __init__(self, chunk_type: int, line: int = 0, comment: int = NO_INDEX) -> None:
+		self.type = chunk_type
+		self.line = line
+		self.comment = comment
+		self.ns = NO_INDEX        # START/END_ELEMENT 的命名空间，或 NAMESPACE 的 prefix
+		self.name = NO_INDEX      # START/END_ELEMENT 的名称，或 NAMESPACE 的 uri，或 CDATA 的数据
+		self.attributes: List[XmlAttribute] = []
+		self.id_index = 0
+		self.class_index = 0
+		self.style_index = 0
+		self.data_type = 0        # 仅 CDATA 使用
+		self.data = 0
+		self.raw = b''            # 无法识别的块原样保留
+
+	def string_refs(self) -> List[Tuple[object, str]]:
+		refs: List[Tuple[object, str]] = [(self, 'comment'), (self, 'ns'), (self, 'name')]
+		if self.type == RES_XML_CDATA_TYPE and self.data_type == TYPE_STRING:
+			refs.append((self, 'data'))
+		for attr in self.attributes:
+			refs.extend([(attr, 'ns'), (attr, 'name'), (attr, 'raw_value')])
+			if attr.data_type == TYPE_STRING:
+				refs.append((attr, 'data'))
+		return refs
+
+
+class AxmlDocument:
+	"""编译后的 Android 二进制XML（AndroidManifest.xml、res/xml/*.xml）"""
+
+	def __init__(self, strings: StringPool, resource_ids: List[int], nodes: List[XmlNode]) -> None:
+		self.strings = strings
+		self.resource_ids = resource_ids
+		self.nodes = nodes
+
+	@classmethod
+	def parse(cls, data: bytes) -> 'AxmlDocument':
+		if len(data) < 8:
+			raise AxmlError("二进制XML数据过短")
+		chunk_type, header_size, size = struct.unpack_from('<HHI', data, 0)
+		if chunk_type != RES_XML_TYPE:
+			raise AxmlError(f"不是二进制XML文件（类型 0x{chunk_type:04x}）")
+		size = min(size, len(data))
+
+		strings = None
+		resource_ids: List[int] = []
+		nodes: List[XmlNode] = []
+		pos = header_size
+		while pos + 8 <= size:
+			ctype, chsize, csize = struct.unpack_from('<HHI', data, pos)
+			if csize < 8 or pos + csize > size:
+				raise AxmlError(f"二进制XML块长度异常：偏移 {pos}")
+			if ctype == RES_STRING_POOL_TYPE:
+				strings = StringPool(data, pos)
+			elif ctype == RES_XML_RESOURCE_MAP_TYPE:
+				count = (csize - chsize) // 4
+				resource_ids = list(struct.unpack_from(f'<{count}I', data, pos + chsize))
+			elif RES_XML_START_NAMESPACE_TYPE <= ctype <= RES_XML_CDATA_TYPE:
+				nodes.append(cls._parse_node(data, pos, ctype, chsize))
+			else:
+				node = XmlNode(ctype)
+				node.raw = data[pos:pos + csize]
+				nodes.append(node)
+			pos += csize
+
+		if strings is None:
+			raise AxmlError("二进制XML缺少字符串池")
+		return cls(strings, resource_ids, nodes)
+
+	@staticmethod
+	def _parse_node(data: bytes, pos: int, ctype: int, header_size: int) -> XmlNode:
+		line, comment = struct.unpack_from('<II', data, pos + 8)
+		node = XmlNode(ctype, line, comment)
+		ext = pos + header_size
+		if ctype in (RES_XML_START_NAMESPACE_TYPE, RES_XML_END_NAMESPACE_TYPE,
+		             RES_XML_END_ELEMENT_TYPE):
+			node.ns, node.name = struct.unpack_from('<II', data, ext)
+		elif ctype == RES_XML_CDATA_TYPE:
+			node.name, _, _, node.data_type, node.data = struct.unpack_from('<IHBBI', data, ext + 0)
+		else:
+			(node.ns, node.name, attr_start, attr_size, attr_count,
+			 node.id_index, node.class_index, node.style_index) = struct.unpack_from('<IIHHHHHH', data, ext)
+			for i in range(attr_count):
+				a_ns, a_name, a_raw, _, _, a_type, a_data = struct.unpack_from(
+					'<IIIHBBI', data, ext + attr_start + i * attr_size)
+				node.attributes.append(XmlAttribute(a_ns, a_name, a_raw, a_type, a_data))
+		return node
+
+	def serialize(self) -> bytes:
+		body = bytearray(self.strings.serialize())
+		if self.resource_ids:
+			body += struct.pack('<HHI', RES_XML_RESOURCE_MAP_TYPE, 8, 8 + 4 * len(self.resource_ids))
+			body += struct.pack(f'<{len(self.resource_ids)}I', *self.resource_ids)
+		for node in self.nodes:
+			body += self._serialize_node(node)
+		return struct.pack('<HHI', RES_XML_TYPE, 8, 8 + len(body)) + bytes(body)
+
+	@staticmethod
+	def _serialize_node(node: XmlNode) -> bytes:
+		if node.raw:
+			return node.raw
+		if node.type == RES_XML_START_ELEMENT_TYPE:
+			ext = struct.pack('<IIHHHHHH', node.ns, node.name, 20, 20, len(node.attributes),
+			                  node.id_index, node.class_index, node.style_index)
+			for attr in node.attributes:
+				ext += struct.pack('<IIIHBBI', attr.ns, attr.name, attr.raw_value, 8, 0,
+				                   attr.data_type, attr.data)
+		elif node.type == RES_XML_CDATA_TYPE:
+			ext = struct.pack('<IHBBI', node.name, 8, 0, node.data_type, node.data)
+		else:
+			ext = struct.pack('<II', node.ns, node.name)
+		return struct.pack('<HHIII', node.type, 16, 16 + len(ext), node.line, node.comment) + ext
+
+	# ---- 字符串与属性 ----
+
+	def _shift_string_refs(self, index: int) -> None:
+		for node in self.nodes:
+			if node.raw:
+				raise AxmlError("二进制XML包含未知块，无法安全地插入字符串")
+			for owner, field in node.string_refs():
+				value = getattr(owner, field)
+				if value != NO_INDEX and value >= index:
+					setattr(owner, field, value + 1)
+
+	def string_index(self, value: str, mapped: bool = False) -> int:
+		"""返回字符串索引，不存在时追加
+
+		普通字符串不能落在资源ID映射区间内，否则会被当作带资源ID的属性名。
+		"""
+		start = 0 if mapped else len(self.resource_ids)
+		index = self.strings.find(value, start)
+		if index >= 0:
+			return index
+		return self.strings.append(value)
+
+	def attribute_name_index(self, name: str, resource_id: int) -> int:
+		"""返回带资源ID的属性名字符串索引，必要时插入到资源映射区间末尾"""
+		for index, rid in enumerate(self.resource_ids):
+			if rid == resource_id and self.strings.get(index) == name:
+				return index
+		index = len(self.resource_ids)
+		self._shift_string_refs(index)
+		self.strings.insert(index, name)
+		self.resource_ids.append(resource_id)
+		return index
+
+	def namespace_index(self, uri: str) -> int:
+		for node in self.nodes:
+			if node.type == RES_XML_START_NAMESPACE_TYPE and self.strings.get(node.name) == uri:
+				return node.name
+		raise AxmlError(f"二进制XML未声明命名空间：{uri}")
+
+	def resource_id_of(self, name_index: int) -> Optional[int]:
+		if name_index < len(self.resource_ids):
+			return self.resource_ids[name_index]
+		return None
+
+	def find_attribute(self, node: XmlNode, name: str, resource_id: Optional[int] = None) -> Optional[XmlAttribute]:
+		for attr in node.attributes:
+			if resource_id is not None and self.resource_id_of(attr.name) == resource_id:
+				return attr
+		for attr in node.attributes:
+			if self.strings.get(attr.name) == name:
+				return attr
+		return None
+
+	def attribute_string(self, attr: XmlAttribute) -> str:
+		if attr.raw_value != NO_INDEX:
+			return self.strings.get(attr.raw_value)
+		if attr.data_type == TYPE_STRING:
+			return self.strings.get(attr.data)
+		return ''
+
+	def set_boolean_attribute(self, node: XmlNode, ns_uri: str, name: str, resource_id: int, value: bool) -> bool:
+		"""设置布尔属性，返回是否发生了修改"""
+		data = 0xFFFFFFFF if value else 0
+		attr = self.find_attribute(node, name, resource_id)
+		if attr is not None:
+			if attr.data_type == TYPE_INT_BOOLEAN and bool(attr.data) == value:
+				return False
+			attr.data_type = TYPE_INT_BOOLEAN
+			attr.data = data
+			attr.raw_value = NO_INDEX
+			return True
+
+		name_index = self.attribute_name_index(name, resource_id)
+		attr = XmlAttribute(self.namespace_index(ns_uri), name_index, NO_INDEX, TYPE_INT_BOOLEAN, data)
+		# aapt 按资源ID升序排列属性，无资源ID的属性排在最后
+		position = len(node.attributes)
+		for i, existing in enumerate(node.attributes):
+			rid = self.resource_id_of(existing.name)
+			if rid is None or rid > resource_id:
+				position = i
+				break
+		node.attributes.insert(position, attr)
+		for field in ('id_index', 'class_index', 'style_index'):
+			current = getattr(node, field)
+			if current and current > position:
+				setattr(node, field, current + 1)
+		return True
+
+	# ---- 元素遍历与插入 ----
+
+	def element_name(self, node: XmlNode) -> str:
+		return self.strings.get(node.name)
+
+	def find_element(self, name: str, start: int = 0, end: Optional[int] = None) -> int:
+		"""按文档顺序查找元素起始节点下标，找不到返回 -1"""
+		end = len(self.nodes) if end is None else end
+		for i in range(start, end):
+			node = self.nodes[i]
+			if node.type == RES_XML_START_ELEMENT_TYPE and self.element_name(node) == name:
+				return i
+		return -1
+
+	def root_element(self) -> int:
+		for i, node in enumerate(self.nodes):
+			if node.type == RES_XML_START_ELEMENT_TYPE:
+				return i
+		raise AxmlError("二进制XML中没有元素")
+
+	def element_end(self, start: int) -> int:
+		depth = 0
+		for i in range(start, len(self.nodes)):
+			ntype = self.nodes[i].type
+			if ntype == RES_XML_START_ELEMENT_TYPE:
+				depth += 1
+			elif ntype == RES_XML_END_ELEMENT_TYPE:
+				depth -= 1
+				if depth == 0:
+					return i
+		raise AxmlError("二进制XML元素未闭合")
+
+	def child_elements(self, start: int) -> List[int]:
+		children = []
+		end = self.element_end(start)
+		i = start + 1
+		while i < end:
+			if self.nodes[i].type == RES_XML_START_ELEMENT_TYPE:
+				children.append(i)
+				i = self.element_end(i) + 1
+			else:
+				i += 1
+		return children
+
+	def append_child(self, parent: int, name: str, attributes: Optional[Dict[str, str]] = None) -> int:
+		"""在父元素末尾追加无命名空间的子元素，返回新元素的起始节点下标"""
+		line = self.nodes[parent].line
+		name_index = self.string_index(name, mapped=True)
+		start = XmlNode(RES_XML_START_ELEMENT_TYPE, line)
+		start.name = name_index
+		for attr_name, attr_value in (attributes or {}).items():
+			value_index = self.string_index(attr_value, mapped=True)
+			start.attributes.append(XmlAttribute(NO_INDEX, self.string_index(attr_name), value_index,
+			                                     TYPE_STRING, value_index))
+		end = XmlNode(RES_XML_END_ELEMENT_TYPE, line)
+		end.name = name_index
+		position = self.element_end(parent)
+		self.nodes[position:position] = [start, end]
+		return position
+
+
+class ResourceTable:
+	"""resources.arsc 的只读解析，只用于把资源ID解析为取值"""
+
+	def __init__(self, data: bytes) -> None:
+		chunk_type, header_size, size = struct.unpack_from('<HHI', data, 0)
+		if chunk_type != RES_TABLE_TYPE:
+			raise AxmlError(f"不是资源表文件（类型 0x{chunk_type:04x}）")
+		self._data = data
+		self.strings: Optional[StringPool] = None
+		self._type_chunks: Dict[Tuple[int, int], List[int]] = {}
+
+		size = min(size, len(data))
+		pos = header_size
+		while pos + 8 <= size:
+			ctype, chsize, csize = struct.unpack_from('<HHI', data, pos)
+			if csize < 8:
+				raise AxmlError(f"资源表块长度异常：偏移 {pos}")
+			if ctype == RES_STRING_POOL_TYPE:
+				self.strings = StringPool(data, pos)
+			elif ctype == RES_TABLE_PACKAGE_TYPE:
+				self._index_package(pos, chsize, csize)
+			pos += csize
+		if self.strings is None:
+			raise AxmlError("资源表缺少全局字符串池")
+
+	def _index_package(self, pos: int, header_size: int, size: int) -> None:
+		package_id = struct.unpack_from('<I', self._data, pos + 8)[0]
+		sub = pos + header_size
+		end = pos + size
+		while sub + 8 <= end:
+			ctype, _, csize = struct.unpack_from('<HHI', self._data, sub)
+			if csize < 8:
+				raise AxmlError(f"资源表块长度异常：偏移 {sub}")
+			if ctype == RES_TABLE_TYPE_TYPE:
+				type_id = self._data[sub + 8]
+				self._type_chunks.setdefault((package_id, type_id), []).append(sub)
+			sub += csize
+
+	def _entry_offset(self, chunk: int, entry_index: int) -> Optional[int]:
+		data = self._data
+		header_size = struct.unpack_from('<H', data, chunk + 2)[0]
+		flags = data[chunk + 9]
+		entry_count, entries_start = struct.unpack_from('<II', data, chunk + 12)
+		table = chunk + header_size
+		if flags & 0x01:
+			# 稀疏类型：按 (下标, 偏移/4) 成对存放
+			for i in range(entry_count):
+				idx, off = struct.unpack_from('<HH', data, table + i * 4)
+				if idx == entry_index:
+					return chunk + entries_start + off * 4
+			return None
+		if entry_index >= entry_count:
+			return None
+		if flags & 0x02:
+			off = struct.unpack_from('<H', data, table + entry_index * 2)[0]
+			return None if off == 0xFFFF else chunk + entries_start + off * 4
+		off = struct.unpack_from('<I', data, table + entry_index * 4)[0]
+		return None if off == NO_INDEX else chunk + entries_start + off
+
+	def resolve(self, resource_id: int) -> List[Tuple[int, int]]:
+		"""返回资源在所有配置下的 (数据类型, 数据) 列表"""
+		key = (resource_id >> 24, (resource_id >> 16) & 0xFF)
+		entry_index = resource_id & 0xFFFF
+		values = []
+		for chunk in self._type_chunks.get(key, []):
+			entry = self._entry_offset(chunk, entry_index)
+			if entry is None:
+				continue
+			size, flags = struct.unpack_from('<HH', self._data, entry)
+			if flags & 0x0008:
+				# 紧凑条目：数据类型存放在 flags 高字节
+				values.append((flags >> 8, struct.unpack_from('<I', self._data, entry + 4)[0]))
+			elif not flags & 0x0001:
+				_, _, data_type, value = struct.unpack_from('<HBBI', self._data, entry + size)
+				values.append((data_type, value))
+		return values
+
+	def resolve_strings(self, resource_id: int) -> List[str]:
+		result = []
+		for data_type, value in self.resolve(resource_id):
+			if data_type == TYPE_STRING:
+				text = self.strings.get(value)
+				if text and text not in result:
+					result.append(text)
+		return result
@@ -0,0 +1,109 @@
+import re
+import zipfile
+from typing import Callable, Dict, List, Optional, Set
+
+from core.axml import (ANDROID_NS, TYPE_REFERENCE, TYPE_STRING, AxmlDocument, AxmlError,
+                       ResourceTable, XmlNode)
+from core.zip_writer import DEFAULT_ALIGNMENT, rewrite_zip
+
+
+MANIFEST_ENTRY = 'AndroidManifest.xml'
+RESOURCES_ENTRY = 'resources.arsc'
+
+# android.R.attr 中的资源ID
+ATTR_DEBUGGABLE = 0x0101000F
+ATTR_NETWORK_SECURITY_CONFIG = 0x01010527
+
+# 旧签名文件在内容修改后必然失效，重写APK时一并移除
+SIGNATURE_ENTRY_PATTERN = re.compile(r'^META-INF/([^/]+\.(SF|RSA|DSA|EC)|MANIFEST\.MF)$', re.IGNORECASE)
+
+
+class BinaryPatcher:
+	"""直接修改APK内编译后的二进制XML，无需 apktool 反编译/回编译
+
+	只处理本工具需要的两项修改：application 的 debuggable 属性，
+	以及网络安全配置中信任用户证书。遇到无法处理的结构时抛出 AxmlError，
+	由调用方回退到 apktool 流程。
+	"""
+
+	def __init__(self, logger: Optional[Callable[[str], None]] = None) -> None:
+		self.logger = logger or print
+
+	def build_patches(self, apk_path: str, debuggable: bool) -> Dict[str, bytes]:
+		"""计算需要替换的条目，返回 {条目名: 新内容}"""
+		replacements: Dict[str, bytes] = {}
+		with zipfile.ZipFile(apk_path) as zf:
+			names = set(zf.namelist())
+			if MANIFEST_ENTRY not in names:
+				raise AxmlError("APK中缺少AndroidManifest.xml")
+			manifest = AxmlDocument.parse(zf.read(MANIFEST_ENTRY))
+			app_index = manifest.find_element('application')
+			if app_index < 0:
+				raise AxmlError("未找到 application 节点")
+			application = manifest.nodes[app_index]
+
+			for config_entry in self._network_security_entries(zf, names, manifest, application):
+				document = AxmlDocument.parse(zf.read(config_entry))
+				if self._trust_user_certificates(document):
+					replacements[config_entry] = document.serialize()
+					self.logger(f"已修改网络安全配置: {config_entry}")
+				else:
+					self.logger(f"网络安全配置已信任用户证书: {config_entry}")
+
+			if debuggable:
+				if manifest.set_boolean_attribute(application, ANDROID_NS, 'debuggable', ATTR_DEBUGGABLE, True):
+					replacements[MANIFEST_ENTRY] = manifest.serialize()
+					self.logger("添加 debuggable 属性")
+				else:
+					self.logger("已存在 debuggable=true 配置")
+		return replacements
+
+	def _network_security_entries(self, zf: zipfile.ZipFile, names: Set[str], manifest: AxmlDocument,
+	                              application: XmlNode) -> List[str]:
+		attr = manifest.find_attribute(application, 'networkSecurityConfig', ATTR_NETWORK_SECURITY_CONFIG)
+		if attr is None:
+			self.logger("未配置网络安全配置文件，跳过")
+			return []
+		if attr.data_type == TYPE_STRING:
+			paths = [manifest.attribute_string(attr)]
+		elif attr.data_type == TYPE_REFERENCE:
+			if RESOURCES_ENTRY not in names:
+				raise AxmlError("APK中缺少resources.arsc，无法解析网络安全配置路径")
+			paths = ResourceTable(zf.read(RESOURCES_ENTRY)).resolve_strings(attr.data)
+		else:
+			raise AxmlError(f"无法识别的 networkSecurityConfig 取值类型：0x{attr.data_type:02x}")
+		missing = [p for p in paths if p not in names]
+		if not paths or missing:
+			raise AxmlError(f"找不到网络安全配置文件：{', '.join(missing) or attr.data}")
+		return paths
+
+	@staticmethod
+	def _trust_user_certificates(document: AxmlDocument) -> bool:
+		"""与 ApkProcessor._update_security_config 一致的修改规则，返回是否发生了修改"""
+		root = document.root_element()
+		trust_anchors = document.find_element('trust-anchors')
+		if trust_anchors < 0:
+			base_config = document.find_element('base-config')
+			if base_config < 0:
+				base_config = document.append_child(root, 'base-config')
+			trust_anchors = document.append_child(base_config, 'trust-anchors')
+
+		for child in document.child_elements(trust_anchors):
+			node = document.nodes[child]
+			if document.element_name(node) != 'certificates':
+				continue
+			for attr_name in ('src', 'source'):
+				attr = document.find_attribute(node, attr_name)
+				if attr is not None and document.attribute_string(attr) == 'user':
+					return False
+		document.append_child(trust_anchors, 'certificates', {'src': 'user'})
+		return True
+
+	def write_apk(self, apk_path: str, output_path: str, replacements: Dict[str, bytes], align: bool = True) -> None:
+		"""把替换后的条目写入新APK
+
+		其余条目的压缩数据原样拷贝，旧签名文件被移除；align 为真时在写入过程中完成对齐。
+		"""
+		rewrite_zip(apk_path, output_path, replacements,
+		            alignment=DEFAULT_ALIGNMENT if align else 0,
+		            drop=lambda name: bool(SIGNATURE_ENTRY_PATTERN.match(name)))
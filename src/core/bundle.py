@@ -0,0 +1,177 @@
+"""拆分APK安装包（XAPK、APKS）
+
+安装包是包含多个APK的ZIP：base 与若干 config/feature 拆分包（APKS 由 bundletool 生成，位于 splits/ 下；
+XAPK 另带 manifest.json、图标与 OBB）。只有 base（清单中没有 split 属性的APK）需要修改，
+拆分包只需用同一个密钥重新签名，无需反编译。
+"""
+
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from core.axml import AxmlDocument, AxmlError
+from core.host_info import cpu_count
+from core.job_context import JobCancelledError, JobContext
+
+
+BUNDLE_EXTENSIONS = ('.xapk', '.apks')
+MANIFEST_ENTRY = 'AndroidManifest.xml'
+
+
+class BundleError(Exception):
+	pass
+
+
+def is_bundle(path: str) -> bool:
+	return os.path.splitext(path)[1].lower() in BUNDLE_EXTENSIONS
+
+
+def split_name(apk_path: str) -> str:
+	"""APK清单中 manifest 元素的 split 属性；base 与完整APK返回空字符串"""
+	try:
+		with zipfile.ZipFile(apk_path) as zf:
+			document = AxmlDocument.parse(zf.read(MANIFEST_ENTRY))
+	except (KeyError, zipfile.BadZipFile, AxmlError) as e:
+		raise BundleError(f"无法读取 {os.path.basename(apk_path)} 的清单：{str(e)}")
+	manifest = document.nodes[document.root_element()]
+	attr = document.find_attribute(manifest, 'split')
+	return document.attribute_string(attr) if attr is not None else ''
+
+
+class SplitApk:
+	"""安装包中的一个APK"""
+
+	def __init__(self, entry: str, path: str, split: str) -> None:
+		self.entry = entry  # 在安装包中的条目名
+		self.path = path  # 解出到工作目录后的路径
+		self.split = split  # split 属性，base 为空
+		self.output_path: Optional[str] = None  # 签名后的APK
+
+	@property
+	def is_base(self) -> bool:
+		return not self.split
+
+
+class BundleRunner:
+	"""处理一个拆分APK安装包
+
+	解出全部APK后并行处理：base 走完整流程（二进制修改或 apktool、结果缓存与检查点照常生效），
+	拆分包只重新签名；全部成功后按原有条目顺序写出新的安装包，非APK条目原样保留。
+	"""
+
+	def __init__(self, engine, max_workers: Optional[int] = None) -> None:
+		self.engine = engine
+		self.max_workers = max_workers
+
+	def run(self, ctx: JobContext) -> Tuple[bool, str]:
+		engine = self.engine
+		children: List[JobContext] = []
+		try:
+			engine._prepare_job(ctx)
+			with ctx.trace.stage('extract'):
+				splits = self._extract(ctx)
+			bases = [split for split in splits if split.is_base]
+			ctx.log(f"安装包中共 {len(splits)} 个APK：修改 {', '.join(s.entry for s in bases)}，"
+			        f"其余 {len(splits) - len(bases)} 个拆分包只重新签名")
+
+			children = [self._child_context(ctx, split) for split in splits]
+			workers = self.max_workers or min(len(splits), cpu_count())
+			with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='split') as pool:
+				futures = [pool.submit(self._process_base if split.is_base else self._resign_split, child, split)
+				           for child, split in zip(children, splits)]
+				errors = []
+				for split, future in zip(splits, futures):
+					try:
+						future.result()
+					except JobCancelledError:
+						raise
+					except Exception as e:
+						errors.append(f"{split.entry}: {str(e)}")
+			ctx.check_cancelled()
+			if errors:
+				raise BundleError("；".join(errors))
+
+			with ctx.trace.stage('assemble'):
+				bundle_path = ctx.work_path('bundle.out')
+				self._assemble(ctx, splits, bundle_path)
+			engine._finish_job(ctx, bundle_path)
+			return True, "处理完成"
+		except JobCancelledError:
+			return engine._job_cancelled(ctx)
+		except Exception as e:
+			return engine._job_failed(ctx, e)
+		finally:
+			for child in children:
+				engine._end_job(child)
+				ctx.trace.records.extend(child.trace.records)
+			engine._end_job(ctx)
+
+	def _extract(self, ctx: JobContext) -> List[SplitApk]:
+		"""解出安装包中的全部APK并区分 base 与拆分包"""
+		splits: List[SplitApk] = []
+		extract_dir = ctx.work_path('splits')
+		with zipfile.ZipFile(ctx.apk_path) as zf:
+			for index, info in enumerate(zf.infolist()):
+				if info.is_dir() or not info.filename.lower().endswith('.apk'):
+					continue
+				ctx.check_cancelled()
+				# 以序号命名，避免条目名中的目录或同名文件冲突
+				path = os.path.join(extract_dir, f"{index:03d}_{os.path.basename(info.filename)}")
+				os.makedirs(extract_dir, exist_ok=True)
+				with zf.open(info) as src, open(path, 'wb') as dst:
+					shutil.copyfileobj(src, dst, 1024 * 1024)
+				splits.append(SplitApk(info.filename, path, split_name(path)))
+		if not splits:
+			raise BundleError("安装包中没有APK")
+		if not any(split.is_base for split in splits):
+			raise BundleError("安装包中没有 base APK")
+		return splits
+
+	def _child_context(self, ctx: JobContext, split: SplitApk) -> JobContext:
+		child = JobContext(split.path, ctx.signing, ctx.options, logger=ctx.logger, cancel_token=ctx.cancel_token)
+		child.trace.recorder = ctx.trace.recorder
+		if split.is_base:
+			# 耗时主要在 base，安装包的整体进度跟随 base 的处理阶段
+			child.progress = ctx.progress
+			child.trace.on_stage = ctx.progress.enter
+		return child
+
+	def _process_base(self, child: JobContext, split: SplitApk) -> None:
+		"""base 走完整流程，签名后的APK留在子任务的工作目录中"""
+		engine = self.engine
+		engine._prepare_job(child)
+		new_apk_path = engine._reuse_result(child)
+		if new_apk_path is None:
+			new_apk_path = engine._build_unsigned(child)
+			engine._sign_apk(child, new_apk_path)
+			if child.result_claimed:
+				engine._store_result(child, new_apk_path)
+		split.output_path = new_apk_path
+
+	def _resign_split(self, child: JobContext, split: SplitApk) -> None:
+		"""拆分包不做修改，原地替换签名（签名时移除旧的 v1 签名文件并重新对齐）"""
+		child.log(f"重新签名拆分包 {split.entry}（{split.split}）")
+		self.engine._sign_apk(child, split.path)
+		split.output_path = split.path
+
+	def _assemble(self, ctx: JobContext, splits: List[SplitApk], output_path: str) -> None:
+		"""按原条目顺序写出新的安装包：APK换成签名后的版本（不再压缩），其余条目原样复制"""
+		replaced = {split.entry: split.output_path for split in splits}
+		with zipfile.ZipFile(ctx.apk_path) as src, \
+				zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as dst:
+			for info in src.infolist():
+				ctx.check_cancelled()
+				if info.filename in replaced:
+					dst.write(replaced[info.filename], info.filename, compress_type=zipfile.ZIP_STORED)
+					continue
+				target = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+				target.compress_type = info.compress_type
+				target.external_attr = info.external_attr
+				if info.is_dir():
+					dst.writestr(target, b'')
+					continue
+				with src.open(info) as data, dst.open(target, 'w', force_zip64=info.file_size > 0x7FFFFFFF) as out:
+					shutil.copyfileobj(data, out, 1024 * 1024)
+		ctx.trace.annotate(output_bytes=os.path.getsize(output_path))
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from core.workdir_store import WorkDirStore
+
+
+# 按流程先后排列；越靠后的检查点离签名越近
+CHECKPOINT_STAGES = ('built', 'aligned')
+INFO_NAME = 'info.json'
+
+# 回编译或对齐的处理逻辑变化时递增，使旧的检查点全部失效
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class CheckpointStore:
+	"""apktool 流程中未签名APK的检查点
+
+	built 为 apktool 回编译的输出，aligned 为对齐后的APK。键由 APK 的 SHA-256、影响回编译结果的选项
+	与 apktool 版本决定，与签名证书无关：签名失败后重试、或换一个密钥重新签名时直接从检查点继续，
+	无需再次反编译与回编译。反编译结果本身由 DecodeCache 缓存。
+	条目登记到 WorkDirStore，与其他缓存共用磁盘预算并按 LRU 淘汰。
+	"""
+
+	def __init__(self, cache_root: str, logger: Optional[Callable[[str], None]] = None,
+	             store: Optional[WorkDirStore] = None) -> None:
+		self.cache_root = cache_root
+		self.logger = logger or print
+		self.workdir_store = store
+		self._lock = threading.Lock()
+		os.makedirs(cache_root, exist_ok=True)
+
+	@staticmethod
+	def make_key(apk_sha256: str, options: Dict[str, Any], apktool_version: str) -> str:
+		payload = json.dumps({'format': CHECKPOINT_FORMAT_VERSION, 'apk': apk_sha256, 'options': options,
+		                      'apktool': apktool_version}, sort_keys=True)
+		return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+	def entry_path(self, key: str) -> str:
+		return os.path.join(self.cache_root, key)
+
+	def stage_path(self, key: str, stage: str) -> str:
+		return os.path.join(self.entry_path(key), f'{stage}.apk')
+
+	def _entry_name(self, key: str) -> Optional[str]:
+		if self.workdir_store is None:
+			return None
+		return self.workdir_store.name_of(self.entry_path(key))
+
+	def latest(self, key: str, stages: Sequence[str] = CHECKPOINT_STAGES) -> Optional[str]:
+		"""返回 stages 中已保存的最后一个阶段，没有检查点时返回 None"""
+		for stage in reversed(stages):
+			if os.path.exists(self.stage_path(key, stage)):
+				return stage
+		return None
+
+	def checkout(self, key: str, stage: str, destination: str) -> bool:
+		"""把某个阶段的APK复制到 destination；检查点不存在或已被淘汰时返回 False"""
+		name = self._entry_name(key)
+		if name is not None:
+			# 复制期间占用条目，防止被预算淘汰
+			self.workdir_store.pin(name)
+		try:
+			shutil.copyfile(self.stage_path(key, stage), destination)
+		except FileNotFoundError:
+			return False
+		finally:
+			if name is not None:
+				self.workdir_store.unpin(name)
+		if name is not None:
+			self.workdir_store.touch(name)
+		return True
+
+	def save(self, key: str, stage: str, apk_path: str, info: Dict[str, Any]) -> str:
+		"""复制某个阶段的APK进入检查点，返回检查点中的路径"""
+		if stage not in CHECKPOINT_STAGES:
+			raise ValueError(f"未知的检查点阶段：{stage}")
+		entry = self.entry_path(key)
+		name = self._entry_name(key)
+		# 先写入条目外的临时目录再原子替换，崩溃时不会留下写了一半的检查点
+		staging = os.path.join(self.cache_root, f'{key}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp')
+		if name is not None:
+			self.workdir_store.pin(name)
+		try:
+			os.makedirs(staging)
+			staged_apk = os.path.join(staging, f'{stage}.apk')
+			shutil.copyfile(apk_path, staged_apk)
+			with self._lock:
+				os.makedirs(entry, exist_ok=True)
+				info_path = os.path.join(entry, INFO_NAME)
+				if not os.path.exists(info_path):
+					staged_info = os.path.join(staging, INFO_NAME)
+					with open(staged_info, 'w', encoding='utf-8') as f:
+						json.dump(dict(info, created=time.time()), f, ensure_ascii=False, indent=4)
+					os.replace(staged_info, info_path)
+				os.replace(staged_apk, self.stage_path(key, stage))
+		finally:
+			shutil.rmtree(staging, ignore_errors=True)
+			if name is not None:
+				self.workdir_store.unpin(name)
+		if name is not None:
+			self.workdir_store.register(name, kind='checkpoint')
+		return self.stage_path(key, stage)
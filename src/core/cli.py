@@ -0,0 +1,562 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""无界面批量处理入口
+
+用法（在 src 目录下）：
+    python -m core.cli apks/ other/*.apk --ks release.jks --ks-pass env:KS_PASS --alias key0 --key-pass env:KEY_PASS
+
+加 --pipeline 时在单个进程内按阶段调度（各阶段独立并发上限，例如 --stage-limit build=2）。
+加 --trace stages.jsonl / --chrome-trace trace.json 记录每个任务各阶段的耗时。
+加 --variant name=qa,ks=qa.jks,ks-pass=env:QA_PASS,alias=qa,debuggable=true（可重复）时，每个APK只修改与回编译一次，
+再用各变体的密钥并行签名，输出 <名称>_Trust_<变体>.apk。
+加 --probe-only 时只预检，列出每个APK将走的处理路径（skip/shortcut/full）与估算耗时，不做任何处理。
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import signal
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.bundle import BUNDLE_EXTENSIONS, is_bundle
+from core.host_info import cpu_count, total_memory_bytes
+from core.job_context import output_tags
+from core.memory_budget import MB, MemoryBudget
+from core.tool_process import kill_all_tools
+from core.tracing import TraceRecorder
+
+
+# 每个并发任务预留的内存（apktool 回退路径的 JVM 峰值），用于推算默认并发数
+DEFAULT_MEMORY_PER_JOB_MB = 1536
+
+_processor = None
+
+
+def read_secret(spec: str) -> str:
+	"""解析与 apksigner 相同的密码写法：pass:<密码>、env:<变量名>、file:<文件>"""
+	kind, sep, value = spec.partition(':')
+	if not sep:
+		return spec
+	if kind == 'pass':
+		return value
+	if kind == 'env':
+		if value not in os.environ:
+			raise ValueError(f"环境变量 {value} 未设置")
+		return os.environ[value]
+	if kind == 'file':
+		with open(value, 'r', encoding='utf-8') as f:
+			return f.readline().rstrip('\r\n')
+	return spec
+
+
+def collect_apks(inputs: List[str]) -> List[str]:
+	"""展开目录、通配符与列表文件（@list.txt），返回去重后的APK（及拆分APK安装包）路径"""
+	found: List[str] = []
+	for item in inputs:
+		if item.startswith('@'):
+			with open(item[1:], 'r', encoding='utf-8') as f:
+				candidates = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+		elif os.path.isdir(item):
+			candidates = sorted(path for extension in ('.apk',) + BUNDLE_EXTENSIONS
+			                    for path in glob.glob(os.path.join(item, '**', '*' + extension), recursive=True))
+		elif glob.has_magic(item):
+			candidates = sorted(glob.glob(item, recursive=True))
+		else:
+			candidates = [item]
+		for path in candidates:
+			path = os.path.abspath(path)
+			if path not in found:
+				found.append(path)
+	return found
+
+
+def default_workers(memory_per_job_mb: int) -> int:
+	"""按CPU核数与物理内存推算并发数"""
+	workers = cpu_count()
+	total = total_memory_bytes()
+	if total and memory_per_job_mb > 0:
+		workers = min(workers, max(1, total // (memory_per_job_mb * 1024 * 1024)))
+	return max(1, workers)
+
+
+def _memory_budget_bytes() -> int:
+	"""配置的 apktool 内存预算，未配置时为物理内存的 70%"""
+	from core.config_manager import ConfigManager
+	from core.memory_budget import default_budget_bytes
+
+	budget_mb = int(ConfigManager().get_value('jvm_memory_budget_mb', 0) or 0)
+	return budget_mb * MB if budget_mb > 0 else default_budget_bytes()
+
+
+def _result_cache_enabled() -> bool:
+	from core.config_manager import ConfigManager
+
+	return bool(ConfigManager().get_value('result_cache_enabled', True))
+
+
+def _content_groups(queue: List[str], workers: int) -> Iterator[Tuple[str, Optional[str]]]:
+	"""按输入顺序逐个返回 (APK, 内容相同的第一个APK 或 None)
+
+	哈希在线程池中并行计算，每算完一个就返回，调用方可以边哈希边提交任务。
+	"""
+	from core.decode_cache import file_sha256
+
+	def digest(apk: str) -> Optional[str]:
+		try:
+			return file_sha256(apk)
+		except OSError:
+			return None
+
+	first_by_hash: Dict[str, str] = {}
+	executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='hash')
+	try:
+		for apk, value in zip(queue, executor.map(digest, queue)):
+			leader = first_by_hash.get(value) if value is not None else None
+			if value is not None and leader is None:
+				first_by_hash[value] = apk
+			yield apk, leader
+	finally:
+		executor.shutdown(wait=False, cancel_futures=True)
+
+
+VARIANT_FIELDS = ('name', 'ks', 'ks-pass', 'alias', 'key-pass', 'debuggable')
+
+
+def parse_variants(specs: List[str], signing: Dict[str, str]) -> List[Dict[str, Any]]:
+	"""解析 --variant 键=值,...；未写的签名项沿用 signing，返回含签名参数、debuggable 与变体名的列表"""
+	variants: List[Dict[str, Any]] = []
+	for spec in specs:
+		fields: Dict[str, str] = {}
+		for item in spec.split(','):
+			key, sep, value = item.partition('=')
+			key = key.strip()
+			if not sep or key not in VARIANT_FIELDS:
+				raise ValueError(f"无效的输出变体：{spec}（可用的项：{', '.join(VARIANT_FIELDS)}）")
+			fields[key] = value.strip()
+		variant: Dict[str, Any] = dict(signing)
+		if 'ks' in fields:
+			variant['cert_path'] = os.path.abspath(fields['ks'])
+		if 'ks-pass' in fields:
+			variant['cert_password'] = read_secret(fields['ks-pass'])
+			variant['key_password'] = variant['cert_password']
+		if 'alias' in fields:
+			variant['key_alias'] = fields['alias']
+		if 'key-pass' in fields:
+			variant['key_password'] = read_secret(fields['key-pass'])
+		variant['debuggable'] = None
+		if 'debuggable' in fields:
+			if fields['debuggable'].lower() not in ('true', 'false'):
+				raise ValueError(f"无效的输出变体：{spec}（debuggable 应为 true 或 false）")
+			variant['debuggable'] = fields['debuggable'].lower() == 'true'
+		name = fields.get('name') or variant['key_alias'] + ('-debug' if variant['debuggable'] else '')
+		if not re.fullmatch(r'[\w.-]+', name):
+			raise ValueError(f"输出变体名只能包含字母、数字、下划线、点与短横线：{name}")
+		if any(other['name'] == name for other in variants):
+			raise ValueError(f"输出变体名重复：{name}")
+		variant['name'] = name
+		variants.append(variant)
+	return variants
+
+
+def _worker_logger(name: str, quiet: bool):
+	def log(message: Any) -> None:
+		if quiet:
+			return
+		# 整行一次写出，多个线程同时输出时不会交错
+		text = ''.join(f"[{name}] {line}\n" for line in str(message).splitlines() or [''])
+		print(text, end='', flush=True)
+	return log
+
+
+def _signing_args(signing: Dict[str, Any]) -> Tuple[str, str, str, str]:
+	return signing['cert_path'], signing['cert_password'], signing['key_alias'], signing['key_password']
+
+
+def _job_result(ctx, success: bool, message: str) -> Dict[str, Any]:
+	"""单个任务（或输出变体）的汇总结果"""
+	result = {
+		'apk': ctx.apk_path,
+		'success': bool(success),
+		'message': message,
+		'output': (ctx.output_path or '') if success else '',
+		'seconds': round(time.time() - ctx.started_at, 3),
+		'cached': ctx.result_cached,
+		'tool_max_rss_mb': ctx.trace.tool_max_rss_bytes() // MB,
+	}
+	if ctx.variant:
+		result['variant'] = ctx.variant
+	if ctx.probe is not None:
+		result['plan'] = ctx.probe.plan
+		result['estimated_seconds'] = ctx.probe.estimate_seconds()
+	return result
+
+
+def _init_worker() -> None:
+	"""工作进程收到 Ctrl+C 时先结束其启动的工具进程树（工具位于独立的进程组中，收不到终端的中断信号）"""
+	def interrupt(signum, frame):
+		kill_all_tools()
+		raise KeyboardInterrupt
+
+	signal.signal(signal.SIGINT, interrupt)
+
+
+def _worker_engine(quiet: bool, memory_budget_bytes: int):
+	"""工作进程内共用的 ApkProcessor 引擎"""
+	global _processor
+	from core.apk_processor import ApkProcessor
+	from core.config_manager import ConfigManager
+
+	if _processor is None:
+		_processor = ApkProcessor(ConfigManager(), logger=_worker_logger(f'pid {os.getpid()}', quiet))
+		if memory_budget_bytes:
+			# 内存预算在各工作进程之间平分
+			_processor.memory_budget = MemoryBudget(memory_budget_bytes)
+			if _processor.jvm_pool is not None:
+				_processor.jvm_pool.memory_budget = _processor.memory_budget
+	return _processor
+
+
+def _failed_outcome(apk_path: str, variants: List[Dict[str, Any]], message: str,
+                    seconds: float = 0.0) -> Dict[str, Any]:
+	"""没有得到处理结果时的返回值，格式与 _process_one / _process_variants 相同"""
+	result = {'apk': apk_path, 'success': False, 'message': message, 'output': '', 'seconds': round(seconds, 3),
+	          'cached': False, 'tool_max_rss_mb': 0}
+	if variants:
+		return {'results': [dict(result, variant=variant['name']) for variant in variants], 'stages': []}
+	return dict(result, stages=[])
+
+
+def _process_one(apk_path: str, signing: Dict[str, str], use_decode_cache: Optional[bool],
+                 quiet: bool, memory_budget_bytes: int = 0, output_tag: Optional[str] = None) -> Dict[str, Any]:
+	"""在工作进程中处理单个APK；每个进程复用同一个 ApkProcessor 引擎"""
+	started = time.time()
+	try:
+		engine = _worker_engine(quiet, memory_budget_bytes)
+		ctx = engine.create_job(apk_path, *_signing_args(signing), use_decode_cache=use_decode_cache,
+		                        logger=_worker_logger(os.path.basename(apk_path), quiet), output_tag=output_tag)
+		success, message = engine.run_job(ctx)
+		return dict(_job_result(ctx, success, message), stages=ctx.trace.records)
+	except Exception as e:
+		return _failed_outcome(apk_path, [], f"处理失败: {str(e)}", time.time() - started)
+
+
+def _process_variants(apk_path: str, variants: List[Dict[str, Any]], use_decode_cache: Optional[bool],
+                      quiet: bool, memory_budget_bytes: int = 0, output_tag: Optional[str] = None) -> Dict[str, Any]:
+	"""在工作进程中生成单个APK的全部输出变体，返回 {'results': [...], 'stages': [...]}"""
+	from core.variants import VariantRunner
+
+	started = time.time()
+	name = os.path.basename(apk_path)
+	try:
+		engine = _worker_engine(quiet, memory_budget_bytes)
+		contexts = [engine.create_job(apk_path, *_signing_args(variant), use_decode_cache=use_decode_cache,
+		                              logger=_worker_logger(f"{name}:{variant['name']}", quiet),
+		                              variant=variant['name'], output_tag=output_tag,
+		                              debuggable=variant['debuggable'])
+		            for variant in variants]
+		runner = VariantRunner(engine)
+		outcomes = runner.run(contexts)
+	except Exception as e:
+		return _failed_outcome(apk_path, variants, f"处理失败: {str(e)}", time.time() - started)
+	stages = [span for ctx in runner.build_contexts + contexts for span in ctx.trace.records]
+	return {'results': [_job_result(ctx, *outcome) for ctx, outcome in zip(contexts, outcomes)], 'stages': stages}
+
+
+def parse_stage_limits(specs: List[str]) -> Dict[str, int]:
+	"""解析 --stage-limit 阶段=并发数"""
+	limits: Dict[str, int] = {}
+	for spec in specs:
+		name, sep, value = spec.partition('=')
+		if not sep or not value.strip().isdigit():
+			raise ValueError(f"无效的阶段并发数：{spec}（应为 阶段=数字）")
+		limits[name.strip()] = int(value)
+	return limits
+
+
+def _format_stats(stats: Dict[str, Dict[str, int]]) -> str:
+	return '  '.join(f"{name} {s['running']}/{s['limit']}+{s['queued']}" for name, s in stats.items()
+	                 if s['running'] or s['queued'])
+
+
+def _run_pipeline(queue: List[str], signing: Dict[str, str], use_decode_cache: Optional[bool],
+                  stage_limits: Dict[str, int], stats_interval: float, quiet: bool,
+                  trace_recorder: Optional[TraceRecorder] = None,
+                  tags: Optional[Dict[str, Optional[str]]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, int]], Dict[str, int]]:
+	"""在当前进程内用 PipelineScheduler 处理全部APK，返回结果与各阶段统计"""
+	from core.apk_processor import ApkProcessor
+	from core.config_manager import ConfigManager
+	from core.pipeline import PipelineScheduler
+
+	engine = ApkProcessor(ConfigManager(), logger=_worker_logger('cli', quiet))
+	engine.trace_recorder = trace_recorder
+	signing_args = _signing_args(signing)
+	results: List[Dict[str, Any]] = []
+	try:
+		with PipelineScheduler(engine, stage_limits) as scheduler:
+			jobs = {}
+			for apk in queue:
+				ctx = engine.create_job(apk, *signing_args, use_decode_cache=use_decode_cache,
+				                        logger=_worker_logger(os.path.basename(apk), quiet),
+				                        output_tag=(tags or {}).get(apk))
+				jobs[scheduler.submit(ctx)] = ctx
+			pending = set(jobs)
+			try:
+				while pending:
+					done, pending = wait(pending, timeout=stats_interval or None, return_when=FIRST_COMPLETED)
+					for future in done:
+						ctx = jobs[future]
+						result = _job_result(ctx, *future.result())
+						results.append(result)
+						_print_result(result)
+					if not done and pending:
+						memory = engine.memory_budget.stats()
+						print(f"阶段 运行/上限+排队: {_format_stats(scheduler.stats())}  "
+						      f"内存 {memory['in_use_mb']}/{memory['budget_mb'] or '不限'} MB，等待 {memory['waiting']}",
+						      flush=True)
+			except KeyboardInterrupt:
+				# 取消全部任务（结束正在运行的工具），退出时调度器才不会一直等待
+				for ctx in jobs.values():
+					ctx.cancel_token.cancel()
+				raise
+			stats = scheduler.stats()
+	finally:
+		engine.close()
+	return results, stats, engine.memory_budget.stats()
+
+
+def _probe_apks(apks: List[str], quiet: bool) -> List[Dict[str, Any]]:
+	"""只预检，不处理：每个APK将走的处理路径与各路径的估算耗时"""
+	engine = _worker_engine(quiet, 0)
+	results = []
+	for apk in apks:
+		result: Dict[str, Any] = {'apk': apk}
+		try:
+			if is_bundle(apk):
+				raise ValueError("拆分APK安装包在处理时才解出各APK，不支持单独预检")
+			# 结论由下面统一输出
+			ctx = engine.create_job(apk, '', '', '', '', logger=lambda message: None)
+			if not zipfile.is_zipfile(apk):
+				raise ValueError("不是有效的APK文件")
+			engine._preflight(ctx)
+			result.update(ctx.probe.as_dict(), success=True)
+			print(f"{ctx.probe.plan} 约 {ctx.probe.estimate_seconds():.1f}s {apk}：{'；'.join(ctx.probe.reasons)}",
+			      flush=True)
+		except Exception as e:
+			result.update(success=False, message=f"预检失败: {str(e)}")
+			print(f"失败 {apk}: {result['message']}", flush=True)
+		results.append(result)
+	return results
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+	status = "成功" if result['success'] else "失败"
+	if result.get('cached'):
+		status += "（缓存）"
+	apk = f"{result['apk']} [{result['variant']}]" if result.get('variant') else result['apk']
+	print(f"{status} {result['seconds']:.1f}s {apk} {result['output'] or result['message']}", flush=True)
+
+
+def build_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(prog='python -m core.cli', description='批量修改并重签名APK（无界面）')
+	parser.add_argument('inputs', nargs='+', help='APK文件（或 .xapk/.apks 安装包）、目录、通配符，或 @列表文件')
+	parser.add_argument('--ks', help='签名密钥库文件（.jks/.keystore/.p12），除 --probe-only 外必填')
+	parser.add_argument('--ks-pass', help='密钥库密码：pass:<密码> | env:<变量> | file:<文件>，除 --probe-only 外必填')
+	parser.add_argument('--alias', help='密钥别名，除 --probe-only 外必填')
+	parser.add_argument('--key-pass', help='密钥密码，写法同 --ks-pass，默认与密钥库密码相同')
+	parser.add_argument('-j', '--jobs', type=int, default=0, help='并发进程数，默认按CPU核数与内存推算')
+	parser.add_argument('--mem-per-job', type=int, default=DEFAULT_MEMORY_PER_JOB_MB,
+	                    help=f'推算并发数时每个任务预留的内存（MB），默认 {DEFAULT_MEMORY_PER_JOB_MB}')
+	parser.add_argument('--no-decode-cache', action='store_true', help='不使用反编译缓存')
+	parser.add_argument('--variant', action='append', default=[], metavar='键=值,...',
+	                    help='输出变体，可重复：name=名称,ks=密钥库,ks-pass=密码,alias=别名,key-pass=密码,debuggable=true|false；'
+	                         '未写的项沿用 --ks 等参数。每个APK只修改与回编译一次，再用各变体的密钥并行签名')
+	parser.add_argument('--pipeline', action='store_true', help='在单个进程内按阶段调度，各阶段独立限制并发')
+	parser.add_argument('--stage-limit', action='append', default=[], metavar='阶段=N',
+	                    help='--pipeline 模式下某个阶段的并发上限，可重复；阶段：prepare patch decode build align sign finish')
+	parser.add_argument('--stats-interval', type=float, default=10.0,
+	                    help='--pipeline 模式下输出各阶段队列情况的间隔（秒），0 表示不输出')
+	parser.add_argument('--probe-only', action='store_true',
+	                    help='只预检：列出每个APK将走的处理路径（skip/shortcut/full）与估算耗时，不做任何处理')
+	parser.add_argument('--report', help='把汇总结果写入JSON文件')
+	parser.add_argument('--trace', help='把每个任务各阶段的耗时、CPU时间与读写量逐行写入JSON lines文件')
+	parser.add_argument('--chrome-trace', help='导出 Chrome trace 文件（chrome://tracing 或 Perfetto 打开）')
+	parser.add_argument('-q', '--quiet', action='store_true', help='只输出汇总结果')
+	return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+	parser = build_parser()
+	args = parser.parse_args(argv)
+	if args.probe_only:
+		return _main_probe_only(args)
+	missing = [flag for flag, value in (('--ks', args.ks), ('--ks-pass', args.ks_pass), ('--alias', args.alias))
+	           if not value]
+	if missing:
+		parser.error(f"缺少参数：{' '.join(missing)}")
+	try:
+		signing = {
+			'cert_path': os.path.abspath(args.ks),
+			'cert_password': read_secret(args.ks_pass),
+			'key_alias': args.alias,
+			'key_password': read_secret(args.key_pass) if args.key_pass else read_secret(args.ks_pass),
+		}
+		stage_limits = parse_stage_limits(args.stage_limit)
+		variants = parse_variants(args.variant, signing)
+		if variants and args.pipeline:
+			raise ValueError("--variant 不能与 --pipeline 同时使用")
+		if args.pipeline:
+			from core.stages import merge_stage_limits
+			merge_stage_limits(stage_limits)
+	except (OSError, ValueError) as e:
+		print(f"错误：{str(e)}", file=sys.stderr)
+		return 2
+
+	apks = collect_apks(args.inputs)
+	if not apks:
+		print("错误：没有找到任何APK文件", file=sys.stderr)
+		return 2
+
+	# 输出目录按文件名存放，来自不同目录的同名APK在输出文件名后加上目录的短哈希
+	results: List[Dict[str, Any]] = []
+	queue = apks
+	tags = output_tags(queue)
+
+	use_decode_cache = False if args.no_decode_cache else None
+	trace_recorder = None
+	if args.trace or args.chrome_trace:
+		trace_recorder = TraceRecorder(args.trace, args.chrome_trace)
+	started = time.time()
+	stage_stats = memory_stats = None
+	try:
+		if args.pipeline:
+			print(f"共 {len(queue)} 个APK，按阶段调度", flush=True)
+			workers = 1
+			pipeline_results, stage_stats, memory_stats = _run_pipeline(
+				queue, signing, use_decode_cache, stage_limits, args.stats_interval, args.quiet, trace_recorder, tags)
+			results.extend(pipeline_results)
+		else:
+			workers = args.jobs if args.jobs > 0 else default_workers(args.mem_per_job)
+			workers = min(workers, len(queue)) or 1
+			print(f"共 {len(queue)} 个APK，并发进程数 {workers}", flush=True)
+			if _result_cache_enabled():
+				groups = _content_groups(queue, workers)
+			else:
+				groups = ((apk, None) for apk in queue)
+			with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+				budget = _memory_budget_bytes() // workers
+				submitted_at: Dict[str, float] = {}
+
+				def submit(apk: str) -> Future:
+					submitted_at[apk] = time.time()
+					try:
+						if variants:
+							return pool.submit(_process_variants, apk, variants, use_decode_cache, args.quiet, budget,
+							                   tags[apk])
+						return pool.submit(_process_one, apk, signing, use_decode_cache, args.quiet, budget,
+						                   tags[apk])
+					except BrokenProcessPool as e:
+						# 进程池已损坏时不再提交，按失败处理
+						future: Future = Future()
+						future.set_exception(e)
+						return future
+
+				pending: Dict[Future, str] = {}
+				finished = set()
+				duplicates: Dict[str, List[str]] = {}
+
+				def collect(timeout: Optional[float]) -> None:
+					done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+					for future in done:
+						apk = pending.pop(future)
+						finished.add(apk)
+						# 内容相同的APK在第一个完成后再提交，届时直接命中结果缓存
+						for duplicate in duplicates.pop(apk, []):
+							pending[submit(duplicate)] = duplicate
+						try:
+							outcome = future.result()
+						except BrokenProcessPool:
+							# 工作进程异常退出（内存不足被终止、收到信号等），其余任务照常汇总
+							message = "处理失败: 工作进程异常退出（可能内存不足或被信号终止）"
+							outcome = _failed_outcome(apk, variants, message, time.time() - submitted_at[apk])
+						# 工作进程中的阶段记录由主进程统一写出
+						for span in outcome.pop('stages'):
+							if trace_recorder is not None:
+								trace_recorder.record(span)
+						for result in outcome.pop('results', None) or [outcome]:
+							results.append(result)
+							_print_result(result)
+
+				# 边哈希边提交，工作进程不必等全部输入哈希完
+				for apk, leader in groups:
+					if leader is not None and leader not in finished:
+						duplicates.setdefault(leader, []).append(apk)
+					else:
+						pending[submit(apk)] = apk
+					if pending:
+						collect(0)
+				while pending:
+					collect(None)
+	except KeyboardInterrupt:
+		# 按阶段调度时工具由本进程启动，位于独立的进程组中，不会随 Ctrl+C 退出
+		kill_all_tools()
+		raise
+	finally:
+		if trace_recorder is not None:
+			trace_recorder.close()
+
+	failed = [r for r in results if not r['success']]
+	elapsed = time.time() - started
+	print(f"完成：成功 {len(results) - len(failed)}，失败 {len(failed)}，总耗时 {elapsed:.1f}s", flush=True)
+	for result in failed:
+		print(f"  失败 {result['apk']}: {result['message']}", flush=True)
+
+	if args.report:
+		report = {
+			'workers': workers,
+			'elapsed_seconds': round(elapsed, 3),
+			'succeeded': len(results) - len(failed),
+			'failed': len(failed),
+			'results': sorted(results, key=lambda r: (r['apk'], r.get('variant', ''))),
+		}
+		if stage_stats is not None:
+			report['stages'] = stage_stats
+			report['memory'] = memory_stats
+		with open(args.report, 'w', encoding='utf-8') as f:
+			json.dump(report, f, ensure_ascii=False, indent=4)
+	return 1 if failed else 0
+
+
+def _main_probe_only(args: argparse.Namespace) -> int:
+	apks = collect_apks(args.inputs)
+	if not apks:
+		print("错误：没有找到任何APK文件", file=sys.stderr)
+		return 2
+	started = time.time()
+	try:
+		results = _probe_apks(apks, args.quiet)
+	except OSError as e:
+		print(f"错误：{str(e)}", file=sys.stderr)
+		return 2
+	failed = [r for r in results if not r['success']]
+	plans: Dict[str, int] = {}
+	for result in results:
+		if result['success']:
+			plans[result['plan']] = plans.get(result['plan'], 0) + 1
+	summary = '，'.join(f"{plan} {count}" for plan, count in sorted(plans.items())) or '无'
+	print(f"预检完成：{summary}，失败 {len(failed)}，耗时 {time.time() - started:.1f}s", flush=True)
+	if args.report:
+		with open(args.report, 'w', encoding='utf-8') as f:
+			json.dump({'probe_only': True, 'results': sorted(results, key=lambda r: r['apk'])}, f,
+			          ensure_ascii=False, indent=4)
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
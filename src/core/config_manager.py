@@ -1,5 +1,8 @@
 import os
 import json
+import copy
+
+from core.stages import DEFAULT_STAGE_TIMEOUTS
 
 class ConfigManager:
     def __init__(self):
@@ -7,20 +10,38 @@ class ConfigManager:
         self.default_config = {
             'zipalign_enabled': False,
             'debuggable_enabled': True,  # 默认启用调试
+            'binary_patch_enabled': True,  # 优先直接修改二进制XML，失败时回退到apktool
+            'native_signer_enabled': True,  # 进程内签名，密钥库格式不支持时回退到apksigner
+            'decode_cache_enabled': True,  # 按APK内容哈希复用反编译结果
+            'result_cache_enabled': True,  # 输入、选项、证书与工具链都相同时直接复用上次输出的APK
+            'checkpoint_enabled': True,  # 保存回编译、对齐后的未签名APK，重试或换密钥签名时从中继续
+            'preflight_enabled': True,  # 处理前预检APK，无需修改时只重新签名，并跳过注定失败的二进制修改
+            'temp_budget_mb': 10240,  # temp 目录（反编译缓存、结果缓存与检查点）的磁盘预算
+            'decode_mode': 'auto',  # auto/full/resources，auto 在无需修改 smali 时只解码资源
+            'jvm_max_heap_mb': 4096,  # apktool 按APK大小估算 -Xmx 的上限
+            'jvm_memory_budget_mb': 0,  # apktool 进程预计内存占用之和的上限，0 表示物理内存的 70%
+            'stage_timeouts': dict(DEFAULT_STAGE_TIMEOUTS),  # 各阶段单次外部工具运行的秒数上限，超时结束进程树
+            'jvm_worker_enabled': False,  # apktool/apksigner 使用常驻JVM进程，需要 JDK 11+
+            'jvm_worker_count': 2,  # 常驻JVM进程数
+            'prewarm_enabled': True,  # 界面中选择APK后在后台预先预检与反编译，选择改变时取消
+            'gui_max_workers': 2,  # 界面任务队列同时处理的任务数
+            'log_max_lines': 5000,  # 日志面板最多显示的行数，完整日志写入 log_dir 下的日志文件
+            'log_dir': 'logs',  # 界面日志文件所在目录，只保留最近 20 个
             'output_dir': 'output'  # 添加输出目录配置
         }
         self.config = self.load_config()
     
     def load_config(self):
-        """加载配置文件，如果不存在则创建默认配置"""
+        """加载配置文件，如果不存在则创建默认配置；配置文件中没有的项使用默认值"""
+        config = copy.deepcopy(self.default_config)
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return self.default_config.copy()
+                    config.update(json.load(f))
+            return config
         except Exception as e:
             print(f'加载配置文件失败：{str(e)}')
-            return self.default_config.copy()
+            return copy.deepcopy(self.default_config)
     
     def save_config(self):
         """保存配置到文件"""
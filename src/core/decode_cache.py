@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.workdir_store import WorkDirStore, directory_size, file_lock
+
+
+COMPLETE_MARKER = '.decode_complete'
+MANIFEST_NAME = 'manifest.json'
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(HASH_BUFFER_SIZE), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+_version_cache: Dict[tuple, str] = {}
+
+
+def apktool_version(jar_path: str) -> str:
+	"""读取 apktool.jar 内置的版本号，读取失败时使用jar文件的哈希"""
+	stat = os.stat(jar_path)
+	cache_key = (os.path.abspath(jar_path), stat.st_size, stat.st_mtime_ns)
+	version = _version_cache.get(cache_key)
+	if version:
+		return version
+	version = ''
+	try:
+		with zipfile.ZipFile(jar_path) as zf:
+			for line in zf.read('apktool.properties').decode('utf-8', errors='ignore').splitlines():
+				if line.startswith('application.version='):
+					version = line.split('=', 1)[1].strip()
+					break
+	except (KeyError, zipfile.BadZipFile):
+		pass
+	if not version:
+		version = 'sha256:' + file_sha256(jar_path)[:16]
+	_version_cache[cache_key] = version
+	return version
+
+
+class DecodeCache:
+	"""以内容为键的 apktool 反编译结果缓存
+
+	键由 APK 的 SHA-256、apktool 版本与反编译选项共同决定：相同输入必然命中，
+	任何一项变化必然未命中。缓存目录只读，使用时复制到工作目录后再修改。
+	"""
+
+	def __init__(self, cache_root: str, logger: Optional[Callable[[str], None]] = None,
+	             store: Optional[WorkDirStore] = None) -> None:
+		self.cache_root = cache_root
+		self.logger = logger or print
+		self.workdir_store = store
+		self.manifest_path = os.path.join(cache_root, MANIFEST_NAME)
+		self._lock = threading.Lock()
+		# 正在反编译的键，相同APK的其他任务（或预先反编译）等待其完成而不是重复反编译
+		self._claim_lock = threading.Lock()
+		self._in_flight: Dict[str, Future] = {}
+		os.makedirs(cache_root, exist_ok=True)
+
+	@staticmethod
+	def make_key(apk_sha256: str, tool_version: str, options: Dict[str, Any]) -> str:
+		payload = json.dumps({'apk': apk_sha256, 'apktool': tool_version, 'options': options}, sort_keys=True)
+		return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+	def tree_path(self, key: str) -> str:
+		return os.path.join(self.cache_root, key)
+
+	def pin(self, key: str) -> None:
+		"""占用缓存树，防止被预算淘汰（可重复占用，每次都需要对应的 unpin()）"""
+		if self.workdir_store is not None:
+			self.workdir_store.pin(self.workdir_store.name_of(self.tree_path(key)))
+
+	def unpin(self, key: str) -> None:
+		if self.workdir_store is not None:
+			self.workdir_store.unpin(self.workdir_store.name_of(self.tree_path(key)))
+
+	def lookup(self, key: str) -> Optional[str]:
+		"""命中时返回缓存目录并占用它，调用方复制完成后必须调用 unpin()"""
+		path = self.tree_path(key)
+		# 先占用再检查，检查通过后不会再被淘汰
+		self.pin(key)
+		if not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+			self.unpin(key)
+			return None
+		self._update_manifest(key, {'last_used': time.time()})
+		if self.workdir_store is not None:
+			self.workdir_store.touch(self.workdir_store.name_of(path))
+		return path
+
+	def claim(self, key: str) -> Tuple[Optional[str], Optional[Future]]:
+		"""开始为某个键反编译
+
+		返回 (缓存目录, None) 表示命中，缓存目录已被占用，用完后必须调用 unpin()；(None, Future) 表示该键正在反编译，Future 在其结束时完成；
+		(None, None) 表示由调用方反编译，结束后必须调用 release()。
+		"""
+		with self._claim_lock:
+			pending = self._in_flight.get(key)
+			if pending is not None:
+				return None, pending
+			cached = self.lookup(key)
+			if cached is not None:
+				return cached, None
+			self._in_flight[key] = Future()
+			return None, None
+
+	def release(self, key: str) -> None:
+		"""结束 claim() 得到的反编译权（无论成功与否），唤醒等待的任务"""
+		with self._claim_lock:
+			pending = self._in_flight.pop(key, None)
+		if pending is not None and not pending.done():
+			pending.set_result(None)
+
+	def store(self, key: str, decode: Callable[[str], None], info: Dict[str, Any]) -> str:
+		"""调用 decode(目录) 生成反编译结果并原子地放入缓存，返回已占用的缓存目录（见 commit()）"""
+		staging = self.staging_path(key)
+		try:
+			decode(staging)
+			return self.commit(key, staging, info)
+		finally:
+			if os.path.exists(staging):
+				shutil.rmtree(staging, ignore_errors=True)
+
+	def staging_path(self, key: str) -> str:
+		"""供调用方自行反编译的临时目录，完成后交给 commit()"""
+		return os.path.join(self.cache_root, f'{key}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp')
+
+	def commit(self, key: str, staging: str, info: Dict[str, Any]) -> str:
+		"""把已完成的临时目录原子地放入缓存，返回缓存目录
+
+		返回的目录已被占用，登记后立即执行的预算淘汰不会删除它；调用方复制完成后必须调用 unpin()。
+		"""
+		with open(os.path.join(staging, COMPLETE_MARKER), 'w', encoding='utf-8') as f:
+			f.write(key)
+		target = self.tree_path(key)
+		self.pin(key)
+		try:
+			try:
+				os.rename(staging, target)
+			except OSError:
+				# 并发任务已写入同一键，保留先完成的结果
+				if not os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+					raise
+				shutil.rmtree(staging, ignore_errors=True)
+			now = time.time()
+			size = directory_size(target)
+			self._update_manifest(key, dict(info, created=now, last_used=now, size=size))
+			if self.workdir_store is not None:
+				self.workdir_store.register(self.workdir_store.name_of(target), size, kind='decode')
+		except BaseException:
+			self.unpin(key)
+			raise
+		return target
+
+	def checkout(self, key: str, work_dir: str) -> bool:
+		"""把缓存树复制到工作目录，缓存树已不存在时返回 False（按未命中处理）
+
+		调用方应从 claim()/commit() 起一直占用缓存树；占用之前已被其他进程淘汰的情况在这里发现。
+		"""
+		if os.path.exists(work_dir):
+			shutil.rmtree(work_dir)
+		source = self.tree_path(key)
+		marker = os.path.join(source, COMPLETE_MARKER)
+		self.pin(key)
+		try:
+			if not os.path.exists(marker):
+				return False
+			shutil.copytree(source, work_dir, ignore=shutil.ignore_patterns(COMPLETE_MARKER))
+			# 复制期间被淘汰时可能只复制了一部分，按未命中处理
+			if not os.path.exists(marker):
+				shutil.rmtree(work_dir, ignore_errors=True)
+				return False
+			return True
+		except (OSError, shutil.Error):
+			if os.path.exists(marker):
+				raise
+			shutil.rmtree(work_dir, ignore_errors=True)
+			return False
+		finally:
+			self.unpin(key)
+
+	def entries(self) -> Dict[str, Dict[str, Any]]:
+		"""返回仍然存在的缓存树清单（已被淘汰的条目不返回）"""
+		data = self._read_manifest()
+		return {key: info for key, info in data.items()
+		        if os.path.exists(os.path.join(self.tree_path(key), COMPLETE_MARKER))}
+
+	def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+		try:
+			with open(self.manifest_path, 'r', encoding='utf-8') as f:
+				return json.load(f) or {}
+		except (OSError, ValueError):
+			return {}
+
+	def _update_manifest(self, key: str, fields: Dict[str, Any]) -> None:
+		"""读改写清单；多个进程共用同一缓存目录，因此同时持有跨进程的文件锁"""
+		with self._lock, file_lock(f'{self.manifest_path}.lock'):
+			data = self.entries()
+			data.setdefault(key, {}).update(fields)
+			temp_path = f'{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+			try:
+				with open(temp_path, 'w', encoding='utf-8') as f:
+					json.dump(data, f, ensure_ascii=False, indent=4)
+				os.replace(temp_path, self.manifest_path)
+			except OSError as e:
+				self.logger(f"更新反编译缓存清单失败: {str(e)}")
@@ -0,0 +1,37 @@
+import os
+
+
+def cpu_count() -> int:
+	try:
+		return len(os.sched_getaffinity(0))
+	except AttributeError:
+		return os.cpu_count() or 1
+
+
+def total_memory_bytes() -> int:
+	"""物理内存总量，无法获取时返回 0"""
+	if os.name == 'nt':
+		import ctypes
+
+		class MEMORYSTATUSEX(ctypes.Structure):
+			_fields_ = [
+				('dwLength', ctypes.c_ulong),
+				('dwMemoryLoad', ctypes.c_ulong),
+				('ullTotalPhys', ctypes.c_ulonglong),
+				('ullAvailPhys', ctypes.c_ulonglong),
+				('ullTotalPageFile', ctypes.c_ulonglong),
+				('ullAvailPageFile', ctypes.c_ulonglong),
+				('ullTotalVirtual', ctypes.c_ulonglong),
+				('ullAvailVirtual', ctypes.c_ulonglong),
+				('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+			]
+
+		status = MEMORYSTATUSEX()
+		status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+		if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+			return int(status.ullTotalPhys)
+		return 0
+	try:
+		return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+	except (ValueError, OSError, AttributeError):
+		return 0
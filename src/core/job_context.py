@@ -0,0 +1,293 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.stages import DEFAULT_STAGE_TIMEOUTS
+from core.tool_progress import JobProgress
+
+
+class JobCancelledError(Exception):
+	"""任务已被取消"""
+
+
+class StageTimeoutError(Exception):
+	"""外部工具运行超过了所在阶段的时限（JobOptions.stage_timeouts），已被终止"""
+
+
+class CancellationToken:
+	"""跨线程的取消标记，取消时依次调用已登记的回调（例如终止子进程）"""
+
+	def __init__(self) -> None:
+		self._event = threading.Event()
+		self._lock = threading.Lock()
+		self._callbacks: List[Callable[[], None]] = []
+
+	@property
+	def cancelled(self) -> bool:
+		return self._event.is_set()
+
+	def cancel(self) -> None:
+		with self._lock:
+			if self._event.is_set():
+				return
+			self._event.set()
+			callbacks = list(self._callbacks)
+			self._callbacks.clear()
+		for callback in callbacks:
+			try:
+				callback()
+			except Exception:
+				pass
+
+	def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+		"""登记取消回调；已取消时立即调用"""
+		with self._lock:
+			if not self._event.is_set():
+				self._callbacks.append(callback)
+				return callback
+		callback()
+		return callback
+
+	def remove_callback(self, callback: Callable[[], None]) -> None:
+		with self._lock:
+			if callback in self._callbacks:
+				self._callbacks.remove(callback)
+
+	def wait(self, timeout: Optional[float] = None) -> bool:
+		return self._event.wait(timeout)
+
+	def raise_if_cancelled(self) -> None:
+		if self._event.is_set():
+			raise JobCancelledError("任务已取消")
+
+
+def _thread_io() -> Optional[Tuple[int, int]]:
+	"""当前线程累计读写的字节数（Linux），其他平台返回 None"""
+	try:
+		with open('/proc/thread-self/io', 'r', encoding='ascii') as f:
+			fields = dict(line.split(':', 1) for line in f.read().splitlines() if ':' in line)
+		return int(fields['rchar']), int(fields['wchar'])
+	except (OSError, KeyError, ValueError):
+		return None
+
+
+class JobTrace:
+	"""单个任务的阶段记录，recorder（core.tracing.TraceRecorder）不为空时同时写出
+
+	每个阶段记录墙钟时间、本线程 CPU 时间、本线程读写字节数、输入输出大小、期间启动的外部工具，
+	以及结束状态（ok/error/cancelled）。
+	"""
+
+	def __init__(self, job_id: str, apk_path: str, recorder=None) -> None:
+		self.job_id = job_id
+		self.apk_path = apk_path
+		self.recorder = recorder
+		self.on_stage: Optional[Callable[[str], None]] = None  # 每个阶段开始时以阶段名调用
+		self.records: List[Dict[str, Any]] = []
+		self._open: List[Dict[str, Any]] = []
+
+	@contextmanager
+	def stage(self, name: str, measure_cpu: bool = True) -> Iterator[Dict[str, Any]]:
+		"""记录一个阶段；异步代码中 measure_cpu 应为 False（事件循环线程的 CPU 时间不属于本任务）"""
+		span: Dict[str, Any] = {'job_id': self.job_id, 'apk': self.apk_path, 'stage': name,
+		                        'pid': os.getpid(), 'start': time.time(), 'tools': []}
+		self._open.append(span)
+		if self.on_stage is not None:
+			self.on_stage(name)
+		started = time.perf_counter()
+		cpu_started = time.thread_time() if measure_cpu else None
+		io_started = _thread_io() if measure_cpu else None
+		status = 'ok'
+		try:
+			yield span
+		except JobCancelledError:
+			status = 'cancelled'
+			raise
+		except BaseException:
+			status = 'error'
+			raise
+		finally:
+			span['wall_s'] = round(time.perf_counter() - started, 6)
+			if cpu_started is not None:
+				span['cpu_s'] = round(time.thread_time() - cpu_started, 6)
+			io_finished = _thread_io() if io_started is not None else None
+			if io_finished is not None:
+				span['read_bytes'] = io_finished[0] - io_started[0]
+				span['write_bytes'] = io_finished[1] - io_started[1]
+			span['status'] = status
+			self._open.remove(span)
+			self.records.append(span)
+			if self.recorder is not None:
+				self.recorder.record(span)
+
+	def current_span(self) -> Optional[Dict[str, Any]]:
+		"""正在进行的（最内层）阶段记录"""
+		return self._open[-1] if self._open else None
+
+	def annotate(self, **fields: Any) -> None:
+		"""给当前阶段补充字段（如输入输出大小）"""
+		if self._open:
+			self._open[-1].update(fields)
+
+	def add_tool_run(self, tool: str, start: float, wall_s: float, **fields: Any) -> None:
+		"""记录当前阶段中的一次外部工具调用；fields 可包含 user_s、sys_s、max_rss_bytes"""
+		if self._open:
+			span = self._open[-1]
+			span['tools'].append(dict(fields, tool=tool, start=start, wall_s=round(wall_s, 6)))
+			span['tool_wall_s'] = round(span.get('tool_wall_s', 0) + wall_s, 6)
+			# 子进程的 CPU 时间累加，峰值内存取最大值
+			for key in ('user_s', 'sys_s'):
+				if fields.get(key) is not None:
+					span[f'tool_{key}'] = round(span.get(f'tool_{key}', 0) + fields[key], 6)
+			if fields.get('max_rss_bytes') is not None:
+				span['tool_max_rss_bytes'] = max(span.get('tool_max_rss_bytes', 0), fields['max_rss_bytes'])
+
+	def tool_max_rss_bytes(self) -> int:
+		"""本任务所有外部工具进程中的最大峰值内存，未记录时为 0"""
+		return max((span.get('tool_max_rss_bytes', 0) for span in self.records), default=0)
+
+	def summary(self) -> str:
+		totals: Dict[str, float] = {}
+		for span in self.records:
+			totals[span['stage']] = totals.get(span['stage'], 0) + span['wall_s']
+		return '，'.join(f"{stage} {seconds:.2f}s" for stage, seconds in totals.items())
+
+
+def output_tag(apk_path: str) -> str:
+	"""输入所在目录的短哈希，同名输入来自不同目录时用于区分输出文件名（同一目录每次相同）"""
+	directory = os.path.normcase(os.path.dirname(os.path.abspath(apk_path)))
+	return hashlib.sha256(directory.encode('utf-8')).hexdigest()[:8]
+
+
+def output_tags(apk_paths: List[str]) -> Dict[str, Optional[str]]:
+	"""返回 {路径: 输出标记}：文件名与同一批中其他输入相同的标记为其目录的短哈希，其余为 None"""
+	by_name: Dict[str, set] = {}
+	for path in apk_paths:
+		name = os.path.normcase(os.path.basename(path))
+		by_name.setdefault(name, set()).add(os.path.normcase(os.path.abspath(path)))
+	return {path: output_tag(path) if len(by_name[os.path.normcase(os.path.basename(path))]) > 1 else None
+	        for path in apk_paths}
+
+
+class SigningConfig:
+	"""签名所用的密钥库与密码"""
+
+	def __init__(self, cert_path: str, cert_password: str, key_alias: str, key_password: str) -> None:
+		self.cert_path = cert_path
+		self.cert_password = cert_password
+		self.key_alias = key_alias
+		self.key_password = key_password
+
+
+class JobOptions:
+	"""任务开始时的配置快照，任务运行期间修改配置不会影响已开始的任务"""
+
+	def __init__(self, binary_patch: bool = True, debuggable: bool = False, zipalign: bool = False,
+	             native_signer: bool = True, decode_cache: bool = True, decode_mode: str = 'auto',
+	             result_cache: bool = True, checkpoints: bool = True, preflight: bool = True,
+	             stage_timeouts: Optional[Dict[str, float]] = None) -> None:
+		self.binary_patch = binary_patch
+		self.debuggable = debuggable
+		self.zipalign = zipalign
+		self.native_signer = native_signer
+		self.decode_cache = decode_cache
+		self.decode_mode = decode_mode
+		self.result_cache = result_cache
+		self.checkpoints = checkpoints
+		self.preflight = preflight
+		self.stage_timeouts = dict(stage_timeouts or {})  # 阶段名 → 该阶段单次外部工具运行的秒数，0 表示不限
+
+	@classmethod
+	def from_config(cls, config_manager, **overrides: Any) -> 'JobOptions':
+		"""从配置读取选项，overrides 中值为 None 的项沿用配置"""
+		options = cls(
+			binary_patch=bool(config_manager.get_value('binary_patch_enabled', True)),
+			debuggable=bool(config_manager.get_value('debuggable_enabled', False)),
+			zipalign=bool(config_manager.get_value('zipalign_enabled', False)),
+			native_signer=bool(config_manager.get_value('native_signer_enabled', True)),
+			decode_cache=bool(config_manager.get_value('decode_cache_enabled', True)),
+			decode_mode=config_manager.get_value('decode_mode', 'auto') or 'auto',
+			result_cache=bool(config_manager.get_value('result_cache_enabled', True)),
+			checkpoints=bool(config_manager.get_value('checkpoint_enabled', True)),
+			preflight=bool(config_manager.get_value('preflight_enabled', True)),
+			stage_timeouts=config_manager.get_value('stage_timeouts', DEFAULT_STAGE_TIMEOUTS),
+		)
+		for name, value in overrides.items():
+			if not hasattr(options, name):
+				raise AttributeError(f"未知的任务选项：{name}")
+			if value is not None:
+				setattr(options, name, value)
+		return options
+
+
+class JobContext:
+	"""单个APK任务的全部可变状态
+
+	引擎（ApkProcessor）本身不保存任何任务状态，同一个引擎可以在多个线程中同时运行多个任务。
+	"""
+
+	def __init__(self, apk_path: str, signing: SigningConfig, options: JobOptions,
+	             logger: Optional[Callable[[str], None]] = None,
+	             cancel_token: Optional[CancellationToken] = None, job_id: Optional[str] = None,
+	             progress: Optional[Callable[[int, str], None]] = None) -> None:
+		self.job_id = job_id or uuid.uuid4().hex[:12]
+		self.apk_path = os.path.abspath(apk_path)
+		self.signing = signing
+		self.options = options
+		self.logger = logger or print
+		self.cancel_token = cancel_token or CancellationToken()
+		self.work_dir: Optional[str] = None  # 由引擎从 WorkDirStore 分配，任务结束后释放
+		self.output_path: Optional[str] = None  # 成功后最终APK的路径
+		self.variant: Optional[str] = None  # 输出变体名，加在输出文件名后
+		self.output_tag: Optional[str] = None  # 同一批中有同名输入时加在输出文件名后，区分来源目录
+		self.jvm_heap_mb: Optional[int] = None  # apktool 的 -Xmx，由引擎按APK大小估算
+		self.apk_sha256: Optional[str] = None  # 输入APK的哈希，反编译缓存与结果缓存共用
+		self.result_key: Optional[str] = None  # 结果缓存的键与登记信息
+		self.result_info: Optional[Dict[str, Any]] = None
+		self.result_claimed = False  # 由本任务生成结果并写入结果缓存
+		self.result_cached = False  # 输出直接取自结果缓存
+		self.checkpoint_key: Optional[str] = None  # 未签名APK检查点的键
+		self.probe = None  # 预检结果与选择的处理路径（core.preflight.ProbeResult）
+		self.trace = JobTrace(self.job_id, self.apk_path)
+		# 整体进度（0-100），progress(百分比, 说明) 在进度增加时调用
+		self.progress = JobProgress(progress)
+		self.trace.on_stage = self.progress.enter
+		self.started_at = time.time()
+
+	@property
+	def base_name(self) -> str:
+		return os.path.splitext(os.path.basename(self.apk_path))[0]
+
+	@property
+	def decoded_dir(self) -> str:
+		"""apktool 反编译结果所在目录"""
+		if not self.work_dir:
+			raise RuntimeError("任务尚未分配工作目录")
+		return os.path.join(self.work_dir, 'decoded')
+
+	def work_path(self, name: str) -> str:
+		"""工作目录下的文件路径"""
+		if not self.work_dir:
+			raise RuntimeError("任务尚未分配工作目录")
+		return os.path.join(self.work_dir, name)
+
+	def log(self, message: Any) -> None:
+		self.logger(message)
+
+	def check_cancelled(self) -> None:
+		self.cancel_token.raise_if_cancelled()
+
+	def tool_timeout(self) -> Optional[float]:
+		"""当前阶段中单次外部工具运行的时限（秒）；未设置时返回 None"""
+		span = self.trace.current_span()
+		limit = self.options.stage_timeouts.get(span['stage']) if span else None
+		return float(limit) if limit else None
+
+	def stage_timeout_error(self, tool: str) -> StageTimeoutError:
+		span = self.trace.current_span()
+		stage = span['stage'] if span else ''
+		return StageTimeoutError(f"{tool} 在 {stage} 阶段运行超过 {self.tool_timeout():g}s，已终止")
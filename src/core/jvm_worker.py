@@ -0,0 +1,297 @@
+import os
+import re
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.job_context import CancellationToken
+from core.memory_budget import MemoryBudget
+from core.tool_process import ToolTimeoutError, kill_process_tree, new_group_kwargs
+
+
+# 单文件源码启动需要 JDK 11；JDK 12–23 需要显式允许 SecurityManager 才能拦截 System.exit
+MIN_JAVA_VERSION = 11
+SECURITY_MANAGER_REMOVED = 24
+
+
+class JvmWorkerError(Exception):
+	"""常驻进程启动失败或在请求过程中退出"""
+
+
+_java_versions: Dict[str, int] = {}
+
+
+def java_major_version(java: str = 'java') -> int:
+	"""返回 java 的主版本号（1.8 记为 8），无法获取时返回 0"""
+	if java in _java_versions:
+		return _java_versions[java]
+	version = 0
+	try:
+		result = subprocess.run([java, '-version'], capture_output=True, text=True, timeout=30)
+		match = re.search(r'version "(\d+)(?:\.(\d+))?', result.stderr + result.stdout)
+		if match:
+			version = int(match.group(1))
+			if version == 1 and match.group(2):
+				version = int(match.group(2))
+	except (OSError, subprocess.SubprocessError):
+		pass
+	_java_versions[java] = version
+	return version
+
+
+class JvmWorker:
+	"""一个常驻的 ToolWorker 进程，同一时间只处理一个请求"""
+
+	def __init__(self, command: List[str]) -> None:
+		self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+		                                stderr=subprocess.DEVNULL, **new_group_kwargs())
+		header = self.process.stdout.readline().decode('utf-8', errors='replace').split()
+		if len(header) != 2 or header[0] != 'READY':
+			self.kill()
+			raise JvmWorkerError("常驻JVM进程启动失败")
+		self.traps_exit = header[1] == '1'
+		self.reserved = 0  # 在内存预算中占用的字节数，进程退出后释放
+
+	@property
+	def alive(self) -> bool:
+		return self.process.poll() is None
+
+	def run(self, jar: str, args: List[str]) -> Tuple[int, str, str]:
+		lines = [f'RUN {len(args)}', jar] + list(args)
+		try:
+			self.process.stdin.write(('\n'.join(lines) + '\n').encode('utf-8'))
+			self.process.stdin.flush()
+			header = self.process.stdout.readline().decode('utf-8', errors='replace').split()
+			if len(header) != 4 or header[0] != 'EXIT':
+				raise JvmWorkerError("常驻JVM进程已退出")
+			status, out_size, err_size = int(header[1]), int(header[2]), int(header[3])
+			out = self._read_exact(out_size)
+			err = self._read_exact(err_size)
+		except (OSError, ValueError) as e:
+			raise JvmWorkerError(f"与常驻JVM进程通信失败: {str(e)}")
+		return status, out.decode('utf-8', errors='replace'), err.decode('utf-8', errors='replace')
+
+	def _read_exact(self, size: int) -> bytes:
+		data = b''
+		while len(data) < size:
+			block = self.process.stdout.read(size - len(data))
+			if not block:
+				raise JvmWorkerError("常驻JVM进程已退出")
+			data += block
+		return data
+
+	def kill(self) -> None:
+		"""结束进程及工具在其中启动的子进程"""
+		if self.process.poll() is None:
+			kill_process_tree(self.process)
+		self.process.wait()
+
+	def close(self) -> None:
+		try:
+			self.process.stdin.write(b'QUIT\n')
+			self.process.stdin.flush()
+			self.process.wait(timeout=5)
+		except (OSError, subprocess.TimeoutExpired):
+			pass
+		self.kill()
+
+
+class JvmWorkerPool:
+	"""常驻 JVM 进程池，把 `java -jar x.jar ...` 与 apksigner 调用交给预热过的 JVM 执行
+
+	进程按需启动、最多 size 个；进程在请求中途退出（例如工具调用了 System.exit 而无法拦截）时
+	丢弃该进程并返回 None，由调用方改为单独启动同一命令。
+	给出 memory_budget 时每个进程从启动到退出占用 worker_memory 字节，预算不足时不再启动新进程。
+	"""
+
+	def __init__(self, source_path: str, size: int = 2, java: str = 'java',
+	             jvm_options: Optional[List[str]] = None, jar_aliases: Optional[Dict[str, str]] = None,
+	             logger: Optional[Callable[[str], None]] = None, memory_budget: Optional[MemoryBudget] = None,
+	             worker_memory: int = 0) -> None:
+		self.source_path = source_path
+		self.size = max(1, size)
+		self.java = java
+		self.jvm_options = list(jvm_options or [])
+		self.jar_aliases = {os.path.normcase(os.path.abspath(path)): jar for path, jar in (jar_aliases or {}).items()}
+		self.logger = logger or print
+		self.memory_budget = memory_budget
+		self.worker_memory = worker_memory
+		self.disabled = False
+		self._exiting_jars = set()  # 会调用 System.exit 且无法拦截的工具，之后直接单独启动
+		self._idle: List[JvmWorker] = []
+		self._count = 0
+		self._closed = False
+		self._condition = threading.Condition()
+
+	def route(self, command: List[str]) -> Optional[Tuple[str, List[str]]]:
+		"""把命令行转换为 (jar, 参数)，不是 jar 调用时返回 None"""
+		if command and os.path.basename(command[0]) in ('java', 'java.exe'):
+			# 单次启动的 JVM 参数（如 -Xmx）由常驻进程自身的启动参数代替
+			index = 1
+			while index < len(command) and command[index] != '-jar' and command[index].startswith('-'):
+				index += 1
+			if index + 1 >= len(command) or command[index] != '-jar':
+				return None
+			jar, args = command[index + 1], command[index + 2:]
+		else:
+			jar = self.jar_aliases.get(os.path.normcase(os.path.abspath(command[0]))) if command else None
+			if jar is None:
+				return None
+			args = command[1:]
+		if not os.path.exists(jar) or any('\n' in arg or '\r' in arg for arg in args):
+			return None
+		return jar, list(args)
+
+	def run(self, command: List[str], cancel_token: Optional[CancellationToken] = None,
+	        timeout: Optional[float] = None) -> Optional[Tuple[int, str, str]]:
+		"""由常驻进程执行命令，返回 (退出码, 标准输出, 错误输出)；无法执行时返回 None
+
+		超过 timeout 秒时结束该常驻进程并抛出 ToolTimeoutError（不再改为单独启动）。
+		"""
+		routed = self.route(command)
+		if routed is None or self.disabled or routed[0] in self._exiting_jars:
+			return None
+		worker = self._acquire()
+		if worker is None:
+			return None
+		callback = cancel_token.add_callback(worker.kill) if cancel_token is not None else None
+		expired = threading.Event()
+
+		def expire() -> None:
+			expired.set()
+			worker.kill()
+
+		timer = None
+		if timeout is not None:
+			timer = threading.Timer(max(timeout, 0.0), expire)
+			timer.daemon = True
+			timer.start()
+		try:
+			return worker.run(*routed)
+		except JvmWorkerError as e:
+			worker.kill()
+			if expired.is_set():
+				raise ToolTimeoutError(timeout)
+			if cancel_token is None or not cancel_token.cancelled:
+				if not worker.traps_exit:
+					self._exiting_jars.add(routed[0])
+				self.logger(f"{str(e)}，改为单独启动: {os.path.basename(routed[0])}")
+			return None
+		finally:
+			if timer is not None:
+				timer.cancel()
+			if callback is not None:
+				cancel_token.remove_callback(callback)
+			self._release(worker)
+
+	def _launch_command(self) -> Optional[List[str]]:
+		version = java_major_version(self.java)
+		if version < MIN_JAVA_VERSION:
+			self.logger(f"常驻JVM需要 JDK {MIN_JAVA_VERSION} 及以上（当前 {version or '未知'}），改为单独启动工具")
+			return None
+		options = list(self.jvm_options)
+		if version < SECURITY_MANAGER_REMOVED:
+			options.append('-Djava.security.manager=allow')
+		return [self.java] + options + [self.source_path]
+
+	def _acquire(self) -> Optional[JvmWorker]:
+		spawn = True  # 内存预算不足时只等待已有进程空闲，不再启动新进程
+		while True:
+			worker = None
+			slot = False
+			dead = []
+			with self._condition:
+				while not self._closed and not self.disabled:
+					while self._idle and worker is None:
+						candidate = self._idle.pop()
+						if candidate.alive:
+							worker = candidate
+						else:
+							self._count -= 1
+							dead.append(candidate)
+					if worker is not None:
+						break
+					if spawn and self._count < self.size:
+						self._count += 1
+						slot = True
+						break
+					if self._count == 0:
+						break
+					self._condition.wait()
+			self._discard(dead)
+			if not slot:
+				return worker
+			# 常驻进程的堆会增长到 -Xmx，启动前按上限占用内存预算；预算不足时不启动，
+			# 等待已有进程空闲，一个都没有时返回 None 由调用方单独启动（按单次估算准入）
+			reserved = self._reserve_memory()
+			if reserved is not None:
+				return self._start_worker(reserved)
+			with self._condition:
+				self._count -= 1
+				self._condition.notify()
+			spawn = False
+
+	def _start_worker(self, reserved: int) -> Optional[JvmWorker]:
+		# 启动进程（含源码编译）耗时较长，不持有锁
+		try:
+			command = self._launch_command()
+			if command is None:
+				raise JvmWorkerError("java 版本不满足要求")
+			worker = JvmWorker(command)
+			worker.reserved = reserved
+			self.logger(f"已启动常驻JVM进程（pid {worker.process.pid}）")
+			return worker
+		except (OSError, JvmWorkerError) as e:
+			if reserved:
+				self.memory_budget.release(reserved)
+			with self._condition:
+				self._count -= 1
+				self.disabled = True
+				self._condition.notify_all()
+			self.logger(f"常驻JVM进程不可用，改为单独启动工具: {str(e)}")
+			return None
+
+	def _reserve_memory(self) -> Optional[int]:
+		if self.memory_budget is None or not self.worker_memory:
+			return 0
+		return self.memory_budget.try_acquire(self.worker_memory)
+
+	def _discard(self, workers: List[JvmWorker]) -> None:
+		"""释放已退出进程占用的内存预算"""
+		for worker in workers:
+			if worker.reserved and self.memory_budget is not None:
+				self.memory_budget.release(worker.reserved)
+			worker.reserved = 0
+
+	def _release(self, worker: JvmWorker) -> None:
+		with self._condition:
+			keep = worker.alive and not self._closed
+			if keep:
+				self._idle.append(worker)
+			else:
+				self._count -= 1
+			self._condition.notify()
+		if not keep:
+			if worker.alive:
+				worker.close()
+			self._discard([worker])
+
+	def trim_idle(self) -> None:
+		"""结束所有空闲的进程并释放其内存预算（单独启动的工具等待内存时调用）"""
+		with self._condition:
+			idle, self._idle = self._idle, []
+			self._count -= len(idle)
+			self._condition.notify_all()
+		for worker in idle:
+			worker.close()
+		self._discard(idle)
+
+	def close(self) -> None:
+		with self._condition:
+			self._closed = True
+			idle, self._idle = self._idle, []
+			self._count -= len(idle)
+			self._condition.notify_all()
+		for worker in idle:
+			worker.close()
+		self._discard(idle)
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import pkcs12
+
+
+JKS_MAGIC = 0xFEEDFEED
+JCEKS_MAGIC = 0xCECECECE
+JKS_PRIVATE_KEY_TAG = 1
+JKS_TRUSTED_CERT_TAG = 2
+JKS_INTEGRITY_WHITENER = b'Mighty Aphrodite'
+# Sun 私有的 JKS 私钥保护算法
+JKS_KEY_PROTECTOR_OID = bytes.fromhex('2b060104012a02110101')
+
+
+class KeystoreError(Exception):
+	"""密钥库无法读取（密码错误、别名不存在、文件损坏等）"""
+
+
+class UnsupportedKeystoreError(KeystoreError):
+	"""密钥库格式不受进程内签名支持，调用方应回退到 apksigner"""
+
+
+class SigningKey:
+	"""从密钥库中取出的私钥与证书链"""
+
+	def __init__(self, private_key, certificates: List[x509.Certificate], alias: str) -> None:
+		self.private_key = private_key
+		self.certificates = certificates
+		self.alias = alias
+
+	@property
+	def certificate(self) -> x509.Certificate:
+		return self.certificates[0]
+
+	def certificate_sha256(self) -> str:
+		return hashlib.sha256(self.certificate.public_bytes(serialization.Encoding.DER)).hexdigest()
+
+
+def _der_element(data: bytes, pos: int) -> Tuple[int, int, int]:
+	"""读取一个DER元素，返回 (tag, 内容起始, 内容结束)"""
+	tag = data[pos]
+	length = data[pos + 1]
+	pos += 2
+	if length & 0x80:
+		count = length & 0x7F
+		length = int.from_bytes(data[pos:pos + count], 'big')
+		pos += count
+	return tag, pos, pos + length
+
+
+def _read_utf(data: bytes, pos: int) -> Tuple[str, int]:
+	length = struct.unpack_from('>H', data, pos)[0]
+	pos += 2
+	return data[pos:pos + length].decode('utf-8', errors='replace'), pos + length
+
+
+def _jks_password(password: str) -> bytes:
+	return password.encode('utf-16-be')
+
+
+def _decrypt_jks_key(encrypted_info: bytes, password: str) -> bytes:
+	_, start, end = _der_element(encrypted_info, 0)
+	_, alg_start, alg_end = _der_element(encrypted_info, start)
+	_, oid_start, oid_end = _der_element(encrypted_info, alg_start)
+	if encrypted_info[oid_start:oid_end] != JKS_KEY_PROTECTOR_OID:
+		raise UnsupportedKeystoreError("不支持的JKS私钥保护算法")
+	_, data_start, data_end = _der_element(encrypted_info, alg_end)
+	protected = encrypted_info[data_start:data_end]
+
+	salt, encrypted, check = protected[:20], protected[20:-20], protected[-20:]
+	password_bytes = _jks_password(password)
+	plain = bytearray()
+	digest = salt
+	while len(plain) < len(encrypted):
+		digest = hashlib.sha1(password_bytes + digest).digest()
+		block = encrypted[len(plain):len(plain) + 20]
+		plain += bytes(a ^ b for a, b in zip(block, digest))
+	if hashlib.sha1(password_bytes + bytes(plain)).digest() != check:
+		raise KeystoreError("密钥密码不正确")
+	return bytes(plain)
+
+
+def _load_jks(data: bytes, store_password: str, alias: str, key_password: str) -> SigningKey:
+	if len(data) < 32 or hashlib.sha1(_jks_password(store_password) + JKS_INTEGRITY_WHITENER
+	                                  + data[:-20]).digest() != data[-20:]:
+		raise KeystoreError("密钥库密码不正确或密钥库文件被损坏")
+	_, version, count = struct.unpack_from('>III', data, 0)
+	pos = 12
+	aliases = []
+	for _ in range(count):
+		tag = struct.unpack_from('>I', data, pos)[0]
+		entry_alias, pos = _read_utf(data, pos + 4)
+		pos += 8  # 时间戳
+		aliases.append(entry_alias)
+		if tag == JKS_PRIVATE_KEY_TAG:
+			key_len = struct.unpack_from('>I', data, pos)[0]
+			encrypted_key = data[pos + 4:pos + 4 + key_len]
+			pos += 4 + key_len
+			chain_len = struct.unpack_from('>I', data, pos)[0]
+			pos += 4
+			chain = []
+			for _ in range(chain_len):
+				if version == 2:
+					_, pos = _read_utf(data, pos)
+				cert_len = struct.unpack_from('>I', data, pos)[0]
+				chain.append(data[pos + 4:pos + 4 + cert_len])
+				pos += 4 + cert_len
+			if entry_alias.lower() == alias.lower():
+				plain = _decrypt_jks_key(encrypted_key, key_password)
+				private_key = serialization.load_der_private_key(plain, None)
+				certificates = [x509.load_der_x509_certificate(c) for c in chain]
+				return SigningKey(private_key, certificates, entry_alias)
+		elif tag == JKS_TRUSTED_CERT_TAG:
+			if version == 2:
+				_, pos = _read_utf(data, pos)
+			cert_len = struct.unpack_from('>I', data, pos)[0]
+			pos += 4 + cert_len
+		else:
+			raise UnsupportedKeystoreError(f"不支持的JKS条目类型：{tag}")
+	raise KeystoreError(f"密钥库中找不到别名 {alias}（可用别名：{', '.join(aliases)}）")
+
+
+def _load_pkcs12(data: bytes, store_password: str, alias: str, key_password: str) -> SigningKey:
+	last_error = None
+	for password in dict.fromkeys([store_password, key_password]):
+		try:
+			bundle = pkcs12.load_pkcs12(data, password.encode('utf-8'))
+			break
+		except ValueError as e:
+			last_error = e
+	else:
+		raise KeystoreError(f"密钥库密码不正确或不是有效的PKCS12文件：{last_error}")
+	if bundle.key is None or bundle.cert is None:
+		raise KeystoreError("PKCS12 密钥库中没有私钥条目")
+	friendly_name = (bundle.cert.friendly_name or b'').decode('utf-8', errors='replace')
+	if friendly_name and friendly_name.lower() != alias.lower():
+		# load_pkcs12 只返回第一个私钥条目，多条目密钥库中的其他别名交给 apksigner（别名确实不存在时由它报错）
+		raise UnsupportedKeystoreError(f"进程内只能读取PKCS12密钥库的第一个私钥条目（{friendly_name}），别名 {alias} 需由apksigner处理")
+	certificates = [bundle.cert.certificate] + [c.certificate for c in bundle.additional_certs]
+	return SigningKey(bundle.key, certificates, friendly_name or alias)
+
+
+_cache: Dict[tuple, SigningKey] = {}
+_cache_lock = threading.Lock()
+
+
+def load_signing_key(keystore_path: str, store_password: str, alias: str, key_password: str) -> SigningKey:
+	"""读取签名私钥与证书链
+
+	同一进程内对同一文件（路径、大小、修改时间不变）与同一组凭据只解析一次。
+	"""
+	stat = os.stat(keystore_path)
+	credentials = hashlib.sha256('\0'.join([store_password, alias, key_password]).encode('utf-8')).digest()
+	cache_key = (os.path.abspath(keystore_path), stat.st_size, stat.st_mtime_ns, credentials)
+	with _cache_lock:
+		cached: Optional[SigningKey] = _cache.get(cache_key)
+	if cached is not None:
+		return cached
+
+	with open(keystore_path, 'rb') as f:
+		data = f.read()
+	magic = struct.unpack_from('>I', data, 0)[0] if len(data) >= 4 else 0
+	if magic == JKS_MAGIC:
+		key = _load_jks(data, store_password, alias, key_password)
+	elif magic == JCEKS_MAGIC:
+		raise UnsupportedKeystoreError("暂不支持JCEKS格式的密钥库")
+	else:
+		key = _load_pkcs12(data, store_password, alias, key_password)
+
+	with _cache_lock:
+		_cache[cache_key] = key
+	return key
@@ -0,0 +1,83 @@
+"""界面日志的缓冲
+
+工作线程每输出一行只在锁内追加到待显示列表，不发送跨线程信号；界面线程定时取出一批一次性显示。
+完整日志按批追加写入日志文件，内存中只保留尚未显示的行。
+"""
+
+import os
+import threading
+import time
+from typing import Any, List, Optional, TextIO
+
+
+def session_log_path(log_dir: str, prefix: str = 'gui') -> str:
+	"""本次运行的日志文件路径"""
+	return os.path.join(log_dir, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.log")
+
+
+def prune_logs(log_dir: str, keep: int = 20) -> None:
+	"""只保留最近的 keep 个日志文件"""
+	try:
+		names = [name for name in os.listdir(log_dir) if name.endswith('.log')]
+	except OSError:
+		return
+	paths = sorted((os.path.join(log_dir, name) for name in names), key=os.path.getmtime, reverse=True)
+	for path in paths[keep:]:
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+
+
+class LogBuffer:
+	"""可在任意线程追加、由界面线程按批取出的日志；log_path 不为空时取出的行同时写入文件"""
+
+	def __init__(self, log_path: Optional[str] = None) -> None:
+		self.log_path = log_path
+		self.lines_written = 0
+		self._pending: List[str] = []
+		self._lock = threading.Lock()
+		self._file: Optional[TextIO] = None
+
+	def append(self, message: Any) -> None:
+		"""追加一条日志，多行消息按行拆分"""
+		lines = str(message).splitlines() or ['']
+		with self._lock:
+			self._pending.extend(lines)
+
+	def drain(self) -> List[str]:
+		"""取出尚未显示的行，并追加写入日志文件"""
+		with self._lock:
+			lines, self._pending = self._pending, []
+		if lines:
+			self._spill(lines)
+		return lines
+
+	def _spill(self, lines: List[str]) -> None:
+		if self.log_path is None:
+			return
+		try:
+			if self._file is None:
+				os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+				self._file = open(self.log_path, 'a', encoding='utf-8')
+			self._file.write('\n'.join(lines) + '\n')
+			self._file.flush()
+			self.lines_written += len(lines)
+		except OSError as e:
+			# 日志文件写不了时只在界面中显示
+			print(f"写入日志文件失败：{str(e)}")
+			self.log_path = None
+			self._close_file()
+
+	def close(self) -> None:
+		"""写出剩余的行并关闭日志文件"""
+		self.drain()
+		self._close_file()
+
+	def _close_file(self) -> None:
+		if self._file is not None:
+			try:
+				self._file.close()
+			except OSError:
+				pass
+			self._file = None
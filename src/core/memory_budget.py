@@ -0,0 +1,143 @@
+import math
+import os
+import re
+import threading
+import zipfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from core.host_info import total_memory_bytes
+from core.job_context import CancellationToken, JobCancelledError
+
+
+MB = 1024 * 1024
+
+# apktool 堆大小估算：基础值 + resources.arsc 解压后大小的倍数 + 需要处理 smali 时 dex 大小的倍数
+BASE_HEAP_MB = 256
+ARSC_HEAP_FACTOR = 16
+DEX_HEAP_FACTOR = 8
+APK_HEAP_FACTOR = 0.25
+MIN_HEAP_MB = 256
+HEAP_GRANULARITY_MB = 64
+
+# 进程实际占用 = 堆 × 系数 + 固定开销（元空间、代码缓存、线程栈、aapt2 子进程）
+RSS_HEAP_FACTOR = 1.25
+RSS_OVERHEAD_MB = 160
+
+# 未配置预算时使用物理内存的比例
+DEFAULT_BUDGET_FRACTION = 0.7
+
+DEX_PATTERN = re.compile(r'^classes\d*\.dex$')
+
+
+def estimate_heap_mb(apk_path: str, decode_sources: bool, max_heap_mb: int) -> int:
+	"""按APK大小、resources.arsc 与 dex 大小估算 apktool 需要的堆大小（MB）"""
+	apk_size = os.path.getsize(apk_path)
+	arsc_size = dex_size = 0
+	try:
+		with zipfile.ZipFile(apk_path) as zf:
+			for info in zf.infolist():
+				if info.filename == 'resources.arsc':
+					arsc_size = info.file_size
+				elif DEX_PATTERN.match(info.filename):
+					dex_size += info.file_size
+	except zipfile.BadZipFile:
+		pass
+	heap = BASE_HEAP_MB + ARSC_HEAP_FACTOR * arsc_size / MB + APK_HEAP_FACTOR * apk_size / MB
+	if decode_sources:
+		heap += DEX_HEAP_FACTOR * dex_size / MB
+	heap = int(math.ceil(heap / HEAP_GRANULARITY_MB) * HEAP_GRANULARITY_MB)
+	return max(MIN_HEAP_MB, min(heap, max_heap_mb))
+
+
+def projected_rss_bytes(heap_mb: int) -> int:
+	return int((heap_mb * RSS_HEAP_FACTOR + RSS_OVERHEAD_MB) * MB)
+
+
+def default_budget_bytes() -> int:
+	"""物理内存的 70%，无法获取物理内存时返回 0（不限制）"""
+	return int(total_memory_bytes() * DEFAULT_BUDGET_FRACTION)
+
+
+class MemoryBudget:
+	"""JVM 阶段的内存准入控制
+
+	每次启动 apktool 前预约其预计占用，已预约总量超过预算时等待其他任务释放。
+	常驻JVM进程从启动到退出一直占用按其 -Xmx 计算的内存。
+	单个任务的预计占用超过整个预算时，等到没有其他任务运行再准入，避免永远等待。
+	预算为 0 表示不限制。
+	"""
+
+	def __init__(self, budget_bytes: int) -> None:
+		self.budget_bytes = max(0, int(budget_bytes))
+		self._in_use = 0
+		self._running = 0
+		self._waiting = 0
+		self._peak = 0
+		self._condition = threading.Condition()
+
+	def acquire(self, amount: int, cancel_token: Optional[CancellationToken] = None,
+	            on_wait: Optional[Callable[[int, int], None]] = None) -> int:
+		"""预约内存，返回实际预约的字节数（交给 release）；等待期间任务被取消时抛出 JobCancelledError
+
+		需要等待时先调用一次 on_wait(已占用, 预算)；回调在锁外执行，可以在其中释放其他预约。
+		"""
+		if self.budget_bytes:
+			amount = min(amount, self.budget_bytes)
+		with self._condition:
+			blocked, in_use = self._blocked(amount), self._in_use
+		if blocked and on_wait is not None:
+			on_wait(in_use, self.budget_bytes)
+		with self._condition:
+			while self._blocked(amount):
+				if cancel_token is not None and cancel_token.cancelled:
+					raise JobCancelledError("任务已取消")
+				self._waiting += 1
+				try:
+					self._condition.wait(timeout=0.5)
+				finally:
+					self._waiting -= 1
+			return self._admit(amount)
+
+	def try_acquire(self, amount: int) -> Optional[int]:
+		"""不等待地预约内存，返回实际预约的字节数；需要等待时返回 None"""
+		if self.budget_bytes:
+			amount = min(amount, self.budget_bytes)
+		with self._condition:
+			if self._blocked(amount):
+				return None
+			return self._admit(amount)
+
+	def release(self, amount: int) -> None:
+		with self._condition:
+			self._in_use = max(0, self._in_use - amount)
+			self._running = max(0, self._running - 1)
+			self._condition.notify_all()
+
+	@contextmanager
+	def reserve(self, amount: int, cancel_token: Optional[CancellationToken] = None,
+	            on_wait: Optional[Callable[[int, int], None]] = None) -> Iterator[int]:
+		reserved = self.acquire(amount, cancel_token, on_wait)
+		try:
+			yield reserved
+		finally:
+			self.release(reserved)
+
+	def stats(self) -> Dict[str, int]:
+		with self._condition:
+			return {
+				'budget_mb': self.budget_bytes // MB,
+				'in_use_mb': self._in_use // MB,
+				'peak_mb': self._peak // MB,
+				'running': self._running,
+				'waiting': self._waiting,
+			}
+
+	def _admit(self, amount: int) -> int:
+		self._in_use += amount
+		self._running += 1
+		self._peak = max(self._peak, self._in_use)
+		return amount
+
+	def _blocked(self, amount: int) -> bool:
+		return bool(self.budget_bytes) and self._running > 0 and self._in_use + amount > self.budget_bytes
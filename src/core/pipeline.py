@@ -0,0 +1,202 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.bundle import is_bundle
+from core.job_context import JobCancelledError, JobContext
+from core.preflight import PLAN_FULL, PLAN_SKIP
+from core.stages import STAGES, merge_stage_limits
+
+
+# 阶段返回该值表示任务在等待相同输入的任务，完成后重新进入 prepare 阶段
+_WAITING = ''
+
+
+class _PipelineJob:
+	def __init__(self, ctx: JobContext) -> None:
+		self.ctx = ctx
+		self.future: Future = Future()
+		self.apk_path: Optional[str] = None  # 当前阶段产出的APK（工作目录中）
+		self.plan: Optional[str] = None  # 预检选择的处理路径
+		self.waiting = False
+
+
+class PipelineScheduler:
+	"""按阶段调度的批量执行器
+
+	每个阶段有独立的线程池与并发上限，任务完成一个阶段后进入下一个阶段的队列，
+	因此一个APK在签名时，下一个APK可以同时反编译。stats() 返回各阶段的排队数与运行数，
+	用于调整并发上限。
+	"""
+
+	def __init__(self, engine, stage_limits: Optional[Dict[str, int]] = None) -> None:
+		self.engine = engine
+		self.stage_limits = merge_stage_limits(stage_limits)
+		self._executors = {name: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f'stage-{name}')
+		                   for name, limit in self.stage_limits.items()}
+		# 拆分APK安装包由 BundleRunner 在内部并行处理各个APK，整体占用一个线程，并发数与 decode 阶段相同
+		self._bundle_executor = ThreadPoolExecutor(max_workers=self.stage_limits['decode'],
+		                                           thread_name_prefix='bundle')
+		self._stats = {name: {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0} for name in STAGES}
+		self._pending: List[Future] = []
+		self._lock = threading.Lock()
+
+	def submit(self, ctx: JobContext) -> Future:
+		"""提交任务，返回结果为 (是否成功, 消息) 的 Future"""
+		job = _PipelineJob(ctx)
+		with self._lock:
+			self._pending.append(job.future)
+		job.future.add_done_callback(self._forget)
+		if is_bundle(ctx.apk_path):
+			self._bundle_executor.submit(self._run_bundle, job)
+		else:
+			self._enqueue(job, 'prepare')
+		return job.future
+
+	def run_jobs(self, contexts: Iterable[JobContext]) -> List[Tuple[bool, str]]:
+		"""执行一批任务并等待全部完成，结果顺序与输入一致"""
+		futures = [self.submit(ctx) for ctx in contexts]
+		return [future.result() for future in futures]
+
+	def stats(self) -> Dict[str, Dict[str, int]]:
+		"""各阶段的并发上限、排队数、运行数、已完成数与失败数"""
+		with self._lock:
+			return {name: dict(counters, limit=self.stage_limits[name]) for name, counters in self._stats.items()}
+
+	def queue_depths(self) -> Dict[str, int]:
+		with self._lock:
+			return {name: counters['queued'] for name, counters in self._stats.items()}
+
+	def shutdown(self, wait: bool = True) -> None:
+		"""等待已提交的任务完成后关闭各阶段线程池"""
+		if wait:
+			while True:
+				with self._lock:
+					pending = list(self._pending)
+				if not pending:
+					break
+				for future in pending:
+					future.exception()
+		for executor in list(self._executors.values()) + [self._bundle_executor]:
+			executor.shutdown(wait=wait)
+
+	def __enter__(self) -> 'PipelineScheduler':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.shutdown()
+
+	# ---- 调度 ----
+
+	def _forget(self, future: Future) -> None:
+		with self._lock:
+			if future in self._pending:
+				self._pending.remove(future)
+
+	def _enqueue(self, job: _PipelineJob, stage: str) -> None:
+		with self._lock:
+			self._stats[stage]['queued'] += 1
+		self._executors[stage].submit(self._run_stage, job, stage)
+
+	def _wait_for(self, job: _PipelineJob, pending: Future) -> None:
+		"""不占用线程地等待相同输入的任务结束（或本任务被取消），然后重新进入 prepare 阶段"""
+		def resume(*_) -> None:
+			with self._lock:
+				if not job.waiting:
+					return
+				job.waiting = False
+			job.ctx.cancel_token.remove_callback(resume)
+			self._enqueue(job, 'prepare')
+
+		job.waiting = True
+		job.ctx.log("相同输入的任务正在处理，等待其结果...")
+		job.ctx.cancel_token.add_callback(resume)
+		pending.add_done_callback(resume)
+
+	def _run_bundle(self, job: _PipelineJob) -> None:
+		try:
+			result = self.engine.run_job(job.ctx)
+		except Exception as e:
+			result = (False, f"处理失败: {str(e)}")
+		job.future.set_result(result)
+
+	def _run_stage(self, job: _PipelineJob, stage: str) -> None:
+		with self._lock:
+			self._stats[stage]['queued'] -= 1
+			self._stats[stage]['running'] += 1
+		engine = self.engine
+		result = None
+		next_stage = None
+		try:
+			next_stage = getattr(self, f'_stage_{stage}')(job)
+			if next_stage is None:
+				result = (True, "处理完成")
+		except JobCancelledError:
+			result = engine._job_cancelled(job.ctx)
+		except Exception as e:
+			result = engine._job_failed(job.ctx, e)
+		finally:
+			with self._lock:
+				counters = self._stats[stage]
+				counters['running'] -= 1
+				counters['completed'] += 1
+				if result is not None and not result[0]:
+					counters['failed'] += 1
+
+		if result is None:
+			if next_stage != _WAITING:
+				self._enqueue(job, next_stage)
+			return
+		try:
+			engine._end_job(job.ctx)
+		finally:
+			job.future.set_result(result)
+
+	# ---- 各阶段：返回下一个阶段，None 表示任务完成 ----
+
+	def _stage_prepare(self, job: _PipelineJob) -> Optional[str]:
+		if job.ctx.work_dir is None:
+			self.engine._prepare_job(job.ctx)
+		job.apk_path, pending = self.engine._claim_result(job.ctx)
+		if pending is not None:
+			self._wait_for(job, pending)
+			return _WAITING
+		if job.apk_path:
+			return 'finish'
+		job.plan = self.engine._preflight(job.ctx)
+		return 'decode' if job.plan == PLAN_FULL else 'patch'
+
+	def _stage_patch(self, job: _PipelineJob) -> Optional[str]:
+		if job.plan == PLAN_SKIP:
+			job.apk_path = self.engine._copy_unmodified(job.ctx)
+		else:
+			job.apk_path = self.engine._binary_patch_apk(job.ctx)
+		return 'sign' if job.apk_path else 'decode'
+
+	def _stage_decode(self, job: _PipelineJob) -> Optional[str]:
+		# 有检查点时跳过反编译与回编译
+		job.apk_path, checkpoint = self.engine._resume_checkpoint(job.ctx)
+		if job.apk_path:
+			return self._after_build(job, checkpoint)
+		self.engine._decode_sources(job.ctx)
+		return 'build'
+
+	def _stage_build(self, job: _PipelineJob) -> Optional[str]:
+		job.apk_path = self.engine._build_apk(job.ctx)
+		return self._after_build(job, 'built')
+
+	@staticmethod
+	def _after_build(job: _PipelineJob, checkpoint: str) -> str:
+		return 'align' if job.ctx.options.zipalign and checkpoint != 'aligned' else 'sign'
+
+	def _stage_align(self, job: _PipelineJob) -> Optional[str]:
+		self.engine._align_apk(job.ctx, job.apk_path)
+		return 'sign'
+
+	def _stage_sign(self, job: _PipelineJob) -> Optional[str]:
+		self.engine._sign_apk(job.ctx, job.apk_path)
+		return 'finish'
+
+	def _stage_finish(self, job: _PipelineJob) -> Optional[str]:
+		self.engine._finish_job(job.ctx, job.apk_path)
+		return None
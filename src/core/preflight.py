@@ -0,0 +1,145 @@
+"""处理前的APK预检
+
+只读取ZIP中央目录与清单、网络安全配置（及解析其路径所需的 resources.arsc）条目，判断实际需要哪些修改，
+据此选择最快的处理路径：
+
+- skip：无需任何修改，只重新签名
+- shortcut：直接修改二进制XML（BinaryPatcher）
+- full：二进制XML无法直接修改，走 apktool 反编译/回编译
+"""
+
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from core.axml import AxmlError
+from core.binary_patcher import BinaryPatcher
+from core.memory_budget import MB
+from core.zip_writer import ZipRewriteError, read_central_directory
+
+
+PLAN_SKIP = 'skip'
+PLAN_SHORTCUT = 'shortcut'
+PLAN_FULL = 'full'
+
+PLAN_LABELS = {
+	PLAN_SKIP: '无需修改，只重新签名',
+	PLAN_SHORTCUT: '直接修改二进制XML',
+	PLAN_FULL: 'apktool 反编译/回编译',
+}
+
+# 估算耗时用的经验值，只用于比较各路径的量级，不代表具体机器上的实际耗时
+JVM_STARTUP_S = 1.5
+APKTOOL_ARSC_BYTES_PER_S = 8 * MB
+APKTOOL_RESOURCE_FILE_S = 0.0005
+APKTOOL_SMALI_BYTES_PER_S = 2 * MB
+REWRITE_BYTES_PER_S = 400 * MB
+SIGN_BYTES_PER_S = 150 * MB
+
+
+class ApkStats:
+	"""从中央目录得到的APK组成"""
+
+	def __init__(self, apk_bytes: int = 0) -> None:
+		self.apk_bytes = apk_bytes
+		self.entries = 0
+		self.resource_files = 0
+		self.arsc_bytes = 0
+		self.dex_count = 0
+		self.dex_bytes = 0
+		self.native_bytes = 0
+
+	@classmethod
+	def read(cls, apk_path: str) -> 'ApkStats':
+		stats = cls(os.path.getsize(apk_path))
+		with open(apk_path, 'rb') as f:
+			for entry in read_central_directory(f):
+				name = entry.name
+				stats.entries += 1
+				if name == 'resources.arsc':
+					stats.arsc_bytes = entry.uncompressed_size
+				elif name.startswith('res/'):
+					stats.resource_files += 1
+				elif name.startswith('classes') and name.endswith('.dex'):
+					stats.dex_count += 1
+					stats.dex_bytes += entry.uncompressed_size
+				elif name.startswith('lib/') and name.endswith('.so'):
+					stats.native_bytes += entry.uncompressed_size
+		return stats
+
+	def as_dict(self) -> Dict[str, int]:
+		return dict(vars(self))
+
+
+class ProbeResult:
+	"""预检结论：建议的路径、原因、需要替换的条目与各路径的估算耗时"""
+
+	def __init__(self, plan: str, reasons: List[str], stats: ApkStats,
+	             replacements: Optional[Dict[str, bytes]] = None, zipalign: bool = False,
+	             decode_sources: bool = False) -> None:
+		self.plan = plan
+		self.reasons = reasons
+		self.stats = stats
+		self.replacements = replacements  # shortcut 路径可以直接使用，避免再次解析
+		self.zipalign = zipalign
+		self.decode_sources = decode_sources
+
+	def estimate_seconds(self, plan: Optional[str] = None) -> float:
+		"""某条路径（默认为建议的路径）的估算耗时"""
+		plan = plan or self.plan
+		stats = self.stats
+		seconds = stats.apk_bytes / SIGN_BYTES_PER_S
+		if plan in (PLAN_SKIP, PLAN_SHORTCUT):
+			# 重写一遍ZIP（移除旧签名、按需对齐），未修改条目的压缩数据原样拷贝
+			seconds += stats.apk_bytes / REWRITE_BYTES_PER_S
+		elif plan == PLAN_FULL:
+			# 反编译与回编译各启动一次 JVM，资源表与资源文件两个方向都要处理
+			apktool = JVM_STARTUP_S + stats.arsc_bytes / APKTOOL_ARSC_BYTES_PER_S \
+				+ stats.resource_files * APKTOOL_RESOURCE_FILE_S
+			if self.decode_sources:
+				apktool += stats.dex_bytes / APKTOOL_SMALI_BYTES_PER_S
+			seconds += 2 * apktool
+			if self.zipalign:
+				seconds += stats.apk_bytes / REWRITE_BYTES_PER_S
+		return round(seconds, 2)
+
+	def describe(self, plan: Optional[str] = None) -> str:
+		plan = plan or self.plan
+		reasons = '；'.join(self.reasons)
+		return f"{plan}（{PLAN_LABELS[plan]}），预计约 {self.estimate_seconds(plan)}s：{reasons}"
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			'plan': self.plan,
+			'reasons': list(self.reasons),
+			'estimated_seconds': {plan: self.estimate_seconds(plan) for plan in PLAN_LABELS},
+			'stats': self.stats.as_dict(),
+		}
+
+
+def probe_apk(apk_path: str, debuggable: bool, zipalign: bool = False, decode_sources: bool = False,
+              logger: Optional[Callable[[str], None]] = None) -> ProbeResult:
+	"""预检APK，返回建议的处理路径"""
+	logger = logger or (lambda message: None)
+	try:
+		stats = ApkStats.read(apk_path)
+	except ZipRewriteError as e:
+		# 中央目录无法顺序重写（例如 ZIP64）时二进制修改也无法写出
+		return ProbeResult(PLAN_FULL, [f"ZIP结构无法直接重写：{str(e)}"], ApkStats(os.path.getsize(apk_path)),
+		                   zipalign=zipalign, decode_sources=decode_sources)
+
+	messages: List[str] = []
+	patcher = BinaryPatcher(logger=messages.append)
+	try:
+		replacements = patcher.build_patches(apk_path, debuggable=debuggable)
+	except AxmlError as e:
+		return ProbeResult(PLAN_FULL, [f"二进制XML无法直接修改：{str(e)}"], stats,
+		                   zipalign=zipalign, decode_sources=decode_sources)
+	for message in messages:
+		logger(message)
+	if replacements:
+		plan = PLAN_SHORTCUT
+		reasons = [f"需要修改 {', '.join(sorted(replacements))}"]
+	else:
+		plan = PLAN_SKIP
+		reasons = messages or ["没有需要修改的内容"]
+	return ProbeResult(plan, reasons, stats, replacements, zipalign=zipalign, decode_sources=decode_sources)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.workdir_store import WorkDirStore
+
+
+COMPLETE_MARKER = '.result_complete'
+RESULT_NAME = 'output.apk'
+INFO_NAME = 'info.json'
+
+# 处理逻辑变化导致相同输入的输出不同时递增，使旧的结果全部失效
+RESULT_FORMAT_VERSION = 1
+
+
+class ResultCache:
+	"""已签名输出APK的缓存
+
+	键由 APK 的 SHA-256、影响输出的任务选项、签名证书指纹与工具链版本共同决定，
+	命中时直接复用上次生成的APK。条目登记到 WorkDirStore，与反编译缓存共用磁盘预算并按 LRU 淘汰。
+	同一进程内键相同的任务同时运行时，只有第一个任务真正处理，其余任务等待其结果。
+	"""
+
+	def __init__(self, cache_root: str, logger: Optional[Callable[[str], None]] = None,
+	             store: Optional[WorkDirStore] = None) -> None:
+		self.cache_root = cache_root
+		self.logger = logger or print
+		self.workdir_store = store
+		self._lock = threading.Lock()
+		self._in_flight: Dict[str, Future] = {}
+		os.makedirs(cache_root, exist_ok=True)
+
+	@staticmethod
+	def make_key(apk_sha256: str, options: Dict[str, Any], certificate: str, toolchain: Dict[str, str]) -> str:
+		payload = json.dumps({'format': RESULT_FORMAT_VERSION, 'apk': apk_sha256, 'options': options,
+		                      'certificate': certificate, 'toolchain': toolchain}, sort_keys=True)
+		return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+	def entry_path(self, key: str) -> str:
+		return os.path.join(self.cache_root, key)
+
+	def lookup(self, key: str) -> Optional[str]:
+		"""返回缓存的APK路径，未命中时返回 None"""
+		path = self.entry_path(key)
+		if not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+			return None
+		if self.workdir_store is not None:
+			self.workdir_store.touch(self.workdir_store.name_of(path))
+		return os.path.join(path, RESULT_NAME)
+
+	def checkout(self, key: str, destination: str) -> bool:
+		"""把缓存的APK复制到 destination；条目已被淘汰时返回 False"""
+		path = self.entry_path(key)
+		name = self.workdir_store.name_of(path) if self.workdir_store is not None else None
+		if name is not None:
+			# 复制期间占用条目，防止被预算淘汰
+			self.workdir_store.pin(name)
+		try:
+			if not os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+				return False
+			shutil.copyfile(os.path.join(path, RESULT_NAME), destination)
+			return True
+		except FileNotFoundError:
+			return False
+		finally:
+			if name is not None:
+				self.workdir_store.unpin(name)
+
+	def claim(self, key: str) -> Tuple[Optional[str], Optional[Future]]:
+		"""开始处理某个键
+
+		返回 (缓存的APK, None) 表示命中；(None, Future) 表示相同输入的任务正在处理，Future 在其结束时完成；
+		(None, None) 表示由调用方处理，结束后必须调用 release()。
+		"""
+		with self._lock:
+			pending = self._in_flight.get(key)
+			if pending is not None:
+				return None, pending
+			cached = self.lookup(key)
+			if cached is not None:
+				return cached, None
+			self._in_flight[key] = Future()
+			return None, None
+
+	def release(self, key: str) -> None:
+		"""结束 claim() 得到的处理权（无论成功与否），唤醒等待相同输入的任务"""
+		with self._lock:
+			pending = self._in_flight.pop(key, None)
+		if pending is not None and not pending.done():
+			pending.set_result(None)
+
+	def store(self, key: str, apk_path: str, info: Dict[str, Any]) -> str:
+		"""复制已签名的APK进入缓存，返回缓存中的APK路径"""
+		staging = os.path.join(self.cache_root, f'{key}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp')
+		target = self.entry_path(key)
+		try:
+			os.makedirs(staging)
+			shutil.copyfile(apk_path, os.path.join(staging, RESULT_NAME))
+			with open(os.path.join(staging, INFO_NAME), 'w', encoding='utf-8') as f:
+				json.dump(dict(info, created=time.time()), f, ensure_ascii=False, indent=4)
+			with open(os.path.join(staging, COMPLETE_MARKER), 'w', encoding='utf-8') as f:
+				f.write(key)
+			try:
+				os.rename(staging, target)
+			except OSError:
+				# 其他进程已写入同一键，保留先完成的结果
+				if not os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+					raise
+		finally:
+			if os.path.exists(staging):
+				shutil.rmtree(staging, ignore_errors=True)
+		if self.workdir_store is not None:
+			self.workdir_store.register(self.workdir_store.name_of(target), kind='result')
+		return os.path.join(target, RESULT_NAME)
@@ -0,0 +1,29 @@
+from typing import Dict
+
+from core.host_info import cpu_count
+
+
+# 任务经过的阶段（按执行顺序）；prepare/finish 只做检查与文件移动
+STAGES = ('prepare', 'patch', 'decode', 'build', 'align', 'sign', 'finish')
+
+# 各阶段单次外部工具运行的默认秒数上限（见 JobOptions.stage_timeouts）
+DEFAULT_STAGE_TIMEOUTS = {'decode': 1800, 'build': 1800, 'sign': 600}
+
+
+def default_stage_limits() -> Dict[str, int]:
+	"""apktool 阶段每个 JVM 占用内存较多，默认并发为核数一半；其余阶段按核数"""
+	cores = cpu_count()
+	heavy = max(1, cores // 2)
+	limits = {name: cores for name in STAGES}
+	limits.update(decode=heavy, build=heavy)
+	return limits
+
+
+def merge_stage_limits(overrides: Dict[str, int]) -> Dict[str, int]:
+	"""在默认并发数上应用覆盖项，阶段名无效时抛出 ValueError"""
+	limits = default_stage_limits()
+	for name, limit in (overrides or {}).items():
+		if name not in STAGES:
+			raise ValueError(f"未知的阶段：{name}")
+		limits[name] = max(1, int(limit))
+	return limits
@@ -0,0 +1,340 @@
+import asyncio
+import locale
+import os
+import signal
+import subprocess
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+# 逐行回调输出时只保留最后这么多行，用于失败时的错误信息
+OUTPUT_TAIL_LINES = 200
+# 事件循环读取输出时单行的长度上限，超长的行被丢弃
+ASYNC_LINE_LIMIT = 1024 * 1024
+
+_pidfd_supported: Optional[bool] = None
+
+
+def pidfd_supported() -> bool:
+	"""能否用 pidfd 在事件循环中等待子进程退出（Linux 5.3+），决定 communicate_async 是否可用"""
+	global _pidfd_supported
+	if _pidfd_supported is None:
+		try:
+			os.close(os.pidfd_open(os.getpid()))
+			_pidfd_supported = True
+		except (AttributeError, OSError):
+			_pidfd_supported = False
+	return _pidfd_supported
+
+
+def decode_output(data: bytes) -> str:
+	"""与 subprocess.run(text=True) 相同：按本地编码解码并统一换行符"""
+	if not data:
+		return ''
+	text = data.decode(locale.getpreferredencoding(False), errors='replace')
+	return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class ToolTimeoutError(Exception):
+	"""外部工具超过时限，已被终止"""
+
+	def __init__(self, timeout: float, usage: Optional['ToolUsage'] = None) -> None:
+		super().__init__(f"超过时限 {timeout:g}s，已终止")
+		self.timeout = timeout
+		self.usage = usage
+
+
+def new_group_kwargs() -> Dict[str, Any]:
+	"""Popen 参数：让子进程成为新进程组的组长，终止时可连同其子进程（如 apktool 启动的 aapt2）一起结束"""
+	if os.name == 'nt':
+		return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+	return {'start_new_session': True}
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+	"""强制结束进程及其全部子进程；调用方需保证进程尚未被回收（否则 pid 可能已被复用）"""
+	if os.name == 'nt':
+		try:
+			subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], stdout=subprocess.DEVNULL,
+			               stderr=subprocess.DEVNULL, timeout=30)
+		except (OSError, subprocess.SubprocessError):
+			pass
+		try:
+			process.kill()
+		except OSError:
+			pass
+		return
+	try:
+		# 进程组在组内最后一个进程退出前不会被复用
+		os.killpg(process.pid, signal.SIGKILL)
+	except (ProcessLookupError, PermissionError):
+		try:
+			os.kill(process.pid, signal.SIGKILL)
+		except ProcessLookupError:
+			pass
+
+
+_live_lock = threading.Lock()
+_live: 'weakref.WeakSet[ToolProcess]' = weakref.WeakSet()
+
+
+def kill_all_tools() -> None:
+	"""结束本进程启动且仍在运行的全部工具进程树
+
+	工具在独立的进程组中运行，终端的 Ctrl+C 不会传给它们；进程退出前（如 KeyboardInterrupt）应调用本函数。
+	"""
+	with _live_lock:
+		processes = list(_live)
+	for process in processes:
+		process.kill()
+
+
+class ToolUsage:
+	"""一次外部工具进程的资源占用（含其已退出的子进程）"""
+
+	def __init__(self, wall_s: float, user_s: Optional[float] = None, sys_s: Optional[float] = None,
+	             max_rss_bytes: Optional[int] = None) -> None:
+		self.wall_s = wall_s
+		self.user_s = user_s
+		self.sys_s = sys_s
+		self.max_rss_bytes = max_rss_bytes
+
+	def as_dict(self) -> Dict[str, Any]:
+		"""用于阶段记录的字段，无法获取的项不输出"""
+		fields: Dict[str, Any] = {}
+		if self.user_s is not None:
+			fields['user_s'] = round(self.user_s, 6)
+		if self.sys_s is not None:
+			fields['sys_s'] = round(self.sys_s, 6)
+		if self.max_rss_bytes is not None:
+			fields['max_rss_bytes'] = self.max_rss_bytes
+		return fields
+
+
+class ToolProcess:
+	"""启动外部工具并在退出时取得其 CPU 时间与峰值内存
+
+	POSIX 上由本类用 wait4 回收子进程（subprocess 自己回收时会丢弃 rusage），峰值内存可能包含
+	exec 之前从本进程 fork 出的部分，对 JVM 这类大进程影响可忽略；
+	Windows 上在进程退出后、句柄关闭前查询 GetProcessTimes 与 GetProcessMemoryInfo。
+	工具在独立的进程组中运行，kill() 结束整个进程树，可在其他线程中调用，进程回收后不会再发送信号。
+	"""
+
+	def __init__(self, command: List[str]) -> None:
+		self.command = command
+		self.start = time.time()
+		self._started = time.perf_counter()
+		self._lock = threading.Lock()
+		self._reaped = False
+		self._usage: Optional[ToolUsage] = None
+		self.timed_out = False
+		self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+		                                **new_group_kwargs())
+		with _live_lock:
+			_live.add(self)
+
+	@property
+	def pid(self) -> int:
+		return self.process.pid
+
+	def communicate(self, on_line: Optional[Callable[[str, str], None]] = None, timeout: Optional[float] = None
+	                ) -> Tuple[int, bytes, bytes, ToolUsage]:
+		"""读取全部输出并等待退出，返回 (退出码, 标准输出, 错误输出, 资源占用)
+
+		on_line 不为空时在读取线程中逐行回调 (流名 stdout/stderr, 行)，返回的输出只保留最后
+		OUTPUT_TAIL_LINES 行，输出再多内存占用也不会增长。超过 timeout 秒时结束进程树并抛出 ToolTimeoutError。
+		"""
+		timer = None
+		if timeout is not None:
+			timer = threading.Timer(max(timeout, 0.0), self._expire)
+			timer.daemon = True
+			timer.start()
+		try:
+			returncode, stdout, stderr, usage = self._communicate(on_line)
+		finally:
+			if timer is not None:
+				timer.cancel()
+			with _live_lock:
+				_live.discard(self)
+		if self.timed_out:
+			raise ToolTimeoutError(timeout, usage)
+		return returncode, stdout, stderr, usage
+
+	async def communicate_async(self, on_line: Optional[Callable[[str, str], None]] = None,
+	                            timeout: Optional[float] = None) -> Tuple[int, bytes, bytes, ToolUsage]:
+		"""communicate() 的 asyncio 版本，不占用线程：输出由事件循环读取，进程退出由 pidfd 通知后用 wait4 回收
+
+		只能在 pidfd_supported() 为真时使用；on_line 在事件循环线程中回调。协程被取消时结束进程树并回收进程。
+		"""
+		loop = asyncio.get_running_loop()
+		stdout_lines: Deque[bytes] = deque(maxlen=OUTPUT_TAIL_LINES if on_line else None)
+		stderr_lines: Deque[bytes] = deque(maxlen=OUTPUT_TAIL_LINES if on_line else None)
+		timer = loop.call_later(max(timeout, 0.0), self._expire) if timeout is not None else None
+		try:
+			try:
+				await asyncio.gather(self._drain_async(loop, self.process.stdout, 'stdout', stdout_lines, on_line),
+				                     self._drain_async(loop, self.process.stderr, 'stderr', stderr_lines, on_line))
+				usage = await self._wait_async(loop)
+			except asyncio.CancelledError:
+				self.kill()
+				await self._wait_async(loop)
+				raise
+		finally:
+			if timer is not None:
+				timer.cancel()
+			with _live_lock:
+				_live.discard(self)
+		if self.timed_out:
+			raise ToolTimeoutError(timeout, usage)
+		return self.process.returncode, b''.join(stdout_lines), b''.join(stderr_lines), usage
+
+	@staticmethod
+	async def _drain_async(loop: asyncio.AbstractEventLoop, pipe, name: str, lines: Deque[bytes],
+	                       on_line: Optional[Callable[[str, str], None]]) -> None:
+		"""在事件循环中读取一个输出流直到结束，回调规则与 _drain 相同"""
+		reader = asyncio.StreamReader(limit=ASYNC_LINE_LIMIT)
+		transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+		try:
+			while True:
+				try:
+					raw = await reader.readline()
+				except ValueError:
+					continue
+				if not raw:
+					break
+				lines.append(raw)
+				if on_line is not None:
+					try:
+						on_line(name, decode_output(raw).rstrip('\n'))
+					except Exception:
+						on_line = None
+		finally:
+			transport.close()
+
+	async def _wait_async(self, loop: asyncio.AbstractEventLoop) -> ToolUsage:
+		"""等待进程退出（pidfd 可读）后回收，返回资源占用；已回收时不再等待"""
+		if not self._reaped:
+			pidfd = os.pidfd_open(self.pid)
+			try:
+				exited = loop.create_future()
+				loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+				try:
+					await exited
+				finally:
+					loop.remove_reader(pidfd)
+			finally:
+				os.close(pidfd)
+		return self._reap()
+
+	def _expire(self) -> None:
+		with self._lock:
+			if self._reaped:
+				return
+			self.timed_out = True
+		self.kill()
+
+	def _communicate(self, on_line: Optional[Callable[[str, str], None]]) -> Tuple[int, bytes, bytes, ToolUsage]:
+		stdout_lines: Deque[bytes] = deque(maxlen=OUTPUT_TAIL_LINES if on_line else None)
+		stderr_lines: Deque[bytes] = deque(maxlen=OUTPUT_TAIL_LINES if on_line else None)
+		reader = threading.Thread(target=self._drain, args=(self.process.stderr, 'stderr', stderr_lines, on_line),
+		                          daemon=True)
+		reader.start()
+		self._drain(self.process.stdout, 'stdout', stdout_lines, on_line)
+		reader.join()
+		stdout, stderr = b''.join(stdout_lines), b''.join(stderr_lines)
+
+		if os.name == 'nt':
+			self.process.wait()
+			usage = self._windows_usage()
+			with self._lock:
+				self._reaped = True
+			return self.process.returncode, stdout, stderr, usage
+
+		if hasattr(os, 'waitid'):
+			# 先等待退出但不回收，回收与 kill() 互斥，避免向已复用的 pid 发送信号
+			os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+		usage = self._reap()
+		return self.process.returncode, stdout, stderr, usage
+
+	def _reap(self) -> ToolUsage:
+		"""用 wait4 回收已退出（或即将退出）的进程并记录退出码与资源占用（POSIX）"""
+		with self._lock:
+			if self._reaped:
+				return self._usage
+			_, status, rusage = os.wait4(self.pid, 0)
+			self._reaped = True
+			wall_s = time.perf_counter() - self._started
+			self.process.returncode = os.waitstatus_to_exitcode(status)
+			# Linux 上 ru_maxrss 以 KB 为单位，macOS 上以字节为单位
+			max_rss = rusage.ru_maxrss if os.uname().sysname == 'Darwin' else rusage.ru_maxrss * 1024
+			self._usage = ToolUsage(wall_s, rusage.ru_utime, rusage.ru_stime, max_rss)
+			return self._usage
+
+	@staticmethod
+	def _drain(pipe, name: str, lines: Deque[bytes], on_line: Optional[Callable[[str, str], None]]) -> None:
+		"""读取一个输出流直到结束；回调出错后不再回调，但继续读取，避免子进程写满管道而阻塞"""
+		try:
+			for raw in iter(pipe.readline, b''):
+				lines.append(raw)
+				if on_line is not None:
+					try:
+						on_line(name, decode_output(raw).rstrip('\n'))
+					except Exception:
+						on_line = None
+		finally:
+			pipe.close()
+
+	def kill(self) -> None:
+		"""结束工具及其子进程；Popen.kill() 会先 poll()，可能抢先回收进程而丢失 rusage，因此直接发送信号"""
+		with self._lock:
+			if self._reaped:
+				return
+			kill_process_tree(self.process)
+
+	def _windows_usage(self) -> ToolUsage:
+		wall_s = time.perf_counter() - self._started
+		try:
+			import ctypes
+			from ctypes import wintypes
+
+			class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+				_fields_ = [
+					('cb', wintypes.DWORD),
+					('PageFaultCount', wintypes.DWORD),
+					('PeakWorkingSetSize', ctypes.c_size_t),
+					('WorkingSetSize', ctypes.c_size_t),
+					('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+					('QuotaPagedPoolUsage', ctypes.c_size_t),
+					('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+					('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+					('PagefileUsage', ctypes.c_size_t),
+					('PeakPagefileUsage', ctypes.c_size_t),
+				]
+
+			handle = wintypes.HANDLE(int(self.process._handle))
+			kernel32 = ctypes.windll.kernel32
+			creation, exited, kernel, user = (wintypes.FILETIME() for _ in range(4))
+			user_s = sys_s = max_rss = None
+			if kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exited),
+			                            ctypes.byref(kernel), ctypes.byref(user)):
+				# FILETIME 以 100 纳秒为单位
+				user_s = ((user.dwHighDateTime << 32) | user.dwLowDateTime) / 1e7
+				sys_s = ((kernel.dwHighDateTime << 32) | kernel.dwLowDateTime) / 1e7
+			counters = PROCESS_MEMORY_COUNTERS()
+			counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+			if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+				max_rss = int(counters.PeakWorkingSetSize)
+			return ToolUsage(wall_s, user_s, sys_s, max_rss)
+		except (OSError, AttributeError, ValueError):
+			return ToolUsage(wall_s)
+
+
+def run_tool_process(command: List[str], on_line: Optional[Callable[[str, str], None]] = None,
+                     timeout: Optional[float] = None) -> Tuple[int, str, str, ToolUsage]:
+	"""运行外部工具直到退出，返回 (退出码, 标准输出, 错误输出, 资源占用)；参数见 ToolProcess.communicate"""
+	process = ToolProcess(command)
+	returncode, stdout, stderr, usage = process.communicate(on_line, timeout)
+	return returncode, decode_output(stdout), decode_output(stderr), usage
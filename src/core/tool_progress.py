@@ -0,0 +1,130 @@
+"""外部工具输出的进度解析与任务整体进度
+
+apktool 每进入一个步骤输出一行（如 "I: Decoding file-resources..."），ApktoolProgress 把这些行
+换算为工具内的完成比例；JobProgress 再按任务阶段换算为 0-100 的整体进度，交给界面显示确定的进度条。
+"""
+
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# 各阶段在整体进度中所占的区间（百分比）；二进制修改与 apktool 流程互斥，共用 patch 之后的区间
+STAGE_PROGRESS: Dict[str, Tuple[int, int]] = {
+	'prepare': (0, 3),
+	'cache': (3, 5),
+	'probe': (5, 8),
+	'resume': (8, 10),
+	'patch': (10, 50),
+	'decode': (10, 50),
+	'build': (50, 85),
+	'align': (85, 90),
+	'sign': (90, 98),
+	'finish': (98, 100),
+}
+
+# (输出行的正则, 该步骤开始时工具内的完成比例)，按 apktool 的输出顺序排列
+_DECODE_STEPS: List[Tuple[str, float]] = [
+	(r'Using Apktool', 0.02),
+	(r'Loading resource table\.\.\.', 0.05),
+	(r'Decoding AndroidManifest\.xml', 0.10),
+	(r'Loading resource table from file', 0.15),
+	(r'Regular manifest package', 0.20),
+	(r'Decoding file-resources', 0.30),
+	(r'Decoding values', 0.50),
+	(r'Baksmaling', 0.60),
+	(r'Copying assets and libs', 0.88),
+	(r'Copying unknown files', 0.92),
+	(r'Copying original files', 0.96),
+]
+_BUILD_STEPS: List[Tuple[str, float]] = [
+	(r'Using Apktool', 0.02),
+	(r'Checking whether sources has changed', 0.05),
+	(r'Smaling', 0.10),
+	(r'Checking whether resources has changed', 0.40),
+	(r'Building resources', 0.45),
+	(r'Copying libs', 0.80),
+	(r'Building apk file', 0.85),
+	(r'Importing', 0.88),
+	(r'Copying unknown files', 0.92),
+	(r'Built apk into', 1.0),
+]
+# smali 的反编译/编译按 dex 逐个输出，在该步骤的区间内按序号推进
+_SMALI_PATTERN = re.compile(r'(?:Baksmaling|Smaling smali\w*? folder into) classes(\d*)\.dex')
+_LEVEL_PREFIX = re.compile(r'^[IWSE]: ')
+
+
+class ApktoolProgress:
+	"""把 apktool 的输出行换算为 (步骤说明, 工具内完成比例)"""
+
+	def __init__(self, steps: List[Tuple[str, float]], dex_count: int = 1) -> None:
+		self._steps = [(re.compile(pattern), fraction) for pattern, fraction in steps]
+		self.dex_count = max(1, dex_count)
+		self.fraction = 0.0
+
+	@classmethod
+	def for_command(cls, command: List[str], dex_count: int = 1) -> Optional['ApktoolProgress']:
+		"""按命令选择反编译或回编译的步骤表；不是 apktool 时返回 None"""
+		if '-jar' not in command[:-1]:
+			return None
+		jar_index = command.index('-jar') + 1
+		if not os.path.basename(command[jar_index]).startswith('apktool') or jar_index + 1 >= len(command):
+			return None
+		action = command[jar_index + 1]
+		if action in ('d', 'decode'):
+			return cls(_DECODE_STEPS, dex_count)
+		if action in ('b', 'build'):
+			return cls(_BUILD_STEPS, dex_count)
+		return None
+
+	def feed(self, line: str) -> Optional[Tuple[str, float]]:
+		"""识别出新步骤时返回 (步骤说明, 完成比例)，否则返回 None；比例只增不减"""
+		message = _LEVEL_PREFIX.sub('', line.strip())
+		for index, (pattern, fraction) in enumerate(self._steps):
+			if not pattern.search(message):
+				continue
+			smali = _SMALI_PATTERN.search(message)
+			if smali and index + 1 < len(self._steps):
+				# classes.dex 为第 1 个，classesN.dex 为第 N 个
+				number = int(smali.group(1) or 1)
+				span = self._steps[index + 1][1] - fraction
+				fraction += span * min(number - 1, self.dex_count - 1) / self.dex_count
+			if fraction <= self.fraction:
+				return None
+			self.fraction = fraction
+			return message.rstrip('.'), fraction
+		return None
+
+
+class JobProgress:
+	"""任务的整体进度，callback(百分比, 说明) 在进度增加时调用；可在多个线程中使用"""
+
+	def __init__(self, callback: Optional[Callable[[int, str], None]] = None) -> None:
+		self.callback = callback
+		self.percent = -1  # 尚未报告过
+		self._stage: Optional[str] = None
+		self._lock = threading.Lock()
+
+	def enter(self, stage: str) -> None:
+		"""进入一个阶段（由 JobTrace.stage 调用）"""
+		if stage not in STAGE_PROGRESS:
+			return
+		self._stage = stage
+		self._report(STAGE_PROGRESS[stage][0], stage)
+
+	def update(self, fraction: float, message: str) -> None:
+		"""当前阶段内的完成比例（0-1）"""
+		stage = self._stage
+		if stage is None:
+			return
+		start, end = STAGE_PROGRESS[stage]
+		self._report(start + int((end - start) * min(max(fraction, 0.0), 1.0)), message)
+
+	def _report(self, percent: int, message: str) -> None:
+		with self._lock:
+			if percent <= self.percent:
+				return
+			self.percent = percent
+		if self.callback is not None:
+			self.callback(percent, message)
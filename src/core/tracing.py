@@ -0,0 +1,76 @@
+import functools
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class TraceRecorder:
+	"""把各任务的阶段记录写成 JSON lines，关闭时可导出 Chrome trace（chrome://tracing）
+
+	可被多个线程同时使用；多进程批处理时由主进程汇总各工作进程返回的记录。
+	"""
+
+	def __init__(self, jsonl_path: Optional[str] = None, chrome_trace_path: Optional[str] = None) -> None:
+		self.jsonl_path = jsonl_path
+		self.chrome_trace_path = chrome_trace_path
+		self._records: List[Dict[str, Any]] = []
+		self._lock = threading.Lock()
+		self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+
+	def record(self, span: Dict[str, Any]) -> None:
+		with self._lock:
+			if self.chrome_trace_path:
+				self._records.append(span)
+			if self._jsonl is not None:
+				self._jsonl.write(json.dumps(span, ensure_ascii=False) + '\n')
+				self._jsonl.flush()
+
+	def close(self) -> None:
+		with self._lock:
+			if self._jsonl is not None:
+				self._jsonl.close()
+				self._jsonl = None
+			if self.chrome_trace_path:
+				with open(self.chrome_trace_path, 'w', encoding='utf-8') as f:
+					json.dump({'traceEvents': chrome_trace_events(self._records), 'displayTimeUnit': 'ms'},
+					          f, ensure_ascii=False)
+
+	def __enter__(self) -> 'TraceRecorder':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
+
+def chrome_trace_events(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+	"""阶段记录转换为 Chrome trace 事件：每个任务一行，工具调用嵌套在阶段之下"""
+	events: List[Dict[str, Any]] = []
+	lanes: Dict[Tuple[int, str], int] = {}
+	for span in sorted(records, key=lambda r: r['start']):
+		pid = span.get('pid', 0)
+		lane_key = (pid, span['job_id'])
+		if lane_key not in lanes:
+			lanes[lane_key] = len(lanes) + 1
+			events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': lanes[lane_key],
+			               'args': {'name': os.path.basename(span.get('apk', span['job_id']))}})
+		tid = lanes[lane_key]
+		args = {key: value for key, value in span.items() if key not in ('start', 'tools')}
+		events.append({'name': span['stage'], 'cat': 'stage', 'ph': 'X', 'pid': pid, 'tid': tid,
+		               'ts': int(span['start'] * 1e6), 'dur': int(span['wall_s'] * 1e6), 'args': args})
+		for tool in span.get('tools', []):
+			events.append({'name': tool['tool'], 'cat': 'tool', 'ph': 'X', 'pid': pid, 'tid': tid,
+			               'ts': int(tool['start'] * 1e6), 'dur': int(tool['wall_s'] * 1e6),
+			               'args': {key: value for key, value in tool.items() if key != 'start'}})
+	return events
+
+
+def traced_stage(name: str) -> Callable:
+	"""把引擎方法记录为任务的一个阶段；方法的第一个参数必须是任务上下文"""
+	def decorate(method: Callable) -> Callable:
+		@functools.wraps(method)
+		def wrapper(self, ctx, *args, **kwargs):
+			with ctx.trace.stage(name):
+				return method(self, ctx, *args, **kwargs)
+		return wrapper
+	return decorate
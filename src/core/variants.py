@@ -0,0 +1,135 @@
+"""同一个APK的多个输出变体
+
+    engine = ApkProcessor(ConfigManager())
+    contexts = [engine.create_job(apk, ks1, pass1, 'key0', pass1, variant='store'),
+                engine.create_job(apk, ks2, pass2, 'qa', pass2, variant='qa-debug', debuggable=True)]
+    results = VariantRunner(engine).run(contexts)
+"""
+
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.bundle import is_bundle
+from core.decode_cache import file_sha256
+from core.host_info import cpu_count
+from core.job_context import JobCancelledError, JobContext
+
+
+# 决定未签名APK内容的任务选项；这些选项相同的变体共用一次修改/回编译的结果
+BUILD_OPTIONS = ('binary_patch', 'debuggable', 'zipalign', 'decode_cache', 'decode_mode', 'checkpoints',
+                 'preflight')
+
+
+class _SharedBuild:
+	"""一组变体共用的未签名APK，由第一个需要它的变体生成，其余变体等待并复用"""
+
+	def __init__(self, engine, ctx: JobContext) -> None:
+		self.engine = engine
+		self.ctx = ctx  # 只负责生成未签名APK，不签名也不输出
+		self._lock = threading.Lock()
+		self._started = False
+		self._apk_path: Optional[str] = None
+		self._error: Optional[Exception] = None
+
+	def apk_path(self) -> str:
+		with self._lock:
+			if not self._started:
+				self._started = True
+				try:
+					self.engine._prepare_job(self.ctx)
+					self._apk_path = self.engine._build_unsigned(self.ctx)
+				except Exception as e:
+					self._error = e
+			if self._error is not None:
+				raise self._error
+			return self._apk_path
+
+
+class VariantRunner:
+	"""为同一个APK生成多个输出变体
+
+	按 BUILD_OPTIONS 分组，每组只反编译、修改与回编译一次（结果缓存已命中的变体不触发生成），
+	再把未签名APK复制给组内各变体，用各自的密钥并行签名。每个变体的输出文件名带有 ctx.variant。
+	"""
+
+	def __init__(self, engine, max_workers: Optional[int] = None) -> None:
+		self.engine = engine
+		self.max_workers = max_workers
+		self.build_contexts: List[JobContext] = []  # 最近一次 run() 中生成未签名APK的任务，可读取其耗时记录
+
+	def run(self, contexts: Iterable[JobContext]) -> List[Tuple[bool, str]]:
+		"""执行全部变体并等待完成，结果顺序与输入一致"""
+		contexts = list(contexts)
+		if not contexts:
+			return []
+		self._validate(contexts)
+		engine = self.engine
+
+		# 各变体的结果缓存键与检查点都需要输入哈希，只计算一次
+		apk_sha256 = None
+		if any(ctx.options.result_cache or ctx.options.checkpoints or ctx.options.decode_cache for ctx in contexts):
+			try:
+				apk_sha256 = file_sha256(contexts[0].apk_path)
+			except OSError:
+				pass  # 由各变体的 prepare 阶段报告
+
+		builds: Dict[tuple, _SharedBuild] = {}
+		assignments: List[_SharedBuild] = []
+		for ctx in contexts:
+			ctx.apk_sha256 = ctx.apk_sha256 or apk_sha256
+			key = tuple(getattr(ctx.options, name) for name in BUILD_OPTIONS)
+			if key not in builds:
+				builds[key] = _SharedBuild(engine, self._build_context(ctx))
+			assignments.append(builds[key])
+		self.build_contexts = [build.ctx for build in builds.values()]
+
+		workers = self.max_workers or min(len(contexts), cpu_count())
+		try:
+			with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='variant') as pool:
+				futures = [pool.submit(self._run_variant, ctx, build) for ctx, build in zip(contexts, assignments)]
+				return [future.result() for future in futures]
+		finally:
+			for build in builds.values():
+				engine._end_job(build.ctx)
+
+	@staticmethod
+	def _validate(contexts: List[JobContext]) -> None:
+		apk_paths = {ctx.apk_path for ctx in contexts}
+		if len(apk_paths) > 1:
+			raise ValueError(f"输出变体必须来自同一个APK：{', '.join(sorted(apk_paths))}")
+		if is_bundle(contexts[0].apk_path):
+			raise ValueError("拆分APK安装包不支持输出变体")
+		names = [ctx.variant for ctx in contexts]
+		duplicated = sorted({name or '（默认）' for name in names if names.count(name) > 1})
+		if duplicated:
+			raise ValueError(f"输出变体名重复，输出会互相覆盖：{', '.join(duplicated)}")
+
+	def _build_context(self, ctx: JobContext) -> JobContext:
+		build = JobContext(ctx.apk_path, ctx.signing, ctx.options, logger=ctx.logger, cancel_token=ctx.cancel_token)
+		build.apk_sha256 = ctx.apk_sha256
+		build.trace.recorder = self.engine.trace_recorder
+		return build
+
+	def _run_variant(self, ctx: JobContext, build: _SharedBuild) -> Tuple[bool, str]:
+		engine = self.engine
+		try:
+			engine._prepare_job(ctx)
+			new_apk_path = engine._reuse_result(ctx)
+			if new_apk_path is None:
+				unsigned_path = build.apk_path()
+				ctx.probe = build.ctx.probe
+				ctx.check_cancelled()
+				new_apk_path = engine._intermediate_apk_path(ctx)
+				shutil.copyfile(unsigned_path, new_apk_path)
+				ctx.log(f"已取得同组共用的未签名APK，开始签名变体 {ctx.variant or '（默认）'}")
+				engine._sign_apk(ctx, new_apk_path)
+			engine._finish_job(ctx, new_apk_path)
+			return True, "处理完成"
+		except JobCancelledError:
+			return engine._job_cancelled(ctx)
+		except Exception as e:
+			return engine._job_failed(ctx, e)
+		finally:
+			engine._end_job(ctx)
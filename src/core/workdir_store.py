@@ -0,0 +1,319 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+INDEX_NAME = 'store.json'
+PINS_DIR = '.pins'
+WORK_AREA = 'work'
+STAGING_PATTERN = re.compile(r'^.+\.(\d+)\.[0-9a-f]+\.tmp$')
+LEGACY_WORK_PATTERN = re.compile(r'^.+_work$')
+
+
+def pid_alive(pid: int) -> bool:
+	"""判断进程是否仍在运行"""
+	if pid <= 0:
+		return False
+	if pid == os.getpid():
+		return True
+	if os.name == 'nt':
+		import ctypes
+		PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+		STILL_ACTIVE = 259
+		handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+		if not handle:
+			return False
+		try:
+			code = ctypes.c_ulong()
+			ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+			return code.value == STILL_ACTIVE
+		finally:
+			ctypes.windll.kernel32.CloseHandle(handle)
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True
+	return True
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+	"""跨进程的互斥锁（锁文件 path），用于多个进程共用同一 temp 目录时的索引读改写
+
+	不可重入：同一线程持有期间不能再次获取同一个锁。
+	"""
+	with open(path, 'a+b') as f:
+		if os.name == 'nt':
+			import msvcrt
+			while True:
+				try:
+					f.seek(0)
+					# LK_LOCK 重试约 10 秒后失败，失败时继续等待
+					msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+					break
+				except OSError:
+					continue
+			try:
+				yield
+			finally:
+				f.seek(0)
+				msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+		else:
+			import fcntl
+			fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def directory_size(path: str) -> int:
+	total = 0
+	for dirpath, _, filenames in os.walk(path):
+		for name in filenames:
+			try:
+				total += os.lstat(os.path.join(dirpath, name)).st_size
+			except OSError:
+				pass
+	return total
+
+
+class WorkDirStore:
+	"""temp 目录下工作目录与缓存树的统一管理
+
+	- 工作目录按任务唯一分配，任务期间被占用（pin），结束后删除
+	- 缓存树登记大小与最近使用时间，总量超过预算时按 LRU 淘汰未被占用的条目
+	- 占用标记以 pid 文件形式落盘，进程崩溃后下次启动即可识别并回收遗留目录
+	"""
+
+	_reclaimed_roots = set()
+	_reclaim_lock = threading.Lock()
+
+	def __init__(self, root: str, budget_bytes: int, logger: Optional[Callable[[str], None]] = None) -> None:
+		self.root = os.path.abspath(root)
+		self.budget_bytes = budget_bytes
+		self.logger = logger or print
+		self.index_path = os.path.join(self.root, INDEX_NAME)
+		self.pins_dir = os.path.join(self.root, PINS_DIR)
+		self._lock = threading.RLock()
+		self._pins: Dict[str, int] = {}
+		self._index_lock_depth = 0
+		os.makedirs(os.path.join(self.root, WORK_AREA), exist_ok=True)
+		os.makedirs(self.pins_dir, exist_ok=True)
+
+		with WorkDirStore._reclaim_lock:
+			if self.root not in WorkDirStore._reclaimed_roots:
+				WorkDirStore._reclaimed_roots.add(self.root)
+				self.reclaim_orphans()
+
+	# ---- 条目名与路径 ----
+
+	def path_of(self, name: str) -> str:
+		return os.path.join(self.root, *name.split('/'))
+
+	def name_of(self, path: str) -> str:
+		return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+	def _pin_file(self, name: str) -> str:
+		return os.path.join(self.pins_dir, f"{name.replace('/', '__')}.{os.getpid()}")
+
+	# ---- 占用标记 ----
+
+	def pin(self, name: str) -> None:
+		with self._lock:
+			count = self._pins.get(name, 0)
+			if count == 0:
+				# 与 enforce_budget 的占用检查互斥：写入后其他进程不会再淘汰该条目
+				with self._index_lock():
+					with open(self._pin_file(name), 'w', encoding='utf-8') as f:
+						f.write(str(os.getpid()))
+			self._pins[name] = count + 1
+
+	def unpin(self, name: str) -> None:
+		with self._lock:
+			count = self._pins.get(name, 0) - 1
+			if count > 0:
+				self._pins[name] = count
+				return
+			self._pins.pop(name, None)
+			try:
+				os.remove(self._pin_file(name))
+			except OSError:
+				pass
+
+	def is_pinned(self, name: str) -> bool:
+		if self._pins.get(name):
+			return True
+		prefix = name.replace('/', '__') + '.'
+		for pin_name in os.listdir(self.pins_dir):
+			if pin_name.startswith(prefix) and pin_name[len(prefix):].isdigit():
+				if pid_alive(int(pin_name[len(prefix):])):
+					return True
+		return False
+
+	# ---- 工作目录 ----
+
+	def allocate(self, prefix: str) -> str:
+		"""分配唯一的工作目录并标记占用"""
+		safe_prefix = re.sub(r'[^\w.-]', '_', prefix)[:48] or 'job'
+		name = f'{WORK_AREA}/{safe_prefix}_{uuid.uuid4().hex[:12]}'
+		path = self.path_of(name)
+		self.pin(name)
+		os.makedirs(path)
+		return path
+
+	def release(self, path: str) -> None:
+		"""释放并删除工作目录"""
+		name = self.name_of(path)
+		try:
+			if os.path.exists(path):
+				shutil.rmtree(path)
+		finally:
+			self.unpin(name)
+			self._update_index(lambda index: index.pop(name, None))
+
+	# ---- 缓存条目 ----
+
+	def register(self, name: str, size: Optional[int] = None, **info: Any) -> None:
+		"""登记缓存条目的大小与使用时间，随后检查预算"""
+		if size is None:
+			size = directory_size(self.path_of(name))
+		now = time.time()
+
+		def update(index: Dict[str, Any]) -> None:
+			entry = index.setdefault(name, {'created': now})
+			entry.update(info, size=size, last_used=now)
+		self._update_index(update)
+		self.enforce_budget()
+
+	def touch(self, name: str) -> None:
+		def update(index: Dict[str, Any]) -> None:
+			if name in index:
+				index[name]['last_used'] = time.time()
+		self._update_index(update)
+
+	def total_size(self) -> int:
+		return sum(entry.get('size', 0) for entry in self.entries().values())
+
+	def enforce_budget(self) -> List[str]:
+		"""按最近使用时间淘汰未被占用的条目，直到总大小不超过预算，返回被淘汰的条目
+
+		占用检查与移走条目在跨进程锁内完成，条目先改名为临时目录（其他进程不会再读到它），解锁后再删除。
+		"""
+		evicted = []
+		tombstones = []
+		with self._index_lock():
+			index = self.entries()
+			total = sum(entry.get('size', 0) for entry in index.values())
+			if total <= self.budget_bytes:
+				return evicted
+			for name, entry in sorted(index.items(), key=lambda item: item[1].get('last_used', 0)):
+				if total <= self.budget_bytes:
+					break
+				if self.is_pinned(name):
+					continue
+				path = self.path_of(name)
+				if os.path.exists(path):
+					tombstone = f'{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp'
+					try:
+						os.rename(path, tombstone)
+					except OSError:
+						# 仍被打开（Windows）等原因无法移走时保留
+						continue
+					tombstones.append(tombstone)
+				total -= entry.get('size', 0)
+				evicted.append(name)
+			if evicted:
+				self._update_index(lambda data: [data.pop(name, None) for name in evicted])
+		for tombstone in tombstones:
+			shutil.rmtree(tombstone, ignore_errors=True)
+		if evicted:
+			self.logger(f"临时目录超出预算，已淘汰 {len(evicted)} 个缓存条目")
+		return evicted
+
+	# ---- 崩溃回收 ----
+
+	def reclaim_orphans(self) -> None:
+		"""回收崩溃或异常退出后遗留的目录与占用标记"""
+		reclaimed = 0
+		for pin_name in os.listdir(self.pins_dir):
+			_, _, pid = pin_name.rpartition('.')
+			if not pid.isdigit() or not pid_alive(int(pid)):
+				try:
+					os.remove(os.path.join(self.pins_dir, pin_name))
+				except OSError:
+					pass
+
+		work_root = os.path.join(self.root, WORK_AREA)
+		for entry in os.listdir(work_root):
+			name = f'{WORK_AREA}/{entry}'
+			if not self.is_pinned(name):
+				shutil.rmtree(os.path.join(work_root, entry), ignore_errors=True)
+				reclaimed += 1
+
+		for area in os.listdir(self.root):
+			area_path = os.path.join(self.root, area)
+			if not os.path.isdir(area_path) or area in (WORK_AREA, PINS_DIR):
+				continue
+			if LEGACY_WORK_PATTERN.match(area):
+				# 旧版本按APK文件名创建的工作目录
+				shutil.rmtree(area_path, ignore_errors=True)
+				reclaimed += 1
+				continue
+			for entry in os.listdir(area_path):
+				match = STAGING_PATTERN.match(entry)
+				if match and not pid_alive(int(match.group(1))):
+					shutil.rmtree(os.path.join(area_path, entry), ignore_errors=True)
+					reclaimed += 1
+
+		index = self.entries()
+		missing = [name for name in index if not os.path.exists(self.path_of(name))]
+		if missing:
+			self._update_index(lambda data: [data.pop(name, None) for name in missing])
+		if reclaimed:
+			self.logger(f"已回收 {reclaimed} 个遗留的临时目录")
+
+	# ---- 索引 ----
+
+	def entries(self) -> Dict[str, Dict[str, Any]]:
+		try:
+			with open(self.index_path, 'r', encoding='utf-8') as f:
+				return json.load(f) or {}
+		except (OSError, ValueError):
+			return {}
+
+	@contextmanager
+	def _index_lock(self) -> Iterator[None]:
+		"""锁住索引与占用标记；CLI 的多个工作进程共用同一 temp 目录，因此同时持有跨进程的文件锁
+
+		同一线程可以嵌套获取，只有最外层获取文件锁。
+		"""
+		with self._lock:
+			outer = self._index_lock_depth == 0
+			with file_lock(f'{self.index_path}.lock') if outer else nullcontext():
+				self._index_lock_depth += 1
+				try:
+					yield
+				finally:
+					self._index_lock_depth -= 1
+
+	def _update_index(self, update: Callable[[Dict[str, Any]], Any]) -> None:
+		"""读改写索引"""
+		with self._index_lock():
+			index = self.entries()
+			update(index)
+			temp_path = f'{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+			try:
+				with open(temp_path, 'w', encoding='utf-8') as f:
+					json.dump(index, f, ensure_ascii=False, indent=4)
+				os.replace(temp_path, self.index_path)
+			except OSError as e:
+				self.logger(f"更新临时目录索引失败: {str(e)}")
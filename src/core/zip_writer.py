@@ -0,0 +1,201 @@
+import os
+import re
+import struct
+import zlib
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+
+LOCAL_HEADER_SIGNATURE = 0x04034B50
+CENTRAL_HEADER_SIGNATURE = 0x02014B50
+END_OF_CENTRAL_DIR_SIGNATURE = 0x06054B50
+ZIP64_LOCATOR_SIGNATURE = 0x07064B50
+
+LOCAL_HEADER_SIZE = 30
+CENTRAL_HEADER_SIZE = 46
+END_OF_CENTRAL_DIR_SIZE = 22
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+FLAG_DATA_DESCRIPTOR = 0x0008
+
+# 新增条目使用的DOS时间戳（1981-01-01 01:01:02），保证输出可重现
+ADDED_ENTRY_TIME = 0x0821
+ADDED_ENTRY_DATE = 0x0221
+
+# 与 apksigner/zipalign 相同的对齐扩展字段ID
+ALIGNMENT_EXTRA_ID = 0xD935
+DEFAULT_ALIGNMENT = 4
+PAGE_ALIGNMENT = 16384
+NATIVE_LIBRARY_PATTERN = re.compile(r'^lib/.+\.so$')
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ZipRewriteError(Exception):
+	"""ZIP结构无法识别或超出支持范围时抛出"""
+
+
+class ZipEntry:
+	"""中央目录中的一条记录"""
+
+	def __init__(self, header: bytes, name: bytes, extra: bytes, comment: bytes) -> None:
+		(_, self.version_made, self.version_needed, self.flags, self.method, self.mod_time, self.mod_date,
+		 self.crc, self.compressed_size, self.uncompressed_size, _, _, _, self.disk_start,
+		 self.internal_attr, self.external_attr, self.local_offset) = struct.unpack('<IHHHHHHIIIHHHHHII', header)
+		self.raw_name = name
+		self.extra = extra
+		self.comment = comment
+
+	@classmethod
+	def new(cls, name: str, method: int = METHOD_DEFLATED) -> 'ZipEntry':
+		raw_name = name.encode('utf-8')
+		flags = 0 if raw_name.isascii() else 0x0800
+		header = struct.pack('<IHHHHHHIIIHHHHHII', CENTRAL_HEADER_SIGNATURE, 20, 20, flags, method,
+		                     ADDED_ENTRY_TIME, ADDED_ENTRY_DATE, 0, 0, 0, len(raw_name), 0, 0, 0, 0, 0, 0)
+		return cls(header, raw_name, b'', b'')
+
+	@property
+	def name(self) -> str:
+		encoding = 'utf-8' if self.flags & 0x0800 else 'cp437'
+		return self.raw_name.decode(encoding, errors='replace')
+
+
+def read_central_directory(f: BinaryIO) -> List[ZipEntry]:
+	f.seek(0, os.SEEK_END)
+	file_size = f.tell()
+	tail_size = min(file_size, END_OF_CENTRAL_DIR_SIZE + 0xFFFF)
+	f.seek(file_size - tail_size)
+	tail = f.read(tail_size)
+	eocd = tail.rfind(struct.pack('<I', END_OF_CENTRAL_DIR_SIGNATURE))
+	if eocd < 0:
+		raise ZipRewriteError("找不到ZIP中央目录结尾记录")
+	if eocd >= 20 and struct.unpack_from('<I', tail, eocd - 20)[0] == ZIP64_LOCATOR_SIGNATURE:
+		raise ZipRewriteError("暂不支持ZIP64格式的APK")
+	_, _, _, _, count, cd_size, cd_offset, _ = struct.unpack_from('<IHHHHIIH', tail, eocd)
+
+	f.seek(cd_offset)
+	directory = f.read(cd_size)
+	entries = []
+	pos = 0
+	for _ in range(count):
+		header = directory[pos:pos + CENTRAL_HEADER_SIZE]
+		if len(header) < CENTRAL_HEADER_SIZE or struct.unpack_from('<I', header)[0] != CENTRAL_HEADER_SIGNATURE:
+			raise ZipRewriteError(f"中央目录记录损坏：偏移 {cd_offset + pos}")
+		name_len, extra_len, comment_len = struct.unpack_from('<HHH', header, 28)
+		pos += CENTRAL_HEADER_SIZE
+		name = directory[pos:pos + name_len]
+		extra = directory[pos + name_len:pos + name_len + extra_len]
+		comment = directory[pos + name_len + extra_len:pos + name_len + extra_len + comment_len]
+		pos += name_len + extra_len + comment_len
+		entries.append(ZipEntry(header, name, extra, comment))
+	return entries
+
+
+def entry_alignment(entry_name: str, method: int, alignment: int, page_align_libraries: bool = True) -> int:
+	"""返回条目数据需要的对齐字节数，压缩条目不需要对齐"""
+	if method != METHOD_STORED or not alignment:
+		return 0
+	if page_align_libraries and NATIVE_LIBRARY_PATTERN.match(entry_name):
+		return PAGE_ALIGNMENT
+	return alignment
+
+
+def _alignment_extra(offset: int, name_len: int, alignment: int) -> bytes:
+	if not alignment:
+		return b''
+	data_start = offset + LOCAL_HEADER_SIZE + name_len + 6
+	padding = (alignment - data_start % alignment) % alignment
+	return struct.pack('<HHH', ALIGNMENT_EXTRA_ID, 2 + padding, alignment) + b'\x00' * padding
+
+
+def _data_offset(f: BinaryIO, entry: ZipEntry) -> int:
+	f.seek(entry.local_offset)
+	local = f.read(LOCAL_HEADER_SIZE)
+	if len(local) < LOCAL_HEADER_SIZE or struct.unpack_from('<I', local)[0] != LOCAL_HEADER_SIGNATURE:
+		raise ZipRewriteError(f"本地文件头损坏：{entry.name}")
+	name_len, extra_len = struct.unpack_from('<HH', local, 26)
+	return entry.local_offset + LOCAL_HEADER_SIZE + name_len + extra_len
+
+
+def _compress(data: bytes, method: int) -> bytes:
+	if method == METHOD_STORED:
+		return data
+	if method != METHOD_DEFLATED:
+		raise ZipRewriteError(f"不支持的压缩方式：{method}")
+	compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+	return compressor.compress(data) + compressor.flush()
+
+
+def rewrite_zip(source_path: str, output_path: str, replacements: Optional[Dict[str, bytes]] = None,
+                alignment: int = DEFAULT_ALIGNMENT, page_align_libraries: bool = True,
+                drop: Optional[Callable[[str], bool]] = None,
+                additions: Optional[Dict[str, bytes]] = None) -> None:
+	"""单次顺序读写重建ZIP
+
+	未修改条目的压缩数据原样拷贝（不解压/不重新压缩），replacements 中的条目
+	按原压缩方式写入，additions 中的条目以 deflate 方式追加在末尾，
+	写入过程中直接完成 zipalign 等价的对齐。alignment 为 0 时不做对齐。
+	"""
+	replacements = dict(replacements or {})
+	with open(source_path, 'rb') as src, open(output_path, 'wb') as dst:
+		entries = [entry for entry in read_central_directory(src) if drop is None or not drop(entry.name)]
+		for name, data in (additions or {}).items():
+			entries.append(ZipEntry.new(name))
+			replacements[name] = data
+		central = bytearray()
+		written = 0
+		count = 0
+		for entry in entries:
+			name = entry.name
+			replacement = replacements.get(name)
+			if replacement is not None:
+				payload = _compress(replacement, entry.method)
+				crc = zlib.crc32(replacement) & 0xFFFFFFFF
+				compressed_size = len(payload)
+				uncompressed_size = len(replacement)
+			else:
+				payload = None
+				crc = entry.crc
+				compressed_size = entry.compressed_size
+				uncompressed_size = entry.uncompressed_size
+
+			if written + compressed_size > 0xFFFFFFFF:
+				raise ZipRewriteError("输出超出ZIP格式限制，暂不支持ZIP64")
+			flags = entry.flags & ~FLAG_DATA_DESCRIPTOR
+			extra = _alignment_extra(written, len(entry.raw_name),
+			                         entry_alignment(name, entry.method, alignment, page_align_libraries))
+			header = struct.pack('<IHHHHHIIIHH', LOCAL_HEADER_SIGNATURE, entry.version_needed, flags,
+			                     entry.method, entry.mod_time, entry.mod_date, crc, compressed_size,
+			                     uncompressed_size, len(entry.raw_name), len(extra))
+			local_offset = written
+			dst.write(header)
+			dst.write(entry.raw_name)
+			dst.write(extra)
+			written += len(header) + len(entry.raw_name) + len(extra)
+
+			if payload is not None:
+				dst.write(payload)
+			else:
+				src.seek(_data_offset(src, entry))
+				remaining = compressed_size
+				while remaining:
+					chunk = src.read(min(COPY_BUFFER_SIZE, remaining))
+					if not chunk:
+						raise ZipRewriteError(f"条目数据不完整：{name}")
+					dst.write(chunk)
+					remaining -= len(chunk)
+			written += compressed_size
+
+			central += struct.pack('<IHHHHHHIIIHHHHHII', CENTRAL_HEADER_SIGNATURE, entry.version_made,
+			                       entry.version_needed, flags, entry.method, entry.mod_time, entry.mod_date,
+			                       crc, compressed_size, uncompressed_size, len(entry.raw_name),
+			                       len(entry.extra), len(entry.comment), 0, entry.internal_attr,
+			                       entry.external_attr, local_offset)
+			central += entry.raw_name + entry.extra + entry.comment
+			count += 1
+
+		if count > 0xFFFF:
+			raise ZipRewriteError("输出超出ZIP格式限制，暂不支持ZIP64")
+		dst.write(central)
+		dst.write(struct.pack('<IHHHHIIH', END_OF_CENTRAL_DIR_SIGNATURE, 0, 0, count, count,
+		                      len(central), written, 0))
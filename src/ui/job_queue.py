@@ -0,0 +1,443 @@
+from functools import partial
+import os
+import re
+import time
+
+from PyQt6.QtWidgets import (QTableWidget, QTableWidgetItem, QProgressBar, QHeaderView,
+                               QAbstractItemView, QMenu)
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, QUrl, pyqtSignal
+from PyQt6.QtGui import QDesktopServices
+from core.job_context import CancellationToken, output_tag
+from core.log_buffer import LogBuffer
+
+# 任务状态
+STATUS_PENDING = "待处理"
+STATUS_QUEUED = "排队中"
+STATUS_RUNNING = "处理中"
+STATUS_CANCELLING = "正在取消"
+STATUS_SUCCEEDED = "成功"
+STATUS_FAILED = "失败"
+STATUS_CANCELLED = "已取消"
+
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING, STATUS_CANCELLING)
+DONE_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+
+class ProcessThread(QThread):
+    """在后台线程中处理一个APK"""
+    percent_signal = pyqtSignal(int, str)
+
+    def __init__(self, processor, apk_path, cert_path, cert_password, key_alias, key_password, use_decode_cache,
+                 logger, output_tag=None):
+        super().__init__()
+        self.apk_path = apk_path
+        self.output_tag = output_tag
+        self.cert_path = cert_path
+        self.cert_password = cert_password
+        self.key_alias = key_alias
+        self.key_password = key_password
+        self.use_decode_cache = use_decode_cache
+        self.processor = processor
+        self.logger = logger
+        self.cancel_token = CancellationToken()
+        self.is_cancelled = False
+        self.result = (False, "未开始")
+        self.output_path = None
+
+    def run(self):
+        try:
+            ctx = self.processor.create_job(
+                self.apk_path,
+                self.cert_path,
+                self.cert_password,
+                self.key_alias,
+                self.key_password,
+                use_decode_cache=self.use_decode_cache,
+                logger=self.log_message,
+                cancel_token=self.cancel_token,
+                progress=self.report_percent,
+                output_tag=self.output_tag
+            )
+            self.result = self.processor.run_job(ctx)
+            self.output_path = ctx.output_path
+        except Exception as e:
+            self.result = (False, str(e))
+
+    def cancel(self):
+        """取消处理"""
+        self.is_cancelled = True
+        # 正在运行的外部工具（含其子进程）立即被结束，任务随即停止并清理工作目录
+        self.cancel_token.cancel()
+
+    def log_message(self, message):
+        """日志回调：只写入日志缓冲，由界面线程定时按批显示，不逐行发送信号"""
+        if not self.is_cancelled:
+            self.logger(message)
+
+    def report_percent(self, percent, message):
+        """整体进度回调（0-100），由工作线程调用"""
+        if not self.is_cancelled:
+            self.percent_signal.emit(percent, message)
+
+
+class PrewarmThread(QThread):
+    """选择APK后在后台预先完成预检与反编译（ApkProcessor.prewarm），选择改变时取消"""
+    result_signal = pyqtSignal(str)
+
+    def __init__(self, processor, apk_path, use_decode_cache):
+        super().__init__()
+        self.processor = processor
+        self.apk_path = apk_path
+        self.use_decode_cache = use_decode_cache
+        self.cancel_token = CancellationToken()
+        self.is_cancelled = False
+
+    def run(self):
+        try:
+            probe = self.processor.prewarm(self.apk_path, use_decode_cache=self.use_decode_cache,
+                                           cancel_token=self.cancel_token)
+        except Exception as e:
+            if not self.is_cancelled:
+                self.result_signal.emit(f"后台预处理失败（不影响处理）：{str(e)}")
+            return
+        if not self.is_cancelled and probe is not None:
+            self.result_signal.emit(f"后台预处理完成：{probe.describe()}")
+
+    def cancel(self):
+        """取消预处理，正在运行的 apktool 立即被结束"""
+        self.is_cancelled = True
+        self.cancel_token.cancel()
+
+
+class QueueJob:
+    """队列中的一个APK任务：状态、进度、用时、输出路径与单独的日志文件"""
+
+    def __init__(self, job_id, apk_path, log_path):
+        self.job_id = job_id
+        self.apk_path = apk_path
+        self.status = STATUS_PENDING
+        self.percent = 0
+        self.step = ""
+        self.message = ""
+        self.signing = None  # 提交时的证书信息快照，之后修改界面中的证书不影响已提交的任务
+        self.output_tag = None  # 队列中有来自其他目录的同名APK时加在输出文件名后
+        self.batch = 0
+        self.log = LogBuffer(log_path)
+        self.thread = None
+        self.output_path = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.apk_path)
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    def elapsed(self):
+        """已用时间（秒），尚未开始时为 None"""
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobQueue(QObject):
+    """APK任务队列：提交的任务在最多 max_workers 个线程中并发处理
+
+    每个任务的日志写入 log_dir 下单独的文件，同时以 "[文件名] " 为前缀交给 session_log（主日志面板）。
+    """
+    job_added = pyqtSignal(object)
+    job_changed = pyqtSignal(object)
+    job_removed = pyqtSignal(object)
+    job_finished = pyqtSignal(object)
+
+    REFRESH_INTERVAL_MS = 500
+
+    def __init__(self, processor_factory, log_dir, session_log, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.processor_factory = processor_factory
+        self.log_dir = log_dir
+        self.session_log = session_log
+        self.max_workers = max(1, int(max_workers))
+        self.jobs = []
+        self.batch = 0
+        self._next_id = 1
+
+        # 定时把各任务的日志写入文件，并刷新处理中任务的用时
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.REFRESH_INTERVAL_MS)
+        self._timer.timeout.connect(self._refresh)
+        self._timer.start()
+
+    def add(self, apk_path):
+        """加入一个待处理的APK；已在待处理中的同一文件不重复加入"""
+        apk_path = os.path.abspath(apk_path)
+        for job in self.jobs:
+            if job.status == STATUS_PENDING and job.apk_path == apk_path:
+                return job
+        job_id = self._next_id
+        self._next_id += 1
+        stem = re.sub(r'[^\w.-]+', '_', os.path.splitext(os.path.basename(apk_path))[0])
+        log_path = os.path.join(self.log_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{job_id}-{stem}.log")
+        job = QueueJob(job_id, apk_path, log_path)
+        # 与队列中其他目录的同名APK区分输出文件，不互相覆盖
+        if any(other.name == job.name and other.apk_path != apk_path for other in self.jobs):
+            job.output_tag = output_tag(apk_path)
+        self.jobs.append(job)
+        self.job_added.emit(job)
+        return job
+
+    def pending_jobs(self):
+        return [job for job in self.jobs if job.status == STATUS_PENDING]
+
+    def has_active(self):
+        return any(job.active for job in self.jobs)
+
+    def batch_jobs(self):
+        """最近一批提交的任务"""
+        return [job for job in self.jobs if job.batch == self.batch and job.status != STATUS_PENDING]
+
+    def submit(self, cert_path, cert_password, key_alias, key_password, use_decode_cache):
+        """用给定的证书信息提交全部待处理的任务，返回提交的任务"""
+        jobs = self.pending_jobs()
+        if not jobs:
+            return []
+        if not self.has_active():
+            self.batch += 1
+        signing = dict(cert_path=cert_path, cert_password=cert_password, key_alias=key_alias,
+                       key_password=key_password, use_decode_cache=use_decode_cache)
+        for job in jobs:
+            job.signing = signing
+            job.batch = self.batch
+            job.status = STATUS_QUEUED
+            job.step = ""
+            self.job_changed.emit(job)
+        self._schedule()
+        return jobs
+
+    def set_max_workers(self, max_workers):
+        self.max_workers = max(1, int(max_workers))
+        self._schedule()
+
+    def _schedule(self):
+        """在并发数允许时依次启动排队中的任务"""
+        running = sum(1 for job in self.jobs if job.thread is not None)
+        for job in self.jobs:
+            if running >= self.max_workers:
+                break
+            if job.status == STATUS_QUEUED:
+                self._start(job)
+                running += 1
+
+    def _start(self, job):
+        job.thread = ProcessThread(self.processor_factory(), job.apk_path, logger=partial(self._log, job),
+                                   output_tag=job.output_tag, **job.signing)
+        job.thread.percent_signal.connect(partial(self._on_percent, job))
+        job.thread.finished.connect(partial(self._on_thread_finished, job))
+        job.status = STATUS_RUNNING
+        job.started_at = time.time()
+        self.job_changed.emit(job)
+        job.thread.start()
+
+    def _log(self, job, message):
+        """任务日志回调，在工作线程中调用"""
+        job.log.append(message)
+        self.session_log(f"[{job.name}] {message}")
+
+    def _on_percent(self, job, percent, message):
+        if job.status != STATUS_RUNNING:
+            return
+        job.percent = percent
+        job.step = message
+        self.job_changed.emit(job)
+
+    def _on_thread_finished(self, job):
+        thread = job.thread
+        job.thread = None
+        job.finished_at = time.time()
+        if thread.is_cancelled:
+            job.status = STATUS_CANCELLED
+            job.message = "处理已取消"
+        else:
+            success, job.message = thread.result
+            job.status = STATUS_SUCCEEDED if success else STATUS_FAILED
+            job.output_path = thread.output_path if success else None
+            if success:
+                job.percent = 100
+        job.log.append(f"处理{job.status}：{job.message}")
+        job.log.drain()
+        self.job_changed.emit(job)
+        self.job_finished.emit(job)
+        self._schedule()
+
+    def cancel(self, job):
+        """取消一个任务：未开始的直接标记为已取消，处理中的结束其工具进程，线程退出后标记"""
+        if job.thread is not None:
+            if not job.thread.is_cancelled:
+                job.thread.cancel()
+                job.status = STATUS_CANCELLING
+                self.job_changed.emit(job)
+        elif job.status in (STATUS_PENDING, STATUS_QUEUED):
+            job.status = STATUS_CANCELLED
+            job.message = "处理已取消"
+            self.job_changed.emit(job)
+            self.job_finished.emit(job)
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            if job.active:
+                self.cancel(job)
+
+    def remove(self, job):
+        """从队列中移除未在处理的任务"""
+        if job.active or job not in self.jobs:
+            return
+        self.jobs.remove(job)
+        job.log.close()
+        self.job_removed.emit(job)
+
+    def remove_finished(self):
+        for job in list(self.jobs):
+            if job.status in DONE_STATUSES:
+                self.remove(job)
+
+    def _refresh(self):
+        for job in self.jobs:
+            job.log.drain()
+            if job.thread is not None:
+                self.job_changed.emit(job)
+
+    def shutdown(self):
+        """取消全部任务并等待处理线程退出"""
+        self._timer.stop()
+        for job in self.jobs:
+            if job.thread is not None:
+                job.thread.cancel()
+        for job in self.jobs:
+            if job.thread is not None:
+                job.thread.wait()
+            job.log.close()
+
+
+class JobQueueView(QTableWidget):
+    """任务队列列表：文件、状态、进度、用时与输出路径；右键菜单可打开日志或输出、取消与移除任务"""
+
+    COLUMNS = ["文件", "状态", "进度", "用时", "输出"]
+
+    def __init__(self, queue, parent=None):
+        super().__init__(0, len(self.COLUMNS), parent)
+        self.queue = queue
+        self._rows = {}
+        self.setHorizontalHeaderLabels(self.COLUMNS)
+        self.verticalHeader().setVisible(False)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for column in (1, 2, 3):
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+        self.cellDoubleClicked.connect(self.on_double_clicked)
+
+        queue.job_added.connect(self.add_job)
+        queue.job_changed.connect(self.update_job)
+        queue.job_removed.connect(self.remove_job)
+
+    def add_job(self, job):
+        row = self.rowCount()
+        self.insertRow(row)
+        self._rows[job.job_id] = row
+        for column in (0, 1, 3, 4):
+            self.setItem(row, column, QTableWidgetItem())
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 100)
+        progress_bar.setTextVisible(True)
+        self.setCellWidget(row, 2, progress_bar)
+        self.update_job(job)
+
+    def update_job(self, job):
+        row = self._rows.get(job.job_id)
+        if row is None:
+            return
+        self.item(row, 0).setText(job.name)
+        self.item(row, 0).setToolTip(job.apk_path)
+        self.item(row, 1).setText(job.status)
+        self.item(row, 1).setToolTip(job.message if job.status in DONE_STATUSES else job.step)
+        progress_bar = self.cellWidget(row, 2)
+        progress_bar.setValue(job.percent)
+        progress_bar.setToolTip(f"{job.percent}%  {job.step}")
+        elapsed = job.elapsed()
+        self.item(row, 3).setText("" if elapsed is None else f"{elapsed:.1f}s")
+        self.item(row, 4).setText(job.output_path or "")
+        self.item(row, 4).setToolTip(job.output_path or "")
+
+    def remove_job(self, job):
+        row = self._rows.pop(job.job_id, None)
+        if row is None:
+            return
+        self.removeRow(row)
+        for job_id, other in self._rows.items():
+            if other > row:
+                self._rows[job_id] = other - 1
+
+    def job_at(self, row):
+        for job in self.queue.jobs:
+            if self._rows.get(job.job_id) == row:
+                return job
+        return None
+
+    def selected_jobs(self):
+        rows = sorted({index.row() for index in self.selectedIndexes()})
+        return [job for job in (self.job_at(row) for row in rows) if job is not None]
+
+    def show_context_menu(self, pos):
+        job = self.job_at(self.rowAt(pos.y()))
+        if job is None:
+            return
+        jobs = self.selected_jobs() or [job]
+        menu = QMenu(self)
+        open_log = menu.addAction("打开日志")
+        open_output = menu.addAction("打开输出目录")
+        open_output.setEnabled(bool(job.output_path))
+        menu.addSeparator()
+        cancel = menu.addAction("取消")
+        cancel.setEnabled(any(j.active or j.status == STATUS_PENDING for j in jobs))
+        remove = menu.addAction("移除")
+        remove.setEnabled(any(not j.active for j in jobs))
+        remove_finished = menu.addAction("移除已完成的任务")
+        action = menu.exec(self.viewport().mapToGlobal(pos))
+        if action == open_log:
+            self.open_log(job)
+        elif action == open_output:
+            self.open_output(job)
+        elif action == cancel:
+            for j in jobs:
+                self.queue.cancel(j)
+        elif action == remove:
+            for j in jobs:
+                self.queue.remove(j)
+        elif action == remove_finished:
+            self.queue.remove_finished()
+
+    def on_double_clicked(self, row, column):
+        """双击已成功的任务打开输出目录，其他任务打开日志"""
+        job = self.job_at(row)
+        if job is None:
+            return
+        if job.output_path:
+            self.open_output(job)
+        else:
+            self.open_log(job)
+
+    def open_log(self, job):
+        job.log.drain()
+        if job.log.log_path and os.path.exists(job.log.log_path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(job.log.log_path)))
+
+    def open_output(self, job):
+        if job.output_path and os.path.exists(job.output_path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(os.path.abspath(job.output_path))))
@@ -0,0 +1,62 @@
+from PyQt6.QtWidgets import QPlainTextEdit
+from PyQt6.QtCore import QTimer
+
+
+class LogView(QPlainTextEdit):
+    """日志面板：最多显示 max_lines 行，由定时器按批从 LogBuffer 取出显示，完整日志在日志文件中"""
+
+    FLUSH_INTERVAL_MS = 100
+
+    def __init__(self, buffer, max_lines=5000, parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.max_lines = max(1, int(max_lines))
+        self.collapsed = False
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        # 超过上限时自动丢弃最早的行
+        self.setMaximumBlockCount(self.max_lines)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def append(self, message):
+        """追加日志，可在任意线程调用，最迟在下一次定时刷新时显示"""
+        self.buffer.append(message)
+
+    def flush(self):
+        """把缓冲中的日志一次性追加到面板"""
+        lines = self.buffer.drain()
+        if not lines:
+            return
+        scroll_bar = self.verticalScrollBar()
+        # 展开状态下用户向上翻看时不跳到末尾
+        follow = self.collapsed or scroll_bar is None or scroll_bar.value() >= scroll_bar.maximum() - 1
+        self.appendPlainText("\n".join(lines[-self.max_lines:]))
+        if follow:
+            self.scroll_to_end()
+
+    def scroll_to_end(self):
+        scroll_bar = self.verticalScrollBar()
+        if scroll_bar:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def set_collapsed(self, collapsed):
+        """收起时只显示最后一行"""
+        self.collapsed = collapsed
+        mode = QPlainTextEdit.LineWrapMode.NoWrap if collapsed else QPlainTextEdit.LineWrapMode.WidgetWidth
+        self.setLineWrapMode(mode)
+        self.scroll_to_end()
+
+    def clear(self):
+        """清空面板，尚未显示的日志先写入日志文件"""
+        self.buffer.drain()
+        super().clear()
+
+    def shutdown(self):
+        """停止刷新并关闭日志文件"""
+        self._timer.stop()
+        self.flush()
+        self.buffer.close()
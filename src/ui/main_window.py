@@ -2,13 +2,18 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QPushButton, QLineEdit, 
                                QProgressBar, QTextEdit, QComboBox,
                                QFileDialog, QMenuBar, QMenu, QLabel, QCheckBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QUrl, QTimer
-from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QAction, QIcon
+from PyQt6.QtCore import Qt, QUrl, QTimer
+from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QAction, QActionGroup, QIcon
 from core.apk_processor import ApkProcessor
+from core.bundle import BUNDLE_EXTENSIONS
 from core.config_manager import ConfigManager
 from core.keystore_reader import KeystoreReader
+from core.log_buffer import LogBuffer, prune_logs, session_log_path
 from core.user_state_manager import UserStateManager
+from ui.job_queue import JobQueue, JobQueueView, PrewarmThread, STATUS_SUCCEEDED
+from ui.log_view import LogView
 from PyQt6.QtGui import QDesktopServices
+from functools import partial
 import os
 import json
 
@@ -50,53 +55,6 @@ class PasswordLineEdit(QLineEdit):
         self.toggle_button.move(self.width() - self.toggle_button.width() - padding,
                               (self.height() - self.toggle_button.height()) // 2)
 
-class ProcessThread(QThread):
-    progress_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal(bool, str)
-
-    def __init__(self, config_manager, apk_path, cert_path, cert_password, key_alias, key_password, skip_decompile):
-        super().__init__()
-        self.apk_path = apk_path
-        self.cert_path = cert_path
-        self.cert_password = cert_password
-        self.key_alias = key_alias
-        self.key_password = key_password
-        self.skip_decompile = skip_decompile
-        self.processor = ApkProcessor(config_manager, logger=self.log_message)
-        self.is_cancelled = False
-
-    def run(self):
-        try:
-            success, message = self.processor.process_apk(
-                self.apk_path,
-                self.cert_path,
-                self.cert_password,
-                self.key_alias,
-                self.key_password,
-                skip_decompile=self.skip_decompile
-            )
-            if not self.is_cancelled:
-                self.finished_signal.emit(success, message)
-        except Exception as e:
-            if not self.is_cancelled:
-                self.finished_signal.emit(False, str(e))
-
-    def progress_callback(self, message):
-        if not self.is_cancelled:
-            self.progress_signal.emit(message)
-
-    def cancel(self):
-        """取消处理"""
-        self.is_cancelled = True
-        if hasattr(self, 'processor'):
-            # 确保清理临时文件
-            self.processor.cleanup()
-
-    def log_message(self, message):
-        """Logger callback that emits the progress signal"""
-        if not self.is_cancelled:
-            self.progress_signal.emit(str(message))
-
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -112,6 +70,11 @@ class MainWindow(QMainWindow):
         self.current_cert_path = ""
         self.keystore_reader = KeystoreReader()
         self.user_state = UserStateManager()
+        # 处理引擎在多次处理之间复用，常驻JVM进程得以保持预热；队列中的任务共用同一个引擎
+        self.processor = None
+        # 选择APK后开始的后台预处理（预检与反编译），选择改变时取消；已提交处理的不再随选择取消
+        self.prewarm_thread = None
+        self.prewarm_threads = []
         
         # 创建菜单栏
         self.create_menu_bar()
@@ -149,12 +112,42 @@ class MainWindow(QMainWindow):
         self.debuggable_action.triggered.connect(self.toggle_debuggable)
         options_menu.addAction(self.debuggable_action)
 
-        # 添加跳过反编译选项
-        self.skip_decompile_action = QAction('跳过反编译', self)
-        self.skip_decompile_action.setCheckable(True)
-        self.skip_decompile_action.setChecked(self.config_manager.get_value('skip_decompile_enabled', False) or False)
-        self.skip_decompile_action.triggered.connect(self.toggle_skip_decompile)
-        options_menu.addAction(self.skip_decompile_action)
+        # 添加反编译缓存选项
+        self.decode_cache_action = QAction('使用反编译缓存', self)
+        self.decode_cache_action.setCheckable(True)
+        self.decode_cache_action.setChecked(self.config_manager.get_value('decode_cache_enabled', True) or False)
+        self.decode_cache_action.triggered.connect(self.toggle_decode_cache)
+        options_menu.addAction(self.decode_cache_action)
+
+        # 选择APK后在后台预先预检与反编译
+        self.prewarm_action = QAction('选择APK后预先处理', self)
+        self.prewarm_action.setCheckable(True)
+        self.prewarm_action.setChecked(self.config_manager.get_value('prewarm_enabled', True) or False)
+        self.prewarm_action.triggered.connect(self.toggle_prewarm)
+        options_menu.addAction(self.prewarm_action)
+
+        # 同时处理的任务数
+        workers_menu = options_menu.addMenu('并发任务数')
+        self.workers_group = QActionGroup(self)
+        max_workers = self.config_manager.get_value('gui_max_workers', 2) or 2
+        for count in range(1, 5):
+            action = QAction(str(count), self)
+            action.setCheckable(True)
+            action.setChecked(count == max_workers)
+            action.triggered.connect(lambda checked, count=count: self.set_max_workers(count))
+            self.workers_group.addAction(action)
+            workers_menu.addAction(action)
+
+    def set_max_workers(self, count):
+        self.config_manager.set_value('gui_max_workers', count)
+        if hasattr(self, 'job_queue'):
+            self.job_queue.set_max_workers(count)
+
+    def toggle_prewarm(self):
+        enabled = self.prewarm_action.isChecked()
+        self.config_manager.set_value('prewarm_enabled', enabled)
+        if not enabled:
+            self.cancel_prewarm()
 
     def toggle_zipalign(self):
         enabled = self.zipalign_action.isChecked()
@@ -164,25 +157,34 @@ class MainWindow(QMainWindow):
         enabled = self.debuggable_action.isChecked()
         self.config_manager.set_value('debuggable_enabled', enabled)
 
-    def toggle_skip_decompile(self):
-        enabled = self.skip_decompile_action.isChecked()
-        self.config_manager.set_value('skip_decompile_enabled', enabled)
+    def toggle_decode_cache(self):
+        enabled = self.decode_cache_action.isChecked()
+        self.config_manager.set_value('decode_cache_enabled', enabled)
         # 同步到复选框
-        if hasattr(self, 'skip_decompile_checkbox'):
-            self.skip_decompile_checkbox.setChecked(enabled)
+        if hasattr(self, 'decode_cache_checkbox'):
+            self.decode_cache_checkbox.setChecked(enabled)
 
-    def on_skip_decompile_toggled(self):
-        enabled = self.skip_decompile_checkbox.isChecked()
+    def on_decode_cache_toggled(self):
+        enabled = self.decode_cache_checkbox.isChecked()
         # 同步到菜单项
-        if hasattr(self, 'skip_decompile_action'):
-            self.skip_decompile_action.setChecked(enabled)
-        self.config_manager.set_value('skip_decompile_enabled', enabled)
+        if hasattr(self, 'decode_cache_action'):
+            self.decode_cache_action.setChecked(enabled)
+        self.config_manager.set_value('decode_cache_enabled', enabled)
 
     def init_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         layout = QVBoxLayout(central_widget)
         
+        # 日志面板最多显示 log_max_lines 行，完整日志写入 log_dir 下的日志文件；任务队列也向其中写日志，因此最先创建
+        log_dir = self.config_manager.get_value('log_dir', 'logs') or 'logs'
+        prune_logs(log_dir)
+        prune_logs(os.path.join(log_dir, 'jobs'), keep=200)
+        self.log_text = LogView(
+            LogBuffer(session_log_path(log_dir)),
+            max_lines=self.config_manager.get_value('log_max_lines', 5000) or 5000
+        )
+
         # 进度条（不显示文字）
         self.progress_bar = QProgressBar()
         self.progress_bar.setTextVisible(False)  # 隐藏进度条文字
@@ -211,6 +213,23 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(button_layout)
 
+        # 任务队列：拖放的多个APK、每次点击“处理”提交的APK在此排队，按并发任务数同时处理
+        self.job_queue = JobQueue(
+            self.get_processor,
+            os.path.join(log_dir, 'jobs'),
+            self.log_text.append,
+            max_workers=self.config_manager.get_value('gui_max_workers', 2) or 2,
+            parent=self
+        )
+        self.job_queue.job_added.connect(self.on_job_added)
+        self.job_queue.job_removed.connect(self.on_job_removed)
+        self.job_queue.job_changed.connect(self.update_overall_progress)
+        self.job_queue.job_finished.connect(self.on_job_finished)
+        self.job_queue_view = JobQueueView(self.job_queue)
+        self.job_queue_view.setMinimumHeight(120)
+        self.job_queue_view.setVisible(False)
+        layout.addWidget(self.job_queue_view)
+
         # 创建日志区域容器
         self.log_container = QWidget()
         log_container_layout = QVBoxLayout(self.log_container)
@@ -228,32 +247,32 @@ class MainWindow(QMainWindow):
         log_header_layout = QHBoxLayout(log_header)
         log_header_layout.setContentsMargins(5, 0, 5, 0)  # 减小上下边距
         log_label = QLabel("处理日志")
+        self.open_log_button = QPushButton("日志文件")
+        self.open_log_button.setFixedWidth(70)
+        self.open_log_button.setStyleSheet("padding: 1px;")
+        self.open_log_button.clicked.connect(self.open_log_file)
         self.toggle_log_button = QPushButton("展开")  # 默认为收起状态
         self.toggle_log_button.setFixedWidth(60)
         self.toggle_log_button.setStyleSheet("padding: 1px;")
         self.toggle_log_button.clicked.connect(self.toggle_log_area)
         log_header_layout.addWidget(log_label)
         log_header_layout.addStretch()
+        log_header_layout.addWidget(self.open_log_button)
         log_header_layout.addWidget(self.toggle_log_button)
         log_container_layout.addWidget(log_header)
 
-        # 创建日志文本区域
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
+        # 日志文本区域
         self.log_text.setMinimumHeight(200)  # 设置展开时的最小高度
         self.log_text.setMaximumHeight(50)  # 默认收起状态
         self.log_text.setStyleSheet("""
-            QTextEdit { 
+            QPlainTextEdit {
                 border: none;
                 background-color: #ffffff;
                 padding: 2px 5px;
             }
         """)
         log_container_layout.addWidget(self.log_text)
-        
-        # 存储完整日志
-        self.full_log = []
-        
+
         # 添加初始提示信息
         self.update_progress("等待开始处理...")
         
@@ -271,12 +290,12 @@ class MainWindow(QMainWindow):
     def create_file_input_section(self, parent_layout):
         group_layout = QVBoxLayout()
         
-        # 跳过反编译（复选框，放在 APK 区域上方）
+        # 反编译缓存（复选框，放在 APK 区域上方）
         skip_row = QHBoxLayout()
-        self.skip_decompile_checkbox = QCheckBox("跳过反编译")
-        self.skip_decompile_checkbox.setChecked(self.config_manager.get_value('skip_decompile_enabled', False) or False)
-        self.skip_decompile_checkbox.stateChanged.connect(self.on_skip_decompile_toggled)
-        skip_row.addWidget(self.skip_decompile_checkbox)
+        self.decode_cache_checkbox = QCheckBox("使用反编译缓存")
+        self.decode_cache_checkbox.setChecked(self.config_manager.get_value('decode_cache_enabled', True) or False)
+        self.decode_cache_checkbox.stateChanged.connect(self.on_decode_cache_toggled)
+        skip_row.addWidget(self.decode_cache_checkbox)
         skip_row.addStretch(1)
         group_layout.addLayout(skip_row)
         
@@ -346,85 +365,114 @@ class MainWindow(QMainWindow):
         group_layout.addLayout(key_pass_layout)
         parent_layout.addLayout(group_layout)
 
+    def get_processor(self):
+        if self.processor is None:
+            self.processor = ApkProcessor(self.config_manager)
+        return self.processor
+
     def start_processing(self):
+        """把当前APK与全部待处理的APK用当前证书信息提交到任务队列"""
         if not self.validate_inputs():
             return
-        self.log_text.clear()  # 每次运行前清空日志
-
-        self.process_thread = ProcessThread(
-            self.config_manager,
-            self.apk_path.text(),
+        if self.apk_path.text():
+            self.job_queue.add(self.apk_path.text())
+        pending_paths = {job.apk_path for job in self.job_queue.pending_jobs()}
+        if self.prewarm_thread is not None and os.path.abspath(self.prewarm_thread.apk_path) in pending_paths:
+            # 任务会等待仍在进行的预先反编译，此后改变选择不再取消它
+            self.prewarm_thread = None
+        jobs = self.job_queue.submit(
             self.cert_path.text(),
             self.cert_password.text(),
             self.key_alias.currentText(),
             self.key_password.text(),
-            skip_decompile=self.config_manager.get_value('skip_decompile_enabled', False)
+            use_decode_cache=self.config_manager.get_value('decode_cache_enabled', True)
         )
-
-        self.process_thread.progress_signal.connect(self.update_progress)
-        self.process_thread.finished_signal.connect(self.process_finished)
-
-        self.process_button.setEnabled(False)
         self.cancel_button.setEnabled(True)
-        self.progress_bar.setRange(0, 0)
-        self.log_text.append("开始处理APK文件...")
-
-        self.process_thread.start()
+        self.update_overall_progress()
+        self.log_text.append(f"开始处理 {len(jobs)} 个APK文件...")
 
     def cancel_processing(self):
-        """取消处理"""
-        if hasattr(self, 'process_thread') and self.process_thread.isRunning():
-            # 设置进度条为加载状态
-            self.progress_bar.setRange(0, 0)
-            
-            self.process_thread.cancel()
-            self.process_thread.wait()  # 等待线程结束
-            
-            # 恢复进度条和按钮状态
-            self.progress_bar.setRange(0, 100)
-            self.progress_bar.setValue(0)
-            self.process_button.setEnabled(True)
-            self.cancel_button.setEnabled(False)
-            
-            self.update_progress("已取消处理")
+        """取消队列中全部未完成的任务：结束正在运行的工具进程，不在界面线程中等待"""
+        self.job_queue.cancel_all()
+        self.cancel_button.setEnabled(False)
+        self.update_progress("正在取消...")
+
+    def start_prewarm(self, apk_path):
+        """在后台预先完成所选APK的预检与反编译，结果进入缓存，点击“处理”后直接使用"""
+        if self.prewarm_thread is not None and self.prewarm_thread.apk_path == apk_path \
+                and self.prewarm_thread.isRunning():
+            return
+        self.cancel_prewarm()
+        if not self.config_manager.get_value('prewarm_enabled', True):
+            return
+        try:
+            processor = self.get_processor()
+        except Exception as e:
+            self.log_text.append(f"无法进行后台预处理：{str(e)}")
+            return
+        thread = PrewarmThread(processor, apk_path,
+                               use_decode_cache=self.config_manager.get_value('decode_cache_enabled', True))
+        thread.result_signal.connect(self.update_progress)
+        thread.finished.connect(partial(self.on_prewarm_finished, thread))
+        self.prewarm_thread = thread
+        self.prewarm_threads.append(thread)
+        thread.start()
+
+    def cancel_prewarm(self):
+        """选择改变时取消当前APK的后台预处理，不等待线程退出"""
+        if self.prewarm_thread is not None:
+            self.prewarm_thread.cancel()
+            self.prewarm_thread = None
+
+    def on_prewarm_finished(self, thread):
+        if thread in self.prewarm_threads:
+            self.prewarm_threads.remove(thread)
+        if self.prewarm_thread is thread:
+            self.prewarm_thread = None
+
+    def on_job_added(self, job):
+        self.job_queue_view.setVisible(True)
+        QTimer.singleShot(0, self._adjust_window_height)
+
+    def on_job_removed(self, job):
+        if not self.job_queue.jobs:
+            self.job_queue_view.setVisible(False)
+            QTimer.singleShot(0, self._adjust_window_height)
 
     def update_progress(self, message):
         """更新进度信息"""
-        # 保存到完整日志
-        self.full_log.append(message)
-        
-        # 如果是收起状态，只显示最新消息
-        if self.toggle_log_button.text() == "展开":
-            self.log_text.setPlainText(message)
-        else:
-            # 展开状态，显示所有日志
-            self.log_text.append(message)
-        
-        # 确保日志始终滚动到最新内容
-        scroll_bar = self.log_text.verticalScrollBar()
-        if scroll_bar:
-            scroll_bar.setValue(scroll_bar.maximum())
-
-    def process_finished(self, success, message):
-        self.progress_bar.setRange(0, 100)
-        self.progress_bar.setValue(100 if success else 0)
-        self.process_button.setEnabled(True)
-        self.cancel_button.setEnabled(False)
-        
-        status = "成功" if success else "失败"
-        self.log_text.append(f"处理{status}：{message}")
+        self.log_text.append(message)
 
-        # 若处理成功，记录当前证书信息为“上次成功处理”的证书
-        if success:
+    def update_overall_progress(self, job=None):
+        """总进度条显示最近一批任务的平均进度，结束的任务按完成计"""
+        jobs = self.job_queue.batch_jobs()
+        if not jobs:
+            return
+        percent = sum(100 if not j.active else j.percent for j in jobs) // len(jobs)
+        self.progress_bar.setValue(percent)
+        running = [j for j in jobs if j.active]
+        self.progress_bar.setToolTip(f"{percent}%  {len(jobs) - len(running)}/{len(jobs)} 个任务已结束")
+
+    def on_job_finished(self, job):
+        elapsed = job.elapsed()
+        timing = f"，用时 {elapsed:.1f}s" if elapsed is not None else ""
+        self.log_text.append(f"[{job.name}] 处理{job.status}{timing}：{job.message}")
+        if job.output_path:
+            self.log_text.append(f"[{job.name}] 输出：{job.output_path}")
+
+        # 若处理成功，记录该任务所用证书信息为“上次成功处理”的证书
+        if job.status == STATUS_SUCCEEDED:
             self.user_state.save_last_success_cert(
-                self.cert_path.text(),
-                self.cert_password.text(),
-                self.key_alias.currentText(),
-                self.key_password.text(),
+                job.signing['cert_path'],
+                job.signing['cert_password'],
+                job.signing['key_alias'],
+                job.signing['key_password'],
             )
+        if not self.job_queue.has_active():
+            self.cancel_button.setEnabled(False)
 
     def validate_inputs(self):
-        if not self.apk_path.text():
+        if not self.apk_path.text() and not self.job_queue.pending_jobs():
             self.log_text.append("错误：请选择APK文件")
             return False
         if not self.cert_path.text():
@@ -454,13 +502,14 @@ class MainWindow(QMainWindow):
             self,
             "选择APK文件",
             current_dir,  # 使用当前APK路径的目录
-            "APK文件 (*.apk)"
+            "APK文件 (*.apk *.xapk *.apks)"
         )
         if file_name:
             self.apk_path.setText(file_name)
             self.log_text.append(f"已选择APK文件：{file_name}")
             # 保存到用户状态
             self.user_state.update_fields({'apk_path': self.apk_path.text()})
+            self.start_prewarm(file_name)
 
     def select_cert_file(self):
         # 获取当前证书路径的目录
@@ -512,13 +561,25 @@ class MainWindow(QMainWindow):
         if not urls:
             return
 
-        file_path = urls[0].toLocalFile()
-        if file_path.lower().endswith('.apk'):
-            self.apk_path.setText(file_path)
-            self.log_text.append(f"已拖放APK文件：{file_path}")
+        file_paths = [url.toLocalFile() for url in urls]
+        apk_paths = [path for path in file_paths if path.lower().endswith(('.apk',) + BUNDLE_EXTENSIONS)]
+        if len(apk_paths) > 1:
+            # 一次拖放多个APK时全部加入任务队列，点击“处理”后用当前证书信息一起处理
+            for path in apk_paths:
+                self.job_queue.add(path)
+            self.apk_path.clear()
+            self.cancel_prewarm()
+            self.log_text.append(f"已将 {len(apk_paths)} 个APK文件加入任务队列")
+        elif apk_paths:
+            self.apk_path.setText(apk_paths[0])
+            self.log_text.append(f"已拖放APK文件：{apk_paths[0]}")
             # 保存到用户状态
             self.user_state.update_fields({'apk_path': self.apk_path.text()})
-        elif file_path.lower().endswith(('.keystore', '.jks')):
+            self.start_prewarm(apk_paths[0])
+
+        cert_paths = [path for path in file_paths if path.lower().endswith(('.keystore', '.jks'))]
+        if cert_paths:
+            file_path = cert_paths[0]
             # 只有当拖放的文件与当前文件不同时才清空
             if self.cert_path.text() != file_path:
                 # 清空密码和别名，避免使用错误的密码
@@ -666,17 +727,13 @@ class MainWindow(QMainWindow):
             self.log_text.setMinimumHeight(0)
             self.log_text.setMaximumHeight(self.log_text.fontMetrics().height() + 10)
             self.toggle_log_button.setText("展开")
-
-            if self.full_log:
-                self.log_text.setPlainText(self.full_log[-1])
-            else:
-                self.log_text.setPlainText("")
+            self.log_text.set_collapsed(True)
         else:
             # 展开
             self.log_text.setMinimumHeight(200)
             self.log_text.setMaximumHeight(16777215)
             self.toggle_log_button.setText("收起")
-            self.log_text.setPlainText("\n".join(self.full_log))
+            self.log_text.set_collapsed(False)
 
         # 强制布局失效，以便重新计算尺寸提示
         central_widget = self.centralWidget()
@@ -688,6 +745,15 @@ class MainWindow(QMainWindow):
         # 异步调整窗口大小以适应内容
         QTimer.singleShot(0, self._adjust_window_height)
 
+    def open_log_file(self):
+        """打开本次运行的完整日志文件"""
+        self.log_text.flush()
+        log_path = self.log_text.buffer.log_path
+        if log_path and os.path.exists(log_path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(log_path)))
+        else:
+            self.log_text.append("日志文件尚未生成")
+
     def _adjust_window_height(self):
         """调整窗口高度以适应内容，保持宽度不变"""
         central_widget = self.centralWidget()
@@ -697,3 +763,15 @@ class MainWindow(QMainWindow):
                 layout.activate()  # 强制布局更新
         new_height = self.sizeHint().height()
         self.resize(self.width(), new_height)
+
+    def closeEvent(self, event):
+        """关闭窗口时取消正在进行的处理并停止常驻JVM进程"""
+        # 取消会立即结束工具进程，线程随后很快退出
+        self.job_queue.shutdown()
+        for thread in list(self.prewarm_threads):
+            thread.cancel()
+            thread.wait()
+        if self.processor is not None:
+            self.processor.close()
+        self.log_text.shutdown()
+        super().closeEvent(event)
@@ -0,0 +1,179 @@
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.jar.JarFile;
+
+/**
+ * 常驻 JVM 工具进程：在同一个 JVM 中反复调用 jar 的 Main-Class（apktool、apksigner），
+ * 省去每次启动 JVM 与 JIT 预热的开销。由 core/jvm_worker.py 以单文件源码方式启动：
+ *
+ *     java [-Djava.security.manager=allow] ToolWorker.java
+ *
+ * 协议（标准输入/输出，UTF-8，一次只处理一个请求）：
+ *     启动完成：READY <是否能拦截System.exit，1/0>
+ *     请求：    RUN <参数个数>\n<jar路径>\n<参数1>\n...
+ *     响应：    EXIT <退出码> <标准输出字节数> <错误输出字节数>\n<标准输出><错误输出>
+ *     QUIT 或标准输入关闭时退出。
+ *
+ * 无法拦截 System.exit 时（JDK 24 起），工具调用 System.exit 会使本进程退出，
+ * Python 端发现进程退出后改为单独启动该命令。
+ */
+public class ToolWorker {
+
+    private static final class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    private static final Map<String, Method> MAIN_METHODS = new HashMap<>();
+    private static final Map<String, ClassLoader> LOADERS = new HashMap<>();
+
+    public static void main(String[] args) throws Exception {
+        OutputStream protocol = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        PrintStream idleErr = System.err;
+        // 请求之间的零散输出（后台线程等）不能混入协议流
+        System.setOut(idleErr);
+        boolean trapExit = installExitTrap();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        writeLine(protocol, "READY " + (trapExit ? 1 : 0));
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.equals("QUIT")) {
+                break;
+            }
+            if (!line.startsWith("RUN ")) {
+                respond(protocol, 2, new byte[0], ("无法识别的请求: " + line).getBytes(StandardCharsets.UTF_8));
+                continue;
+            }
+            int count = Integer.parseInt(line.substring(4).trim());
+            String jar = in.readLine();
+            String[] toolArgs = new String[count];
+            for (int i = 0; i < count; i++) {
+                toolArgs[i] = in.readLine();
+            }
+
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream outStream = new PrintStream(out, true, "UTF-8");
+            PrintStream errStream = new PrintStream(err, true, "UTF-8");
+            int status = 0;
+            Thread current = Thread.currentThread();
+            ClassLoader previousLoader = current.getContextClassLoader();
+            System.setOut(outStream);
+            System.setErr(errStream);
+            try {
+                Method mainMethod = mainMethod(jar);
+                current.setContextClassLoader(LOADERS.get(jar));
+                mainMethod.invoke(null, (Object) toolArgs);
+            } catch (InvocationTargetException e) {
+                ExitTrap trap = findTrap(e.getCause());
+                if (trap != null) {
+                    status = trap.status;
+                } else {
+                    e.getCause().printStackTrace(errStream);
+                    status = 1;
+                }
+            } catch (ExitTrap e) {
+                status = e.status;
+            } catch (Throwable e) {
+                e.printStackTrace(errStream);
+                status = 1;
+            } finally {
+                current.setContextClassLoader(previousLoader);
+                outStream.flush();
+                errStream.flush();
+                System.setOut(idleErr);
+                System.setErr(idleErr);
+            }
+            respond(protocol, status, out.toByteArray(), err.toByteArray());
+        }
+        Runtime.getRuntime().halt(0);
+    }
+
+    @SuppressWarnings("removal")
+    private static boolean installExitTrap() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitTrap(status);
+                }
+
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                }
+            });
+            return true;
+        } catch (UnsupportedOperationException | SecurityException e) {
+            return false;
+        }
+    }
+
+    private static ExitTrap findTrap(Throwable error) {
+        while (error != null) {
+            if (error instanceof ExitTrap) {
+                return (ExitTrap) error;
+            }
+            error = error.getCause();
+        }
+        return null;
+    }
+
+    /** 每个 jar 使用独立的类加载器，避免 apktool 与 apksigner 的依赖互相冲突 */
+    private static Method mainMethod(String jar) throws Exception {
+        Method method = MAIN_METHODS.get(jar);
+        if (method != null) {
+            return method;
+        }
+        String mainClass;
+        try (JarFile jarFile = new JarFile(jar)) {
+            mainClass = jarFile.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        if (mainClass == null) {
+            throw new IllegalArgumentException("jar 中没有 Main-Class: " + jar);
+        }
+        URLClassLoader loader = new URLClassLoader(new URL[] {new File(jar).toURI().toURL()},
+                ClassLoader.getPlatformClassLoader());
+        method = Class.forName(mainClass, true, loader).getMethod("main", String[].class);
+        LOADERS.put(jar, loader);
+        MAIN_METHODS.put(jar, method);
+        return method;
+    }
+
+    private static void writeLine(OutputStream protocol, String line) throws IOException {
+        protocol.write((line + "\n").getBytes(StandardCharsets.UTF_8));
+        protocol.flush();
+    }
+
+    private static void respond(OutputStream protocol, int status, byte[] out, byte[] err) throws IOException {
+        writeLine(protocol, "EXIT " + status + " " + out.length + " " + err.length);
+        protocol.write(out);
+        protocol.write(err);
+        protocol.flush();
+    }
+}